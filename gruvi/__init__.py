@@ -16,6 +16,7 @@ from __future__ import absolute_import, print_function
 __all__ = []
 
 import sys
+import types
 if sys.version_info[0] == 2 and sys.version_info[1] < 7 \
         or sys.version_info[0] == 3 and sys.version_info[1] < 3:
     raise ImportError('Gruvi requires Python 2.7 or 3.3+')
@@ -32,14 +33,61 @@ from .transports import *
 from .protocols import *
 from .endpoints import *
 from .address import *
-from .process import *
 from .stream import *
-from .http import *
-from .jsonrpc import *
-from .dbus import *
+
+# The protocol subpackages and their exported names. These are relatively
+# expensive to import, and many programs don't need all of them, so they are
+# imported on first access.
+_lazy_exports = {
+    'process': ['Process', 'PIPE', 'DEVNULL'],
+    'prefork': ['PreforkServer'],
+    'dns': ['StubResolver'],
+    'http': ['HttpError', 'HttpRequest', 'HttpResponse', 'ResponseWriter', 'HttpProtocol',
+             'HttpClient', 'HttpConnectionPool', 'HttpServer'],
+    'jsonrpc': ['JsonRpcError', 'JsonRpcMethodCallError', 'JsonCodec', 'OrjsonCodec',
+                'JsonRpcProtocol', 'JsonRpcClient', 'JsonRpcServer'],
+    'dbus': ['DbusError', 'DbusMethodCallError', 'DbusProtocol', 'DbusClient',
+             'DbusServer'],
+}
+
+_lazy_names = dict((name, modname) for modname, names in _lazy_exports.items()
+                   for name in names)
+
+
+class _LazyModule(types.ModuleType):
+    """The "gruvi" package, with the protocol subpackages imported on first
+    access.
+
+    Module level ``__getattr__`` (PEP 562) requires Python 3.7, so the package
+    module in ``sys.modules`` is replaced with an instance of this class.
+    """
+
+    def __getattr__(self, name):
+        modname = _lazy_names.get(name, name if name in _lazy_exports else None)
+        if modname is None:
+            raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+        import importlib
+        module = importlib.import_module('.' + modname, __name__)
+        for export in _lazy_exports[modname]:
+            setattr(self, export, getattr(module, export))
+        return self.__dict__[name]
+
+    def __dir__(self):
+        return sorted(set(self.__dict__) | set(_lazy_names) | set(_lazy_exports))
+
 
 from ._version import version_info
 __version__ = version_info['version']
 
+_module = _LazyModule(__name__, __doc__)
+# Keep the original module alive. On Python 2 its globals, which are used by
+# the methods above, are cleared when it is deallocated.
+_original = sys.modules[__name__]
+sys.modules[__name__] = _module
+
 # clean up module namespace
-del sys, absolute_import, print_function
+del sys, types, absolute_import, print_function
+
+_module.__dict__.update((key, value) for key, value in globals().items()
+                        if key != '_module')
+del _module
@@ -8,12 +8,18 @@
 
 from __future__ import absolute_import, print_function
 
+import time
+import threading
+import collections
 import six
 import pyuv
 
 from .hub import get_hub, switch_back, switchpoint
+from .futures import Future
 
-__all__ = ['saddr', 'paddr', 'getaddrinfo', 'getnameinfo']
+__all__ = ['saddr', 'paddr', 'getaddrinfo', 'getnameinfo', 'DnsCache', 'get_dns_cache']
+
+_clock = getattr(time, 'monotonic', time.time)
 
 
 def saddr(address):
@@ -53,6 +59,163 @@ def paddr(address):
         return address
 
 
+@switchpoint
+def _getaddrinfo(node, service=0, family=0, socktype=0, protocol=0, flags=0, timeout=30):
+    """Uncached version of :func:`getaddrinfo`."""
+    hub = get_hub()
+    with switch_back(timeout) as switcher:
+        request = pyuv.util.getaddrinfo(hub.loop, switcher, node, service, family,
+                                        socktype, protocol, flags)
+        switcher.add_cleanup(request.cancel)
+        result = hub.switch()
+    result, error = result[0]
+    if error:
+        message = pyuv.errno.strerror(error)
+        raise pyuv.error.UVError(error, message)
+    return result
+
+
+class DnsCache(object):
+    """A cache for the results of :func:`getaddrinfo`.
+
+    Successful lookups are cached for *ttl* seconds, and failed lookups for
+    *negative_ttl* seconds. The system resolver does not return the DNS time
+    to live of a record, so the same TTL is used for all names. At most
+    *maxsize* results are kept. When the cache is full, the least recently
+    added entry is evicted.
+
+    Concurrent lookups for the same arguments are coalesced: only one request
+    is sent to the resolver, and all callers wait for its result.
+
+    The *resolver* is the function that performs the lookups on a cache miss.
+    It must have the same signature as :func:`getaddrinfo`. The default is to
+    use the resolver in the C library, which is run in the libuv thread pool.
+    See :class:`StubResolver` for an alternative.
+
+    The cache may be used from multiple threads.
+    """
+
+    # Temporary errors are never cached.
+    _transient_errors = frozenset((pyuv.errno.UV_EAI_AGAIN, pyuv.errno.UV_ECANCELED))
+
+    def __init__(self, ttl=60, negative_ttl=5, maxsize=1000, resolver=None):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.maxsize = maxsize
+        self.resolver = resolver
+        self._entries = collections.OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._hits = self._negative_hits = self._misses = self._coalesced = 0
+
+    @switchpoint
+    def getaddrinfo(self, node, service=0, family=0, socktype=0, protocol=0, flags=0,
+                    timeout=30):
+        """Like :func:`getaddrinfo` but use this cache."""
+        key = (node, service, family, socktype, protocol, flags)
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] <= _clock():
+                    del self._entries[key]
+                    entry = None
+                if entry is not None:
+                    if entry[2]:
+                        self._negative_hits += 1
+                    else:
+                        self._hits += 1
+                    break
+                future = self._pending.get(key)
+                if future is None:
+                    future = self._pending[key] = Future()
+                    self._misses += 1
+                    owner = True
+                else:
+                    self._coalesced += 1
+                    owner = False
+            if owner:
+                entry = self._resolve(key, future, timeout)
+                break
+            entry = future.result(timeout)
+            if entry is not None:
+                break
+            # The lookup that we were waiting for was interrupted, e.g. because
+            # it timed out. Try again with our own timeout.
+        expires, result, error = entry
+        if error:
+            raise pyuv.error.UVError(error, pyuv.errno.strerror(error))
+        return list(result)
+
+    def _resolve(self, key, future, timeout):
+        # Perform a lookup for *key* and store the result. The result is also
+        # passed to the coalesced lookups via *future*.
+        entry = None
+        try:
+            resolver = self.resolver or _getaddrinfo
+            result = resolver(*key, timeout=timeout)
+            entry = (_clock() + self.ttl, result, None)
+        except pyuv.error.UVError as e:
+            entry = (_clock() + self.negative_ttl, None, e.args[0])
+        finally:
+            with self._lock:
+                del self._pending[key]
+                if entry is not None and entry[0] > _clock() \
+                            and entry[2] not in self._transient_errors:
+                    self._entries[key] = entry
+                    while len(self._entries) > self.maxsize:
+                        self._entries.popitem(last=False)
+            future.set_result(entry)
+        return entry
+
+    def flush(self, node=None):
+        """Remove all entries for *node* from the cache.
+
+        If *node* is not specified, the cache is cleared.
+        """
+        with self._lock:
+            if node is None:
+                self._entries.clear()
+                return
+            for key in list(self._entries):
+                if key[0] == node:
+                    del self._entries[key]
+
+    def stats(self, reset=False):
+        """Return a dictionary with statistics about the cache.
+
+        The statistics are: "hits" and "negative_hits" (lookups answered from
+        the cache with a result or an error, respectively), "misses" (lookups
+        sent to the resolver), "coalesced" (lookups that waited for a
+        concurrent lookup of the same name), "size" (the number of entries in
+        the cache) and "pending" (the number of lookups in progress).
+
+        If *reset* is true, the counters are reset to zero.
+        """
+        with self._lock:
+            stats = {'hits': self._hits, 'negative_hits': self._negative_hits,
+                     'misses': self._misses, 'coalesced': self._coalesced,
+                     'size': len(self._entries), 'pending': len(self._pending)}
+            if reset:
+                self._reset_stats()
+        return stats
+
+
+_dns_cache = DnsCache()
+
+def get_dns_cache():
+    """Return the :class:`DnsCache` that is used by :func:`getaddrinfo`.
+
+    There is one cache per process, which is shared by all threads. Its
+    attributes may be changed to configure it. Setting both :attr:`ttl` and
+    :attr:`negative_ttl` to zero disables caching, but concurrent lookups are
+    still coalesced.
+    """
+    return _dns_cache
+
+
 @switchpoint
 def getaddrinfo(node, service=0, family=0, socktype=0, protocol=0, flags=0, timeout=30):
     """Resolve an Internet *node* name and *service* into a socket address.
@@ -68,19 +231,11 @@ def getaddrinfo(node, service=0, family=0, socktype=0, protocol=0, flags=0, time
     It will be a 2-tuple ``(addr, port)`` for an IPv4 address, and a 4-tuple
     ``(addr, port, flowinfo, scopeid)`` for an IPv6 address.
 
-    The address resolution is performed in the libuv thread pool.
+    The address resolution is performed in the libuv thread pool. Results are
+    cached in the process wide :class:`DnsCache` returned by
+    :func:`get_dns_cache`.
     """
-    hub = get_hub()
-    with switch_back(timeout) as switcher:
-        request = pyuv.util.getaddrinfo(hub.loop, switcher, node, service, family,
-                                        socktype, protocol, flags)
-        switcher.add_cleanup(request.cancel)
-        result = hub.switch()
-    result, error = result[0]
-    if error:
-        message = pyuv.errno.strerror(error)
-        raise pyuv.error.UVError(error, message)
-    return result
+    return _dns_cache.getaddrinfo(node, service, family, socktype, protocol, flags, timeout)
 
 
 @switchpoint
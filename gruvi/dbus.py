@@ -61,6 +61,7 @@ from . import txdbus, compat
 from .hub import switchpoint, switch_back
 from .sync import Event
 from .protocols import ProtocolError, MessageProtocol
+from .futures import FiberPool
 from .stream import StreamWriter
 from .endpoints import Client, Server, add_protocol_method
 from .address import saddr
@@ -218,8 +219,10 @@ class DbusProtocol(MessageProtocol):
 
     S_CREDS_BYTE, S_AUTHENTICATE, S_MESSAGE_HEADER, S_MESSAGE = range(4)
 
-    def __init__(self, server_side, message_handler=None, server_guid=None, timeout=None):
-        super(DbusProtocol, self).__init__(callable(message_handler), timeout=timeout)
+    def __init__(self, server_side, message_handler=None, server_guid=None, timeout=None,
+                 pool=None, max_inflight=None):
+        super(DbusProtocol, self).__init__(callable(message_handler), timeout=timeout,
+                                           pool=pool, max_inflight=max_inflight)
         self._message_handler = message_handler
         self._server_side = server_side
         self._name_acquired = Event()
@@ -349,8 +352,8 @@ class DbusProtocol(MessageProtocol):
                     and getattr(parsed, 'reply_serial', 0) in self._method_calls:
             notify = self._method_calls.pop(parsed.reply_serial)
             notify(parsed)
-        elif self._dispatcher:
-            self._queue.put_nowait(parsed, len(message))
+        elif self._dispatch:
+            self._queue_message(parsed, len(message))
         else:
             mtype = type(parsed).__name__[:-7].lower()
             info = ' {!r}'.format(getattr(parsed, 'member', getattr(parsed, 'error_name', '')))
@@ -527,15 +530,24 @@ class DbusClient(Client):
 class DbusServer(Server):
     """A D-BUS server."""
 
-    def __init__(self, message_handler, timeout=30):
+    def __init__(self, message_handler, timeout=30, concurrency=None, max_inflight=None):
         """
         The *message_handler* argument specifies the message handler.
 
         The optional *timeout* argument specifies a default timeout for
         protocol operations in seconds.
+
+        By default, the messages on a connection are handled one at a time. If
+        *concurrency* is provided, up to this many messages are handled
+        concurrently, by a pool of fibers that is shared by all connections.
+        The *max_inflight* argument limits the number of concurrent messages
+        for a single connection. It defaults to *concurrency*.
         """
         super(DbusServer, self).__init__(self._create_protocol, timeout)
         self._message_handler = message_handler
+        self._concurrency = concurrency
+        self._max_inflight = max_inflight if max_inflight is not None else concurrency
+        self._pool = None
 
     @switchpoint
     def listen(self, address='session'):
@@ -558,4 +570,15 @@ class DbusServer(Server):
 
     def _create_protocol(self):
         # Protocol factory
-        return DbusProtocol(True, self._message_handler, timeout=self._timeout)
+        if self._concurrency and self._pool is None:
+            self._pool = FiberPool(self._concurrency, name='DbusServer')
+        return DbusProtocol(True, self._message_handler, timeout=self._timeout,
+                            pool=self._pool, max_inflight=self._max_inflight)
+
+    @switchpoint
+    def close(self):
+        """Close the server and wait for in-flight messages to complete."""
+        super(DbusServer, self).close()
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
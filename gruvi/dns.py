@@ -0,0 +1,528 @@
+#
+# This file is part of Gruvi. Gruvi is free software available under the
+# terms of the MIT license. See the file "LICENSE" that was provided
+# together with this source file for the licensing terms.
+#
+# Copyright (c) 2012-2014 the Gruvi authors. See the file "AUTHORS" for a
+# complete list.
+
+"""
+This module contains an asynchronous DNS stub resolver.
+
+The resolver speaks the DNS protocol directly to the name servers that are
+configured in ``/etc/resolv.conf``, using a :class:`DatagramTransport`. Replies
+that are truncated are retried over TCP. Because it does not use the blocking
+resolver from the C library, it does not need the libuv thread pool, and it can
+run many queries concurrently.
+
+The resolver is not used by default. To use it for all name resolution done by
+Gruvi, install it into the :class:`DnsCache`::
+
+  resolver = gruvi.StubResolver()
+  gruvi.get_dns_cache().resolver = resolver.getaddrinfo
+"""
+
+from __future__ import absolute_import, print_function
+
+import random
+import socket
+import struct
+import threading
+import itertools
+import collections
+import pyuv
+import six
+
+from . import logging
+from .hub import get_hub, switch_back, switchpoint
+from .fibers import spawn
+from .errors import Timeout, Cancelled
+from .transports import TransportError, DatagramTransport
+from .protocols import DatagramProtocol
+from .stream import StreamProtocol
+from .endpoints import create_connection, _connect_tcp
+
+__all__ = ['StubResolver']
+
+# Record types and response codes. Only the ones we use are listed.
+T_A = 1
+T_CNAME = 5
+T_AAAA = 28
+C_IN = 1
+
+R_NOERROR = 0
+R_NXDOMAIN = 3
+
+F_RESPONSE = 0x8000
+F_TRUNCATED = 0x0200
+F_RECURSION_DESIRED = 0x0100
+
+addrinfo = collections.namedtuple('addrinfo', ('family', 'socktype', 'proto',
+                                               'canonname', 'sockaddr'))
+dns_message = collections.namedtuple('dns_message', ('id', 'flags', 'questions', 'answers'))
+
+
+def _encode_name(name):
+    """Encode a domain name in DNS wire format."""
+    if not isinstance(name, six.text_type):
+        name = name.decode('ascii')
+    parts = []
+    for label in name.rstrip(u'.').split(u'.'):
+        label = label.encode('idna')
+        if not 0 < len(label) < 64:
+            raise ValueError('illegal label in name: {!r}'.format(name))
+        parts.append(six.int2byte(len(label)))
+        parts.append(label)
+    parts.append(b'\0')
+    return b''.join(parts)
+
+
+def _decode_name(data, offset):
+    """Decode a possibly compressed domain name at *offset* in *data*.
+
+    The return value is a ``(name, offset)`` tuple, where *offset* is the
+    position just after the name.
+    """
+    labels = []
+    end = None
+    for i in range(128):  # guard against pointer loops
+        length = six.indexbytes(data, offset)
+        if length & 0xc0 == 0xc0:
+            if end is None:
+                end = offset + 2
+            offset = struct.unpack_from('!H', data, offset)[0] & 0x3fff
+            continue
+        offset += 1
+        if length == 0:
+            break
+        labels.append(data[offset:offset+length].decode('ascii'))
+        offset += length
+    else:
+        raise ValueError('too many labels in name')
+    return '.'.join(labels), end if end is not None else offset
+
+
+def build_query(qid, name, qtype):
+    """Return a DNS query message for *name* and *qtype*."""
+    header = struct.pack('!HHHHHH', qid, F_RECURSION_DESIRED, 1, 0, 0, 0)
+    return header + _encode_name(name) + struct.pack('!HH', qtype, C_IN)
+
+
+def parse_message(data):
+    """Parse the DNS message in *data*.
+
+    The return value is a :class:`dns_message` tuple. The questions are a list
+    of ``(name, type, class)`` tuples, and the answers a list of ``(name, type,
+    class, ttl, rdata)`` tuples. A ``ValueError`` is raised for a malformed
+    message.
+    """
+    try:
+        qid, flags, qdcount, ancount, _, _ = struct.unpack_from('!HHHHHH', data, 0)
+        offset = 12
+        questions = []
+        for i in range(qdcount):
+            name, offset = _decode_name(data, offset)
+            qtype, qclass = struct.unpack_from('!HH', data, offset)
+            offset += 4
+            questions.append((name, qtype, qclass))
+        answers = []
+        for i in range(ancount):
+            name, offset = _decode_name(data, offset)
+            rtype, rclass, ttl, rdlength = struct.unpack_from('!HHIH', data, offset)
+            offset += 10
+            rdata = data[offset:offset+rdlength]
+            if len(rdata) != rdlength:
+                raise ValueError('short resource record')
+            offset += rdlength
+            answers.append((name, rtype, rclass, ttl, rdata))
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise ValueError('malformed DNS message: {!s}'.format(e))
+    return dns_message(qid, flags, questions, answers)
+
+
+def parse_resolv_conf(fname):
+    """Parse the resolv.conf file *fname*.
+
+    The return value is a dictionary with the keys "nameservers", "search",
+    "ndots", "timeout" and "attempts".
+    """
+    conf = {'nameservers': [], 'search': [], 'ndots': 1, 'timeout': 5, 'attempts': 2}
+    try:
+        with open(fname) as fin:
+            lines = fin.readlines()
+    except (IOError, OSError):
+        return conf
+    for line in lines:
+        fields = line.split()
+        if not fields or fields[0][0] in '#;':
+            continue
+        if fields[0] == 'nameserver' and len(fields) > 1:
+            conf['nameservers'].append(fields[1])
+        elif fields[0] in ('search', 'domain'):
+            conf['search'] = fields[1:]
+        elif fields[0] == 'options':
+            for option in fields[1:]:
+                key, _, value = option.partition(':')
+                if key in ('ndots', 'timeout', 'attempts') and value.isdigit():
+                    conf[key] = int(value)
+    return conf
+
+
+def parse_hosts(fname):
+    """Parse the hosts file *fname*.
+
+    The return value is a dictionary mapping lower case host names to lists of
+    addresses.
+    """
+    hosts = {}
+    try:
+        with open(fname) as fin:
+            lines = fin.readlines()
+    except (IOError, OSError):
+        return hosts
+    for line in lines:
+        fields = line.partition('#')[0].split()
+        if len(fields) < 2:
+            continue
+        for name in fields[1:]:
+            addresses = hosts.setdefault(name.lower(), [])
+            if fields[0] not in addresses:
+                addresses.append(fields[0])
+    return hosts
+
+
+def parse_services(fname):
+    """Parse the services file *fname*.
+
+    The return value is a dictionary mapping service names and their aliases
+    to port numbers. If a name has different ports for different protocols,
+    the TCP port is used.
+    """
+    services = {}
+    try:
+        with open(fname) as fin:
+            lines = fin.readlines()
+    except (IOError, OSError):
+        return services
+    for line in lines:
+        fields = line.partition('#')[0].split()
+        if len(fields) < 2:
+            continue
+        port, _, proto = fields[1].partition('/')
+        if not port.isdigit():
+            continue
+        for name in [fields[0]] + fields[2:]:
+            if proto == 'tcp' or name not in services:
+                services[name] = int(port)
+    return services
+
+
+def _address_family(address):
+    """Return the address family of the numeric *address*, or ``None``."""
+    for family in (socket.AF_INET, socket.AF_INET6):
+        try:
+            socket.inet_pton(family, address)
+        except (socket.error, ValueError):
+            continue
+        return family
+
+
+def _eai_error(error, message):
+    return pyuv.error.UVError(error, '{}: {}'.format(pyuv.errno.strerror(error), message))
+
+
+class _ResolverState(object):
+    """The per-Hub state of a :class:`StubResolver`: its UDP transports and
+    the outstanding queries."""
+
+    def __init__(self, hub):
+        self.hub = hub
+        self.transports = {}
+        self.queries = {}
+
+    def close(self):
+        for transport in self.transports.values():
+            transport.close()
+        self.transports.clear()
+
+
+class _ResolverProtocol(DatagramProtocol):
+    """Datagram protocol used by :class:`StubResolver`."""
+
+    def __init__(self, queries):
+        super(_ResolverProtocol, self).__init__()
+        self._queries = queries
+
+    def datagram_received(self, data, addr):
+        # Protocol callback
+        if len(data) < 12:
+            return
+        qid = struct.unpack_from('!H', data, 0)[0]
+        query = self._queries.get(qid)
+        if query is None or query[1][:2] != addr[:2]:
+            self._log.debug('ignoring unexpected reply from {}', addr)
+            return
+        del self._queries[qid]
+        query[0](data)
+
+    def error_received(self, exc):
+        # Protocol callback
+        self._log.warning('error on resolver socket: {!s}', exc)
+
+
+class StubResolver(object):
+    """An asynchronous DNS stub resolver.
+
+    The name servers, the search list and the options "ndots", "timeout" and
+    "attempts" are read from the file *resolv_conf*. They can be overridden
+    with the keyword arguments of the same name. A name server is either a
+    numeric IP address, or an ``(address, port)`` tuple. Names in the file
+    *hosts* are resolved without sending a query. Service names passed to
+    :meth:`getaddrinfo` are looked up in the file *services*, which is read
+    once, so that a lookup never blocks.
+
+    A resolver can be used from multiple threads. In each thread it uses one
+    UDP socket per address family for all its queries. The sockets are created
+    in the thread's :class:`Hub` when it first uses the resolver. Call
+    :meth:`close` to close them.
+    """
+
+    _next_id = itertools.count(1)
+
+    def __init__(self, nameservers=None, search=None, ndots=None, timeout=None,
+                 attempts=None, resolv_conf='/etc/resolv.conf', hosts='/etc/hosts',
+                 services='/etc/services'):
+        conf = parse_resolv_conf(resolv_conf) if resolv_conf else {}
+        nameservers = nameservers or conf.get('nameservers') or ['127.0.0.1']
+        self._nameservers = [ns if isinstance(ns, tuple) else (ns, 53) for ns in nameservers]
+        self._search = conf.get('search', []) if search is None else search
+        self._ndots = conf.get('ndots', 1) if ndots is None else ndots
+        self._timeout = conf.get('timeout', 5) if timeout is None else timeout
+        self._attempts = conf.get('attempts', 2) if attempts is None else attempts
+        self._hosts = parse_hosts(hosts) if hosts else {}
+        self._services = parse_services(services) if services else {}
+        self._key = 'gruvi:resolver:{}'.format(next(self._next_id))
+        self._states = []
+        self._lock = threading.Lock()
+        self._random = random.SystemRandom()
+        self._log = logging.get_logger(self)
+
+    @property
+    def nameservers(self):
+        """The list of name servers, as ``(address, port)`` tuples."""
+        return self._nameservers
+
+    @property
+    def search(self):
+        """The search list."""
+        return self._search
+
+    def close(self):
+        """Close the resolver's sockets in all threads.
+
+        The sockets of other threads are closed by their own Hub.
+        """
+        hub = get_hub()
+        with self._lock:
+            states, self._states = self._states, []
+        for state in states:
+            state.hub.data.pop(self._key, None)
+            if state.hub is hub:
+                state.close()
+            else:
+                state.hub.run_callback(state.close)
+
+    def _get_state(self):
+        # Return the state for the current Hub, creating it if needed.
+        hub = get_hub()
+        state = hub.data.get(self._key)
+        if state is None:
+            state = hub.data[self._key] = _ResolverState(hub)
+            with self._lock:
+                self._states.append(state)
+        return state
+
+    def _get_transport(self, state, family):
+        # Return the UDP transport for *family*, creating it if needed.
+        transport = state.transports.get(family)
+        if transport is None:
+            handle = pyuv.UDP(state.hub.loop)
+            handle.bind(('::', 0) if family == socket.AF_INET6 else ('0.0.0.0', 0))
+            transport = DatagramTransport(handle)
+            transport.start(_ResolverProtocol(state.queries))
+            state.transports[family] = transport
+        return transport
+
+    @switchpoint
+    def _query_udp(self, state, server, qid, query, timeout):
+        family = _address_family(server[0])
+        transport = self._get_transport(state, family)
+        with switch_back(timeout) as switcher:
+            state.queries[qid] = (switcher, server)
+            switcher.add_cleanup(state.queries.pop, qid, None)
+            transport.sendto(query, server)
+            result = state.hub.switch()
+        return result[0][0]
+
+    @switchpoint
+    def _query_tcp(self, server, query, timeout):
+        handle, error = _connect_tcp([server], timeout)
+        if error:
+            raise TransportError.from_errno(error)
+        transport, protocol = create_connection(lambda: StreamProtocol(timeout), handle)
+        try:
+            protocol.stream.write(struct.pack('!H', len(query)) + query)
+            size = struct.unpack('!H', protocol.stream.readexactly(2))[0]
+            return protocol.stream.readexactly(size)
+        finally:
+            transport.close()
+
+    @switchpoint
+    def query(self, name, qtype, timeout=30):
+        """Send a query for *name* and record type *qtype*.
+
+        The name servers are tried in order. A name server that does not reply
+        within the per-attempt timeout from resolv.conf, or that returns an
+        error other than NXDOMAIN, is skipped. If no name server replied after
+        the configured number of attempts, ``UV_EAI_AGAIN`` is raised. A
+        :class:`Timeout` is raised if there was no reply after *timeout*
+        seconds in total.
+
+        The return value is the reply as a :class:`dns_message` tuple.
+        """
+        state = self._get_state()
+        hub = state.hub
+        hub.loop.update_time()
+        deadline = hub.loop.now() + timeout * 1000 if timeout is not None else None
+        for attempt in range(self._attempts):
+            for server in self._nameservers:
+                remaining = self._timeout
+                if deadline is not None:
+                    remaining = min(remaining, (deadline - hub.loop.now()) / 1000.)
+                    if remaining <= 0:
+                        raise Timeout('timeout resolving {}'.format(name))
+                qid = self._random.randrange(1, 65536)
+                while qid in state.queries:
+                    qid = self._random.randrange(1, 65536)
+                try:
+                    query = build_query(qid, name, qtype)
+                except ValueError as e:
+                    # An empty label, or one that is longer than 63 bytes.
+                    self._log.debug('cannot query {}: {!s}', name, e)
+                    raise _eai_error(pyuv.errno.UV_EAI_NONAME, name)
+                try:
+                    reply = parse_message(self._query_udp(state, server, qid, query, remaining))
+                    if reply.flags & F_TRUNCATED:
+                        self._log.debug('truncated reply from {}, retrying over TCP', server)
+                        reply = parse_message(self._query_tcp(server, query, remaining))
+                except (Timeout, TransportError, ValueError) as e:
+                    self._log.debug('no usable reply from {}: {!s}', server, e)
+                    continue
+                if reply.id != qid or not reply.flags & F_RESPONSE:
+                    continue
+                if reply.flags & 0xf in (R_NOERROR, R_NXDOMAIN):
+                    return reply
+                self._log.debug('error {} from {}', reply.flags & 0xf, server)
+        raise _eai_error(pyuv.errno.UV_EAI_AGAIN, name)
+
+    def _candidates(self, name):
+        # Return the names to query for *name*, applying the search list.
+        if name.endswith('.') or not self._search:
+            return [name]
+        searched = ['{}.{}'.format(name, domain) for domain in self._search]
+        if name.count('.') >= self._ndots:
+            return [name] + searched
+        return searched + [name]
+
+    @switchpoint
+    def resolve(self, name, family=0, timeout=30):
+        """Resolve the host *name* to a list of ``(family, address)`` tuples.
+
+        If *family* is ``AF_UNSPEC`` (0), both IPv6 and IPv4 addresses are
+        looked up concurrently, and the IPv6 addresses are returned first.
+        """
+        qtypes = []
+        if family in (0, socket.AF_INET6):
+            qtypes.append((socket.AF_INET6, T_AAAA))
+        if family in (0, socket.AF_INET):
+            qtypes.append((socket.AF_INET, T_A))
+        addrfamily = _address_family(name)
+        if addrfamily is not None:
+            if family not in (0, addrfamily):
+                raise _eai_error(pyuv.errno.UV_EAI_ADDRFAMILY, name)
+            return [(addrfamily, name)]
+        addresses = self._hosts.get(name.lower().rstrip('.'), [])
+        result = [(fam, addr) for fam, _ in qtypes for addr in addresses
+                  if _address_family(addr) == fam]
+        if result:
+            return result
+        for candidate in self._candidates(name):
+            replies = [None] * len(qtypes)
+
+            def run_query(i, qtype):
+                try:
+                    replies[i] = self.query(candidate, qtype, timeout)
+                except Cancelled:
+                    raise
+                except Exception as e:
+                    replies[i] = e
+            fibers = [spawn(run_query, i, qtype) for i, (_, qtype) in enumerate(qtypes[1:], 1)]
+            try:
+                run_query(0, qtypes[0][1])
+                for fiber in fibers:
+                    fiber.join()
+            finally:
+                # Don't leave the other queries running if we are cancelled.
+                for fiber in fibers:
+                    fiber.cancel()
+            for (fam, qtype), reply in zip(qtypes, replies):
+                if isinstance(reply, Exception):
+                    continue
+                for rname, rtype, rclass, ttl, rdata in reply.answers:
+                    if rtype == qtype and rclass == C_IN:
+                        result.append((fam, socket.inet_ntop(fam, rdata)))
+            if result:
+                return result
+            errors = [reply for reply in replies if isinstance(reply, Exception)]
+            if len(errors) == len(replies):
+                raise errors[0]
+        raise _eai_error(pyuv.errno.UV_EAI_NONAME, name)
+
+    @switchpoint
+    def getaddrinfo(self, node, service=0, family=0, socktype=0, protocol=0, flags=0,
+                    timeout=30):
+        """Resolve *node* and *service* into a list of socket addresses.
+
+        This method has the same signature and return value as
+        :func:`gruvi.getaddrinfo`, and can be used in its place, for example as
+        the :attr:`DnsCache.resolver`. The *flags* argument is used only for
+        ``AI_PASSIVE``.
+        """
+        if family not in (0, socket.AF_INET, socket.AF_INET6):
+            raise _eai_error(pyuv.errno.UV_EAI_FAMILY, str(family))
+        if isinstance(service, six.string_types) and not service.isdigit():
+            # Don't use socket.getservbyname(), which blocks.
+            port = self._services.get(service)
+            if port is None:
+                raise _eai_error(pyuv.errno.UV_EAI_SERVICE, service)
+        else:
+            port = int(service or 0)
+        if node is None:
+            if flags & socket.AI_PASSIVE:
+                addresses = [(socket.AF_INET6, '::'), (socket.AF_INET, '0.0.0.0')]
+            else:
+                addresses = [(socket.AF_INET6, '::1'), (socket.AF_INET, '127.0.0.1')]
+            addresses = [addr for addr in addresses if family in (0, addr[0])]
+        else:
+            addresses = self.resolve(node, family, timeout)
+        if socktype:
+            socktypes = [(socktype, protocol)]
+        else:
+            socktypes = [(socket.SOCK_STREAM, socket.IPPROTO_TCP),
+                         (socket.SOCK_DGRAM, socket.IPPROTO_UDP)]
+        result = []
+        for fam, addr in addresses:
+            sockaddr = (addr, port, 0, 0) if fam == socket.AF_INET6 else (addr, port)
+            for stype, proto in socktypes:
+                result.append(addrinfo(fam, stype, proto, '', sockaddr))
+        return result
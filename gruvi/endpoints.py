@@ -13,6 +13,8 @@ import sys
 import socket
 import functools
 import textwrap
+import collections
+import time
 import pyuv
 import six
 import errno
@@ -21,11 +23,12 @@ from . import logging, util
 from .hub import get_hub, switchpoint, switch_back
 from .sync import Event
 from .errors import Timeout
-from .transports import TransportError, Transport
-from .ssl import SslTransport, create_ssl_context
+from .transports import TransportError, Transport, DatagramTransport
+from .ssl import SslTransport, get_ssl_context, get_ssl_session_cache
 from .address import getaddrinfo, saddr
 
-__all__ = ['create_connection', 'create_server', 'Endpoint', 'Client', 'Server']
+__all__ = ['create_connection', 'create_server', 'create_datagram_endpoint', 'Endpoint',
+           'Client', 'Server', 'DatagramClient', 'DatagramServer']
 
 
 def _use_af_unix(addr):
@@ -63,10 +66,155 @@ def _af_unix_helper(handle, address, op):
         sock.close()
     handle.open(fd)
 
+def _reuse_port_helper(handle, family, address):
+    """Bind a :class:`pyuv.TCP` handle to *address* with ``SO_REUSEPORT`` set.
+
+    The libuv API does not allow setting socket options before bind(), so the
+    socket is created and bound via the :mod:`socket` module instead.
+    """
+    if not hasattr(socket, 'SO_REUSEPORT'):
+        raise RuntimeError('SO_REUSEPORT is not supported on this platform')
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.setblocking(False)
+        try:
+            sock.bind(address)
+        except (IOError, OSError) as e:
+            errname = 'UV_{}'.format(errno.errorcode.get(e.errno, 'UNKNOWN'))
+            errnum = getattr(pyuv.errno, errname, pyuv.errno.UV_UNKNOWN)
+            raise pyuv.error.TCPError(errnum, os.strerror(e.errno))
+        fd = os.dup(sock.fileno())
+    finally:
+        sock.close()
+    handle.open(fd)
+
+
+def _interleave_addresses(result):
+    """Order the :func:`getaddrinfo` *result* for a Happy Eyeballs connect.
+
+    As recommended by RFC 8305, the address families are interleaved, starting
+    with the family of the first address.
+    """
+    families = []
+    for res in result:
+        for family in families:
+            if family[0][0] == res[0]:
+                family.append(res)
+                break
+        else:
+            families.append([res])
+    addresses = []
+    while families:
+        for family in families:
+            addresses.append(family.pop(0)[4])
+        families = [family for family in families if family]
+    return addresses
+
+
+@switchpoint
+def _connect_tcp(addresses, timeout=None, delay=0.25):
+    """Connect a new :class:`pyuv.TCP` handle to one of *addresses*.
+
+    This implements the "Happy Eyeballs" algorithm of RFC 8305. The connection
+    attempts are started one after the other, each one *delay* seconds after
+    the previous one, or directly after the previous one failed. The first
+    attempt that succeeds wins, and all others are cancelled. Each attempt
+    times out after *timeout* seconds. If *delay* is ``None``, each attempt
+    is started only after the previous one failed.
+
+    The return value is a ``(handle, error)`` tuple.
+    """
+    hub = get_hub()
+    log = logging.get_logger()
+    addresses = list(addresses)
+    pending = {}
+    errors = []
+    next_attempt = [None]
+    # Set once an attempt has succeeded. The calling fiber may not have
+    # resumed yet, so late attempts must not start or win anymore.
+    done = [False]
+
+    def start_attempts():
+        # Start the next attempt. Returns whether any attempt is in progress.
+        if next_attempt[0]:
+            next_attempt[0].cancel()
+            next_attempt[0] = None
+        if done[0]:
+            return True
+        while addresses:
+            addr = addresses.pop(0)
+            log.debug('trying address {}', saddr(addr))
+            handle = pyuv.TCP(hub.loop)
+            try:
+                handle.connect(addr, on_connect)
+            except pyuv.error.UVError as e:
+                handle.close()
+                errors.append(e.args[0])
+                log.warning('connect() failed with error {}', e.args[0])
+                continue
+            timer = hub.call_later(timeout, on_timeout, handle) if timeout else None
+            pending[handle] = timer
+            if addresses and delay is not None:
+                next_attempt[0] = hub.call_later(delay, start_attempts)
+            break
+        return bool(pending)
+
+    def attempt_failed(handle, error):
+        timer = pending.pop(handle)
+        if timer:
+            timer.cancel()
+        handle.close()
+        errors.append(error)
+        log.warning('connect() failed with error {}', error)
+        if not start_attempts() and not done[0]:
+            switcher(None)
+
+    def on_connect(handle, error):
+        if handle not in pending:
+            return  # cancelled
+        if error:
+            attempt_failed(handle, error)
+            return
+        timer = pending.pop(handle)
+        if timer:
+            timer.cancel()
+        if done[0]:
+            handle.close()  # another attempt already won
+            return
+        done[0] = True
+        if next_attempt[0]:
+            next_attempt[0].cancel()
+            next_attempt[0] = None
+        switcher(handle)
+
+    def on_timeout(handle):
+        attempt_failed(handle, pyuv.errno.UV_ETIMEDOUT)
+
+    with switch_back() as switcher:
+        try:
+            if start_attempts():
+                handle = hub.switch()[0][0]
+            else:
+                handle = None
+        finally:
+            if next_attempt[0]:
+                next_attempt[0].cancel()
+            for other, timer in pending.items():
+                if timer:
+                    timer.cancel()
+                other.close()
+            pending.clear()
+    if handle is None:
+        return None, errors[-1] if errors else pyuv.errno.UV_EAI_NONAME
+    return handle, None
+
 
 @switchpoint
 def create_connection(protocol_factory, address, ssl=False, ssl_args={},
-                      family=0, flags=0, local_address=None, timeout=None, mode='rw'):
+                      family=0, flags=0, local_address=None, timeout=None, mode='rw',
+                      happy_eyeballs_delay=0.25):
     """Create a new client connection.
 
     This method creates a new :class:`pyuv.Handle`, connects it to *address*,
@@ -87,7 +235,9 @@ def create_connection(protocol_factory, address, ssl=False, ssl_args={},
       a :class:`pyuv.TCP` handle. The host element of the tuple the IP address
       or DNS name, and the port element is the port number or service name. The
       tuple is always passed to :func:`getaddrinfo` for resolution together
-      with the *family* and *flags* arguments.
+      with the *family* and *flags* arguments. If the name resolves to more
+      than one address, the addresses are tried using the "Happy Eyeballs"
+      algorithm of RFC 8305, see below.
     * If the address is a ``pyuv.Stream`` instance, it must be an already
       connected stream.
     * If the address is a file descriptor, then it is attached to a
@@ -97,11 +247,16 @@ def create_connection(protocol_factory, address, ssl=False, ssl_args={},
     The *ssl* parameter indicates whether SSL should be used on top of the
     stream transport. If an SSL connection is desired, then *ssl* can be set to
     ``True`` or to an :class:`ssl.SSLContext` instance. In the former case a
-    default SSL context is created. In the case of Python 2.x the :mod:`ssl`
-    module does not define an SSL context object and you can use
-    :func:`create_ssl_context` instead which works across all supported Python
-    versions. The *ssl_args* argument may be used to pass keyword arguments to
-    :class:`SslTransport`.
+    shared default SSL context is used, see :func:`get_ssl_context`. In the
+    case of Python 2.x the :mod:`ssl` module does not define an SSL context
+    object and you can use :func:`create_ssl_context` instead which works
+    across all supported Python versions. The *ssl_args* argument may be used
+    to pass keyword arguments to :class:`SslTransport`.
+
+    SSL sessions are cached per ``(host, port)`` address in the cache returned
+    by :func:`get_ssl_session_cache`. A new connection to the same address with
+    the same context resumes the session, unless *ssl_args* contains a
+    ``session`` argument. Only sessions of completed handshakes are cached.
 
     If an SSL connection was selected, the resulting transport will be a
     :class:`SslTransport` instance, otherwise it will be a :class:`Transport`
@@ -114,6 +269,16 @@ def create_connection(protocol_factory, address, ssl=False, ssl_args={},
 
     The *local_address* keyword argument is relevant only for TCP transports.
     If provided, it specifies the local address to bind to.
+
+    For TCP transports, the connection attempts to the resolved addresses are
+    staggered. The address families are interleaved, and a new attempt is
+    started every *happy_eyeballs_delay* seconds, or as soon as the previous
+    attempt fails, until one succeeds. The remaining attempts are then
+    cancelled. This way a single unreachable address, for example an IPv6
+    address on a network without IPv6 connectivity, does not delay the
+    connection. Each attempt times out after *timeout* seconds. If
+    *happy_eyeballs_delay* is ``None``, the addresses are tried one after the
+    other. Pass a specific *family* to only try addresses of that family.
     """
     hub = get_hub()
     log = logging.get_logger()
@@ -124,7 +289,9 @@ def create_connection(protocol_factory, address, ssl=False, ssl_args={},
         handle_type = pyuv.TCP
         result = getaddrinfo(address[0], address[1], family, socket.SOCK_STREAM,
                              socket.IPPROTO_TCP, flags)
-        addresses = [res[4] for res in result]
+        handle, error = _connect_tcp(_interleave_addresses(result), timeout,
+                                     happy_eyeballs_delay)
+        addresses = []
     elif isinstance(address, int):
         if os.isatty(address):
             if mode not in ('r', 'w'):
@@ -165,8 +332,16 @@ def create_connection(protocol_factory, address, ssl=False, ssl_args={},
     if local_address:
         handle.bind(*local_address)
     protocol = protocol_factory()
+    session_key = None
     if ssl:
-        context = ssl if hasattr(ssl, 'set_ciphers') else create_ssl_context()
+        context = ssl if hasattr(ssl, 'set_ciphers') else get_ssl_context()
+        # Resume a cached session for this address, if there is one. Only
+        # (host, port) addresses are cached, not handles or file descriptors.
+        if isinstance(address, tuple):
+            session_key = (address, ssl_args.get('server_hostname'))
+        if session_key and 'session' not in ssl_args:
+            session = get_ssl_session_cache().get(session_key, context)
+            ssl_args = dict(ssl_args, session=session)
         transport = SslTransport(handle, context, False, **ssl_args)
     else:
         transport = Transport(handle, mode)
@@ -174,12 +349,28 @@ def create_connection(protocol_factory, address, ssl=False, ssl_args={},
     if events:
         for event in events:
             event.wait()
+    if session_key and transport.get_extra_info('ssl_active'):
+        # The handshake completed. With TLS 1.3 the session tickets are sent
+        # after the handshake, so save the session again when the connection
+        # is lost, to cache the latest.
+        _save_ssl_session(transport, session_key)
+        protocol.connection_lost = functools.partial(_save_ssl_session, transport,
+                                                     session_key, protocol.connection_lost)
     return (transport, protocol)
 
 
+def _save_ssl_session(transport, key, connection_lost=None, exc=None):
+    # Store the session of a client side SslTransport in the session cache.
+    # Also chained into protocol.connection_lost().
+    session = transport.get_extra_info('session')
+    get_ssl_session_cache().put(key, transport.get_extra_info('sslctx'), session)
+    if connection_lost is not None:
+        connection_lost(exc)
+
+
 @switchpoint
 def create_server(protocol_factory, address=None, ssl=False, ssl_args={},
-                  family=0, flags=0, backlog=128):
+                  family=0, flags=0, backlog=128, reuse_port=False):
     """
     Create a new network server.
 
@@ -209,15 +400,74 @@ def create_server(protocol_factory, address=None, ssl=False, ssl_args={},
     The *backlog* parameter specifies the listen backlog i.e the maximum
     number of not yet accepted connections to queue.
 
+    The *reuse_port* parameter is relevant only for TCP addresses. If set, the
+    ``SO_REUSEPORT`` socket option is set before binding. This allows multiple
+    processes to bind to the same address, with the kernel load balancing new
+    connections between them. See also :class:`PreforkServer`.
+
     The return value is a :class:`Server` instance that can be used to control
     the listening transports.
     """
     server = Server(protocol_factory)
     server.listen(address, ssl=ssl, ssl_args=ssl_args, family=family,
-                  flags=flags, backlog=backlog)
+                  flags=flags, backlog=backlog, reuse_port=reuse_port)
     return server
 
 
+@switchpoint
+def create_datagram_endpoint(protocol_factory, local_address=None, remote_address=None,
+                             family=0, flags=0, reuse_address=False, mode='rw'):
+    """Create a new datagram (UDP) endpoint.
+
+    This method creates a new :class:`pyuv.UDP` handle and wraps it in a
+    :class:`DatagramTransport`. A new protocol is created by calling
+    *protocol_factory* and the transport is started on it. The results are
+    returned as a ``(transport, protocol)`` tuple.
+
+    The *local_address* and *remote_address* arguments are ``(host, port)``
+    tuples. They are resolved with :func:`getaddrinfo` together with the
+    *family* and *flags* arguments. If *local_address* is provided, the handle
+    is bound to it. If *remote_address* is provided, it becomes the default
+    destination for :meth:`DatagramTransport.sendto`. At least one of both
+    must be provided.
+
+    If *reuse_address* is set, the handle is bound with the
+    ``UV_UDP_REUSEADDR`` flag. This sets ``SO_REUSEADDR`` (or ``SO_REUSEPORT``
+    on BSD platforms), which allows multiple sockets to bind to the same
+    address. Note that on Linux this does not distribute incoming datagrams
+    between the sockets.
+
+    The *mode* parameter specifies if the transport should be read-only
+    (``'r'``), write-only (``'w'``) or read-write (``'rw'``).
+    """
+    hub = get_hub()
+    if local_address is None and remote_address is None:
+        raise ValueError('local_address or remote_address is required')
+    remote = None
+    if remote_address is not None:
+        result = getaddrinfo(remote_address[0], remote_address[1], family,
+                             socket.SOCK_DGRAM, socket.IPPROTO_UDP, flags)
+        family, remote = result[0][0], result[0][4]
+    if local_address is not None:
+        result = getaddrinfo(local_address[0], local_address[1], family,
+                             socket.SOCK_DGRAM, socket.IPPROTO_UDP, flags | socket.AI_PASSIVE)
+        local = result[0][4]
+    elif family == socket.AF_INET6:
+        local = ('::', 0)
+    else:
+        local = ('0.0.0.0', 0)
+    handle = pyuv.UDP(hub.loop)
+    try:
+        handle.bind(local, pyuv.UV_UDP_REUSEADDR if reuse_address else 0)
+    except pyuv.error.UVError:
+        handle.close()
+        raise
+    protocol = protocol_factory()
+    transport = DatagramTransport(handle, mode, remote_address=remote)
+    transport.start(protocol)
+    return (transport, protocol)
+
+
 class Endpoint(object):
     """A communications endpoint."""
 
@@ -281,10 +531,40 @@ class Client(Endpoint):
 
 
 class Server(Endpoint):
-    """A server endpoint."""
+    """A server endpoint.
+
+    The number of concurrent connections can be limited by setting
+    :attr:`max_connections`. When the limit is reached, the server stops
+    accepting new connections. New connections then wait in the listen
+    backlog of the operating system, which pushes back on the clients, instead
+    of being accepted and reset. Accepting is resumed when the number of
+    connections drops below :attr:`low_water_connections`.
+    """
 
+    #: The maximum number of concurrent connections, or ``None`` for no limit.
     max_connections = None
 
+    #: When the server is at :attr:`max_connections`, accepting is resumed
+    #: when the number of connections drops below this number. The default
+    #: of ``None`` means :attr:`max_connections`.
+    low_water_connections = None
+
+    #: The size of the admission queue. When the server is at
+    #: :attr:`max_connections`, up to this many new connections are accepted
+    #: and queued, before accepting is stopped. Queued connections are started
+    #: in order when connections are closed.
+    max_queued_connections = 0
+
+    #: Queued connections that could not be started within this number of
+    #: seconds are closed. ``None`` means no timeout.
+    admission_timeout = None
+
+    #: Connections on which no data was read or written for this number of
+    #: seconds are closed. ``None`` means no timeout. See
+    #: :meth:`~gruvi.BaseProtocol.set_idle_timeout`. The timeout should be
+    #: longer than the time it takes to handle a request.
+    idle_timeout = None
+
     def __init__(self, protocol_factory, timeout=None):
         super(Server, self).__init__(protocol_factory, timeout=timeout)
         self._handles = []
@@ -292,6 +572,9 @@ class Server(Endpoint):
         self._connections = dict()
         self._all_closed = Event()
         self._all_closed.set()
+        self._queued = collections.deque()
+        self._paused = []
+        self._reset_stats()
 
     @property
     def addresses(self):
@@ -303,20 +586,96 @@ class Server(Endpoint):
         """An iterator yielding the (transport, protocol) pairs for each connection."""
         return self._connections.items()
 
+    def _reset_stats(self):
+        self._accepted = self._rejected = self._pauses = 0
+        self._stats_start = time.time()
+
+    def stats(self, reset=False):
+        """Return a dictionary with connection statistics.
+
+        The statistics are: "accepted" (the number of accepted connections),
+        "accept_rate" (the number of accepted connections per second),
+        "rejected" (the number of queued connections that were closed before
+        they could be started), "pauses" (the number of times accepting was
+        stopped because the server was at capacity), and the current values
+        of "connections" and "queued".
+
+        If *reset* is true, the counters are reset to zero.
+        """
+        elapsed = time.time() - self._stats_start
+        stats = {'accepted': self._accepted, 'rejected': self._rejected,
+                 'pauses': self._pauses, 'connections': len(self._connections),
+                 'queued': len(self._queued),
+                 'accept_rate': self._accepted / elapsed if elapsed > 0 else 0.0}
+        if reset:
+            self._reset_stats()
+        return stats
+
+    def _at_capacity(self):
+        return self.max_connections is not None \
+                    and len(self._connections) >= self.max_connections
+
     def _on_new_connection(self, ssl, ssl_args, handle, error):
         # Callback used with handle.listen().
         assert handle in self._handles
         if error:
             self._log.warning('error {} in listen() callback', error)
             return
+        if self._paused or self._at_capacity() \
+                    and len(self._queued) >= self.max_queued_connections:
+            # Do not accept. Libuv stops polling the listening socket until the
+            # pending connection is accepted. New connections queue up in the
+            # backlog of the operating system.
+            if not self._paused:
+                self._log.warning('max connections reached, pausing accept')
+                self._pauses += 1
+            self._paused.append((handle, ssl, ssl_args))
+            return
         client = type(handle)(self._hub.loop)
         handle.accept(client)
-        if self.max_connections is not None and len(self._connections) >= self.max_connections:
-            self._log.warning('max connections reached, dropping new connection')
-            client.close()
+        self._accepted += 1
+        if self._at_capacity():
+            timer = None
+            if self.admission_timeout is not None:
+                timer = self._hub.call_later(self.admission_timeout, self._admission_expired,
+                                             client)
+            self._queued.append((client, ssl, ssl_args, timer))
+            return
+        self._start_connection(client, ssl, ssl_args)
+
+    def _admission_expired(self, client):
+        # Callback used with call_later() for queued connections.
+        for entry in self._queued:
+            if entry[0] is client:
+                self._queued.remove(entry)
+                break
+        self._log.warning('connection not admitted within timeout, closing')
+        self._rejected += 1
+        client.close()
+
+    def _admit_connections(self):
+        # Start queued connections, and resume accepting, after connections
+        # were closed.
+        while self._queued and not self._at_capacity():
+            client, ssl, ssl_args, timer = self._queued.popleft()
+            if timer:
+                timer.cancel()
+            self._start_connection(client, ssl, ssl_args)
+        low_water = self.low_water_connections
+        if low_water is None:
+            low_water = self.max_connections
+        if not self._paused or low_water is not None and len(self._connections) >= low_water:
             return
+        self._log.debug('resuming accept')
+        paused, self._paused = self._paused, []
+        for handle, ssl, ssl_args in paused:
+            if not handle.closed:
+                self._on_new_connection(ssl, ssl_args, handle, None)
+
+    def _start_connection(self, client, ssl, ssl_args):
+        # Wrap an accepted handle in a transport, and start a protocol on it.
         if ssl:
-            context = ssl if hasattr(ssl, 'set_ciphers') else create_ssl_context()
+            context = ssl if hasattr(ssl, 'set_ciphers') else get_ssl_context()
             transport = SslTransport(client, context, True, **ssl_args)
         else:
             transport = Transport(client)
@@ -334,6 +693,8 @@ class Server(Endpoint):
                                                      protocol, protocol.connection_lost)
         self.connection_made(transport, protocol)
         transport.start(protocol)
+        if self.idle_timeout is not None:
+            protocol.set_idle_timeout(self.idle_timeout)
 
     def _on_connection_lost(self, transport, protocol, connection_lost, exc):
         self.connection_lost(transport, protocol, exc)
@@ -341,6 +702,18 @@ class Server(Endpoint):
         self._connections.pop(transport, None)
         if not self._connections:
             self._all_closed.set()
+        if self._queued or self._paused:
+            self._admit_connections()
+
+    def _close_queued(self):
+        # Close all connections in the admission queue.
+        while self._queued:
+            client, _, _, timer = self._queued.popleft()
+            if timer:
+                timer.cancel()
+            client.close()
+            self._rejected += 1
+        del self._paused[:]
 
     def connection_made(self, transport, protocol):
         """Called when a new connection is made."""
@@ -349,7 +722,8 @@ class Server(Endpoint):
         """Called when a connection is lost."""
 
     @switchpoint
-    def listen(self, address, ssl=False, ssl_args={}, family=0, flags=0, backlog=128):
+    def listen(self, address, ssl=False, ssl_args={}, family=0, flags=0, backlog=128,
+               reuse_port=False):
         """Create a new transport, bind it to *address*, and start listening
         for new connections.
 
@@ -368,7 +742,7 @@ class Server(Endpoint):
             handle_type = pyuv.TCP
             result = getaddrinfo(address[0], address[1], family, socket.SOCK_STREAM,
                                  socket.IPPROTO_TCP, flags)
-            addresses = [res[4] for res in result]
+            addresses = [(res[0], res[4]) for res in result]
         elif isinstance(address, pyuv.Stream):
             handles.append(address)
             addresses = []
@@ -377,7 +751,13 @@ class Server(Endpoint):
         for addr in addresses:
             handle = handle_type(self._hub.loop)
             try:
-                if handle_type is pyuv.Pipe and _use_af_unix(addr):
+                if handle_type is pyuv.TCP:
+                    family, addr = addr
+                    if reuse_port:
+                        _reuse_port_helper(handle, family, addr)
+                    else:
+                        handle.bind(addr)
+                elif _use_af_unix(addr):
                     _af_unix_helper(handle, addr, 'bind')
                 else:
                     handle.bind(addr)
@@ -395,6 +775,22 @@ class Server(Endpoint):
         self._handles += handles
         self._addresses += addresses
 
+    @switchpoint
+    def shutdown(self, timeout=None):
+        """Gracefully shut down the server.
+
+        This stops listening for new connections, and then waits for up to
+        *timeout* seconds for the existing connections to be closed by their
+        peers or protocols. Any connections that remain after that are closed.
+        """
+        for handle in self._handles:
+            if not handle.closed:
+                handle.close()
+        del self._handles[:]
+        self._close_queued()
+        self._all_closed.wait(timeout)
+        self.close()
+
     @switchpoint
     def close(self):
         """Close the listening sockets and all accepted connections."""
@@ -402,11 +798,121 @@ class Server(Endpoint):
             if not handle.closed:
                 handle.close()
         del self._handles[:]
+        self._close_queued()
         for transport, _ in self.connections:
             transport.close()
         self._all_closed.wait()
 
 
+class DatagramClient(Endpoint):
+    """A datagram client endpoint.
+
+    A datagram client has a single datagram transport with a default remote
+    address.
+    """
+
+    def __init__(self, protocol_factory, timeout=None):
+        super(DatagramClient, self).__init__(protocol_factory, timeout=timeout)
+        self._endpoint = None
+
+    @property
+    def transport(self):
+        """Return the transport, or ``None`` if not connected."""
+        return self._endpoint[0] if self._endpoint else None
+
+    @property
+    def protocol(self):
+        """Return the protocol, or ``None`` if not connected."""
+        return self._endpoint[1] if self._endpoint else None
+
+    @switchpoint
+    def connect(self, address, **kwargs):
+        """Create a transport with *address* as its default remote address.
+
+        See :func:`create_datagram_endpoint` for the supported keyword
+        arguments.
+        """
+        if self._endpoint:
+            raise RuntimeError('already connected')
+        self._endpoint = create_datagram_endpoint(self._protocol_factory,
+                                                  remote_address=address, **kwargs)
+        self._endpoint[0]._log = self._log
+        self._endpoint[1]._log = self._log
+
+    def stats(self, reset=False):
+        """Return the statistics of the transport.
+
+        See :meth:`DatagramTransport.stats`.
+        """
+        if not self._endpoint:
+            raise RuntimeError('not connected')
+        return self._endpoint[0].stats(reset)
+
+    @switchpoint
+    def close(self):
+        """Close the transport."""
+        if not self._endpoint:
+            return
+        self._endpoint[0].close()
+        self._endpoint[1]._closed.wait()
+        self._endpoint = None
+
+
+class DatagramServer(Endpoint):
+    """A datagram server endpoint.
+
+    A datagram server has a datagram transport for each address that it
+    listens on. Each transport has its own protocol instance.
+    """
+
+    def __init__(self, protocol_factory, timeout=None):
+        super(DatagramServer, self).__init__(protocol_factory, timeout=timeout)
+        self._endpoints = []
+
+    @property
+    def addresses(self):
+        """A list of all listen addresses."""
+        return [transport.get_extra_info('sockname') for transport, _ in self._endpoints]
+
+    @property
+    def endpoints(self):
+        """A list with the ``(transport, protocol)`` pair for each address."""
+        return list(self._endpoints)
+
+    @switchpoint
+    def listen(self, address, **kwargs):
+        """Create a new transport that is bound to *address*.
+
+        See :func:`create_datagram_endpoint` for the supported keyword
+        arguments.
+        """
+        transport, protocol = create_datagram_endpoint(self._protocol_factory,
+                                                       local_address=address, **kwargs)
+        transport._log = protocol._log = self._log
+        self._log.debug('listen on {}', saddr(transport.get_extra_info('sockname')))
+        self._endpoints.append((transport, protocol))
+
+    def stats(self, reset=False):
+        """Return the statistics for all transports, added together.
+
+        See :meth:`DatagramTransport.stats`.
+        """
+        stats = {}
+        for transport, _ in self._endpoints:
+            for key, value in transport.stats(reset).items():
+                stats[key] = stats.get(key, 0) + value
+        return stats
+
+    @switchpoint
+    def close(self):
+        """Close all transports."""
+        for transport, _ in self._endpoints:
+            transport.close()
+        for _, protocol in self._endpoints:
+            protocol._closed.wait()
+        del self._endpoints[:]
+
+
 def add_method(template, method, globs=None, depth=1):
     """Add a method to the class that's being defined in the enclosing scope.
 
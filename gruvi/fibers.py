@@ -8,9 +8,11 @@
 
 from __future__ import absolute_import, print_function
 
+import threading
 import fibers
 
 from . import logging
+from logging import DEBUG
 from .hub import get_hub, switchpoint
 from .sync import Event
 from .errors import Cancelled, Timeout
@@ -41,7 +43,17 @@ class Fiber(fibers.Fiber):
     # Gruvi application that use the "raw" interface from the fibers package
     # are the root fiber and the Hub.
 
-    __slots__ = ('_name', 'context', '_target', '_log', '_done', '_callbacks')
+    # Creating a fiber should be cheap as a new fiber is often spawned for
+    # short lived tasks. Therefore the name is assigned, and the Event used
+    # by join() is created, only when needed. The _done attribute is None if
+    # the fiber has not completed yet, an Event if join() was called, and True
+    # if the fiber has completed. It is only changed with _done_lock held, as
+    # join() may be called from another thread.
+
+    __slots__ = ('_name', 'context', '_target', '_done', '_callbacks')
+
+    _log = logging.get_logger()
+    _done_lock = threading.Lock()
 
     def __init__(self, target, args=(), kwargs={}, name=None, hub=None):
         """
@@ -58,20 +70,19 @@ class Fiber(fibers.Fiber):
         """
         self._hub = hub or get_hub()
         super(Fiber, self).__init__(self.run, args, kwargs, self._hub)
-        if name is None:
-            fid = self._hub.data.setdefault('gruvi:next_fiber', 1)
-            name = 'Fiber-{}'.format(fid)
-            self._hub.data['gruvi:next_fiber'] += 1
         self._name = name
         self.context = ''  # for logging
         self._target = target
-        self._log = logging.get_logger()
-        self._done = Event()
+        self._done = None
         self._callbacks = None
 
     @property
     def name(self):
         """The fiber's name."""
+        if self._name is None:
+            fid = self._hub.data.setdefault('gruvi:next_fiber', 1)
+            self._name = 'Fiber-{}'.format(fid)
+            self._hub.data['gruvi:next_fiber'] += 1
         return self._name
 
     @property
@@ -82,8 +93,9 @@ class Fiber(fibers.Fiber):
     def start(self):
         """Schedule the fiber to be started in the next iteration of the
         event loop."""
-        target = getattr(self._target, '__qualname__', self._target.__name__)
-        self._log.debug('starting fiber {}, target {}', self.name, target)
+        if self._log.isEnabledFor(DEBUG):
+            target = getattr(self._target, '__qualname__', self._target.__name__)
+            self._log.debug('starting fiber {}, target {}', self.name, target)
         self._hub.run_callback(self.switch)
 
     def switch(self, value=None):
@@ -118,7 +130,13 @@ class Fiber(fibers.Fiber):
     @switchpoint
     def join(self, timeout=None):
         """Wait until the fiber completes."""
-        if not self._done.wait(timeout):
+        if self._done is True:
+            return
+        with self._done_lock:
+            done = self._done
+            if done is None:
+                done = self._done = Event()
+        if done is not True and not done.wait(timeout):
             raise Timeout('timeout waiting for fiber to exit')
 
     def run(self, *args, **kwargs):
@@ -131,13 +149,16 @@ class Fiber(fibers.Fiber):
             self._log.debug('fiber was cancelled ({!s})', e)
         except Exception:
             self._log.exception('uncaught exception in fiber')
-        self._done.set()
+        with self._done_lock:
+            done, self._done = self._done, True
+        if done is not None:
+            done.set()
         run_callbacks(self)
 
     # Support wait()
 
     def add_done_callback(self, callback, *args):
-        if self._done.is_set():
+        if self._done is True:
             callback(*args)
             return
         return add_callback(self, callback, args)
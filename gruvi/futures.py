@@ -264,6 +264,12 @@ class PoolBase(object):
                         # The future might have cancelled itself so make sure
                         # to set the exception, possibly unnecessarily.
                         fut.set_exception(e)
+                    except Exception as e:
+                        # The exception is raised by the work item, not by the
+                        # worker itself. Keep the worker around so that it can
+                        # be reused for the next work item.
+                        self._log.debug('uncaught exception in work item', exc_info=True)
+                        fut.set_exception(e)
                     except:
                         # OK to catch all since we will exit.
                         self._log.debug('uncaught exception in worker', exc_info=True)
@@ -57,7 +57,8 @@ import six
 
 from . import logging, compat
 from .hub import switchpoint
-from .errors import Error
+from .errors import Error, Timeout
+from .sync import Condition
 from .protocols import MessageProtocol
 from .stream import StreamWriter
 from .endpoints import Client, Server, add_method, add_protocol_method
@@ -66,10 +67,15 @@ from .http_ffi import lib, ffi
 from ._version import version_info
 
 from six.moves import http_client
-from six.moves.urllib_parse import urlsplit
+from six.moves.urllib_parse import urlsplit, SplitResult
 
-__all__ = ['HttpError', 'HttpRequest', 'HttpResponse', 'HttpProtocol',
-           'HttpClient', 'HttpServer']
+__all__ = ['HttpError', 'HttpRequest', 'HttpResponse', 'ResponseWriter', 'HttpProtocol',
+           'HttpClient', 'HttpConnectionPool', 'HttpServer']
+
+
+# Zero-copy body chunks are memoryviews, which can be passed to b''.join()
+# on Python 3 only. Creating them requires ffi.from_buffer() (CFFI 0.9+).
+_zero_copy_supported = six.PY3 and hasattr(ffi, 'from_buffer')
 
 
 # Export some definitions from  http.client.
@@ -274,10 +280,67 @@ class HttpMessage(object):
         self.url = None
         self.is_upgrade = None
         self.should_keep_alive = None
-        self.parsed_url = None
         self.headers = []
         self.trailers = []
         self.body = None
+        # The URL is split by http_parser_parse_url(). The components are
+        # only created when they are accessed.
+        self.url_fields = None
+        self._parsed_url = None
+
+    def get_url_field(self, field):
+        """Return URL component *field* (one of the ``UF_*`` constants of
+        http-parser), or ``None`` if the URL does not contain it."""
+        u = self.url_fields
+        if u is None:
+            return
+        if not u.field_set & (1 << field):
+            return
+        data = u.field_data[field]
+        return self.url[data.off:data.off+data.len]
+
+    @property
+    def path(self):
+        """The path component of the URL."""
+        if self.url_fields is None:
+            return self.parsed_url[2] if self.url is not None else None
+        return self.get_url_field(lib.UF_PATH) or ''
+
+    @property
+    def query(self):
+        """The query component of the URL."""
+        if self.url_fields is None:
+            return self.parsed_url[4] if self.url is not None else None
+        return self.get_url_field(lib.UF_QUERY) or ''
+
+    @property
+    def parsed_url(self):
+        """The URL as a ``(scheme, netloc, path, query, fragment)`` tuple, like
+        the result of :func:`urllib.parse.urlsplit`."""
+        if self._parsed_url is not None or self.url is None:
+            return self._parsed_url
+        u = self.url_fields
+        if u is None:
+            self._parsed_url = urlsplit(self.url)
+            return self._parsed_url
+        scheme = self.get_url_field(lib.UF_SCHEMA) or ''
+        netloc = ''
+        if u.field_set & (1 << lib.UF_HOST):
+            # The netloc runs from after "://" (or the start of the URL for a
+            # CONNECT request) to the start of the first component after it.
+            start = u.field_data[lib.UF_SCHEMA].off + len(scheme) + 3 if scheme else 0
+            end = len(self.url)
+            for field in (lib.UF_PATH, lib.UF_QUERY, lib.UF_FRAGMENT):
+                if u.field_set & (1 << field):
+                    end = min(end, u.field_data[field].off)
+            netloc = self.url[start:end]
+        self._parsed_url = SplitResult(scheme.lower(), netloc, self.path, self.query,
+                                       self.get_url_field(lib.UF_FRAGMENT) or '')
+        return self._parsed_url
+
+    @parsed_url.setter
+    def parsed_url(self, parsed_url):
+        self._parsed_url = parsed_url
 
 
 class ErrorStream(object):
@@ -599,10 +662,17 @@ class WsgiHandler(object):
         if __debug__:
             self._log.debug('request: {} {}', message.method, message.url)
         result = None
+        corked = False
         try:
             result = self._application(self._environ, self.start_response)
             if not self._status:
                 raise HttpError('WSGI handler did not call start_response()')
+            # If the body is already in memory, send the entire response with
+            # a single write. Don't do this for iterators as they may produce
+            # the body over a longer period of time.
+            corked = isinstance(result, (list, tuple))
+            if corked:
+                self._transport.cork()
             for chunk in result:
                 self.write(chunk)
             self.end_response()
@@ -610,6 +680,8 @@ class WsgiHandler(object):
             self._prev_body = self._message.body
             if hasattr(result, 'close'):
                 result.close()
+            if corked:
+                self._transport.uncork()
         if __debug__:
             ctype = get_field(self._headers, 'Content-Type', 'unknown')
             clen = get_field(self._headers, 'Content-Length', 'unknown')
@@ -654,8 +726,8 @@ class WsgiHandler(object):
         env = self._environ
         env['SERVER_PROTOCOL'] = 'HTTP/' + m.version
         env['REQUEST_METHOD'] = m.method
-        env['PATH_INFO'] = m.parsed_url[2]
-        env['QUERY_STRING'] = m.parsed_url[4]
+        env['PATH_INFO'] = m.path
+        env['QUERY_STRING'] = m.query
         for field, value in m.headers:
             name = field.upper().replace('-', '_')
             if name != 'CONTENT_LENGTH' and name != 'CONTENT_TYPE':
@@ -675,13 +747,169 @@ class WsgiHandler(object):
         env['REQUEST_SCHEME'] = env['wsgi.url_scheme']
 
 
+class ResponseWriter(object):
+    """Writes the response to a request for a native request handler.
+
+    A native handler is called as ``handler(message, writer)``, where
+    *message* is the :class:`HttpMessage` of the request and *writer* is an
+    instance of this class.
+
+    Unlike :class:`WsgiHandler`, the writer does not inspect the response
+    headers. The body framing is determined by the *content_length* argument
+    to :meth:`start`, and the "Server" and "Date" headers are always added.
+    The handler must not set these headers, nor any hop-by-hop headers.
+    """
+
+    def __init__(self, protocol):
+        self._protocol = protocol
+        self._writer = protocol._writer
+        self._message = None
+        self._started = False
+        self._ended = False
+        self._chunked = False
+        self._keepalive = False
+
+    def _reset(self, message):
+        # Prepare for the response to *message*.
+        self._message = message
+        self._started = False
+        self._ended = False
+        self._chunked = False
+        self._keepalive = False
+
+    @property
+    def started(self):
+        """Whether the response header has been written."""
+        return self._started
+
+    def _create_header(self, status, headers, content_length):
+        version = self._message.version
+        # 1xx, 204 and 304 responses never have a body, and they must not have
+        # a Content-Length header (RFC 7230, section 3.3.2).
+        code = status[:3]
+        bodyless = code[0] == '1' or code in ('204', '304')
+        if bodyless:
+            content_length = 0
+        self._chunked = content_length is None and version == '1.1'
+        self._keepalive = self._message.should_keep_alive \
+                                and (self._chunked or content_length is not None)
+        lines = ['HTTP/{} {}\r\n'.format(version, status)]
+        for name, value in headers:
+            lines.append('{}: {}\r\n'.format(name, value))
+        if content_length is not None and not bodyless:
+            lines.append('Content-Length: {}\r\n'.format(content_length))
+        elif self._chunked:
+            lines.append('Transfer-Encoding: chunked\r\n')
+        if version == '1.1' and not self._keepalive:
+            lines.append('Connection: close\r\n')
+        elif version == '1.0' and self._keepalive:
+            lines.append('Connection: keep-alive\r\n')
+        lines.append('Server: {}\r\nDate: {}\r\n\r\n'.format(self._protocol.identifier,
+                                                            rfc1123_date()))
+        return _s2b(''.join(lines))
+
+    def start(self, status, headers=(), content_length=None):
+        """Start the response.
+
+        The *status* argument is the status line, e.g. ``'200 OK'``, and
+        *headers* is a sequence of ``(name, value)`` tuples. If
+        *content_length* is not provided, the body is sent using the "chunked"
+        transfer encoding on HTTP/1.1, and the connection is closed after it on
+        HTTP/1.0.
+        """
+        if self._started:
+            raise RuntimeError('response already started')
+        self._writer.write(self._create_header(status, headers, content_length))
+        self._started = True
+
+    def write(self, data):
+        """Write *data* to the response body."""
+        if not self._started:
+            raise RuntimeError('response not started')
+        if isinstance(data, six.text_type):
+            data = data.encode('iso-8859-1')
+        if not data:
+            return
+        if self._chunked:
+            data = create_chunk(data)
+        self._writer.write(data)
+
+    def end(self, trailers=None):
+        """End the response.
+
+        The optional *trailers* argument is a sequence of ``(name, value)``
+        tuples that are sent after a chunked body.
+        """
+        if self._ended:
+            return
+        if not self._started:
+            self.start('204 No Content')
+        if self._chunked:
+            self._writer.write(create_chunked_body_end(trailers))
+        self._ended = True
+        if not self._keepalive:
+            self._writer.close()
+
+    def send(self, status, headers=(), body=b''):
+        """Send a complete response with *body* in a single write."""
+        if self._started:
+            raise RuntimeError('response already started')
+        if isinstance(body, six.text_type):
+            body = body.encode('iso-8859-1')
+        header = self._create_header(status, headers, len(body))
+        self._writer.write(header + body if body else header)
+        self._started = True
+        self.end()
+
+
+class NativeHandler(object):
+    """An adapter that runs a native request handler as a
+    :class:`MessageProtocol` message handler.
+
+    This class is used internally by :class:`HttpProtocol`. It skips the WSGI
+    environment and ``start_response()``, and passes the handler the
+    :class:`HttpMessage` and a :class:`ResponseWriter` directly.
+    """
+
+    def __init__(self, handler):
+        self._handler = handler
+        self._writer = None
+        self._log = logging.get_logger()
+        self._prev_body = None
+
+    def __call__(self, message, transport, protocol):
+        """Run a native handler."""
+        if self._writer is None:
+            self._writer = ResponseWriter(protocol)
+        if self._prev_body and not self._prev_body.eof:
+            self._log.error('body not fully read pipelined request, closing connection')
+            transport.close()
+            return
+        writer = self._writer
+        writer._reset(message)
+        if __debug__:
+            self._log.debug('request: {} {}', message.method, message.url)
+        try:
+            self._handler(message, writer)
+            writer.end()
+        finally:
+            self._prev_body = message.body
+
+
 class HttpProtocol(MessageProtocol):
     """HTTP protocol implementation."""
 
     identifier = '{0[name]}/{0[version]}'.format(version_info)
 
+    #: Whether to pass body chunks to the message body without copying them.
+    #: If set, the body :class:`~gruvi.StreamReader` is fed memoryviews of the
+    #: buffers received from the transport. Its :meth:`~StreamReader.read1`
+    #: method will then return memoryviews instead of bytes. The other read
+    #: methods always return bytes. This is supported on Python 3 only.
+    zero_copy_body = False
+
     def __init__(self, server_side, application=None, server_name=None, version='1.1',
-                 timeout=None):
+                 timeout=None, header_timeout=None, body_timeout=None, native=False):
         """
         The *server_side* argument specifies whether this is a client or server
         side protocol.
@@ -692,12 +920,28 @@ class HttpProtocol(MessageProtocol):
         The *server_name* argument can be used to override the server name for
         server side protocols. If not provided, then the socket name of the
         listening socket will be used.
+
+        The *header_timeout* and *body_timeout* arguments specify the number of
+        seconds within which the header and the body of an incoming message
+        must be received, counting from the first byte of the message and from
+        the end of the header, respectively. If a deadline is missed, the
+        connection is closed. The body deadline is suspended while reading is
+        paused because the application has not yet consumed the body that was
+        already received, so a slow handler does not cause an upload to fail.
+
+        If *native* is true, *application* is a native request handler instead
+        of a WSGI application. See :class:`ResponseWriter`.
         """
         if server_side and not application:
             raise ValueError('application is required for server-side protocol')
         super(HttpProtocol, self).__init__(server_side, timeout=timeout)
         self._server_side = server_side
-        self._message_handler = WsgiHandler(application) if server_side else None
+        if not server_side:
+            self._message_handler = None
+        elif native:
+            self._message_handler = NativeHandler(application)
+        else:
+            self._message_handler = WsgiHandler(application)
         self._server_name = server_name
         if version not in ('1.0', '1.1'):
             raise ValueError('version: unsupported version {!r}'.format(version))
@@ -709,6 +953,10 @@ class HttpProtocol(MessageProtocol):
         self._response = None
         self._writer = None
         self._message = None
+        self._data = None
+        self._data_addr = 0
+        self._header_timeout = header_timeout
+        self._body_timeout = body_timeout
 
     @property
     def server_side(self):
@@ -760,6 +1008,8 @@ class HttpProtocol(MessageProtocol):
         self._field_value = bytearray()
         assert self._header_size == 0
         self._message = HttpMessage()
+        if self._header_timeout is not None:
+            self._set_deadline(self._header_timeout)
         return 0
 
     @ffi.callback('http_data_cb')
@@ -834,19 +1084,28 @@ class HttpProtocol(MessageProtocol):
         if self._server_side:
             m.method = _http_methods.get(parser.method, '<unknown>')
             m.url = _ba2s(self._url)
-            try:
-                m.parsed_url = urlsplit(m.url)
-            except ValueError as e:
-                self._error = HttpError('urlsplit(): {!s}'.format(e))
-                return 2  # error
+            # Split the URL in C. The offsets are 16-bit, so very long URLs
+            # and URLs that http-parser can't split use urlsplit().
+            u = ffi.new('struct http_parser_url *')
+            if len(self._url) < 0x10000 and not lib.http_parser_parse_url(bytes(self._url),
+                            len(self._url), m.method == 'CONNECT', u):
+                m.url_fields = u
+            else:
+                try:
+                    m.parsed_url = urlsplit(m.url)
+                except ValueError as e:
+                    self._error = HttpError('urlsplit(): {!s}'.format(e))
+                    return 2  # error
             m.is_upgrade = lib.http_is_upgrade(parser)
         else:
             m.status_code = parser.status_code
         m.should_keep_alive = lib.http_should_keep_alive(parser)
         m.body = StreamReader(self._update_body_size)
+        if self._deadline is not None or self._body_timeout is not None:
+            self._set_deadline(self._body_timeout)
         # Make the message available. There is no need to call
         # read_buffer_size_change() here as the changes sum up to 0.
-        self._queue.put_nowait(m, self._header_size)
+        self._queue_message(m, self._header_size)
         self._header_size = 0
         # Return 1 if this is a HEAD request, 0 otherwise. This instructs the
         # parser whether or not a body follows.
@@ -858,7 +1117,11 @@ class HttpProtocol(MessageProtocol):
     def on_body(parser, at, length):
         # http-parser callback: got a body chunk
         self = ffi.from_handle(parser.data)
-        self._message.body.feed(bytes(ffi.buffer(at, length)))
+        if self._data is None:
+            self._message.body.feed(bytes(ffi.buffer(at, length)))
+        else:
+            offset = int(ffi.cast('intptr_t', at)) - self._data_addr
+            self._message.body.feed(self._data[offset:offset+length])
         return 0
 
     @ffi.callback('http_cb')
@@ -868,6 +1131,7 @@ class HttpProtocol(MessageProtocol):
         self = ffi.from_handle(parser.data)
         self._complete_header_value(b'')
         self._message.body.feed_eof()
+        self._set_deadline(None)
         return 0
 
     _settings = ffi.new('http_parser_settings *')
@@ -886,7 +1150,18 @@ class HttpProtocol(MessageProtocol):
 
     def data_received(self, data):
         # Protocol callback
-        nbytes = lib.http_parser_execute(self._parser, self._settings, data, len(data))
+        if self.zero_copy_body and _zero_copy_supported:
+            # Pass the parser a pointer into *data* itself, so that on_body()
+            # can compute the offset of a chunk and slice a memoryview.
+            buf = ffi.from_buffer(data)
+            self._data = memoryview(data)
+            self._data_addr = int(ffi.cast('intptr_t', buf))
+            try:
+                nbytes = lib.http_parser_execute(self._parser, self._settings, buf, len(data))
+            finally:
+                self._data = None
+        else:
+            nbytes = lib.http_parser_execute(self._parser, self._settings, data, len(data))
         if nbytes != len(data):
             msg = _cd2s(lib.http_errno_name(lib.http_errno(self._parser)))
             self._log.debug('http_parser_execute(): {}'.format(msg))
@@ -1039,13 +1314,242 @@ class HttpClient(Client):
         return HttpProtocol(False, server_name=self._server_name, timeout=self._timeout)
 
 
+class HttpConnectionPool(object):
+    """A pool of keep-alive HTTP client connections.
+
+    Connections are keyed by ``(host, port, ssl)``. A connection is checked
+    out of the pool with :meth:`get_client`. This returns an idle connection
+    for the key if there is one, and creates a new one otherwise. When you are
+    done with the connection, you must return it with :meth:`release`. Because
+    the connection is a regular :class:`HttpClient`, you can use
+    :meth:`HttpClient.request` and :meth:`HttpClient.getresponse`, including
+    pipelining, on it.
+
+    A connection is only put back into the pool if it can be reused. That
+    means: the connection is still open, there are no outstanding requests,
+    and the body of the last response was read completely and it did not ask
+    for the connection to be closed. Other connections are closed on release.
+    """
+
+    def __init__(self, max_connections=100, max_connections_per_host=10, idle_timeout=60,
+                 timeout=None):
+        """
+        The *max_connections* argument specifies the maximum number of
+        connections in the pool, and the *max_connections_per_host* argument
+        the maximum number of connections per key. Both idle connections and
+        connections that are checked out count towards the limits.
+
+        Connections that are idle for more than *idle_timeout* seconds are
+        closed. This happens lazily, when connections are checked out or
+        released.
+
+        The *timeout* argument is passed to the :class:`HttpClient` instances
+        created by the pool, and is also the default timeout for waiting for a
+        connection in :meth:`get_client`.
+        """
+        self._max_connections = max_connections
+        self._max_connections_per_host = max_connections_per_host
+        self._idle_timeout = idle_timeout
+        self._timeout = timeout
+        self._idle = {}     # key -> [(client, idle_since), ...], oldest first
+        self._counts = {}   # key -> number of connections
+        self._keys = {}     # checked out client -> key
+        self._nconnections = 0
+        self._last_expire = 0
+        self._closed = False
+        self._cond = Condition()
+        self._log = logging.get_logger(self)
+
+    @property
+    def max_connections(self):
+        """The maximum number of connections."""
+        return self._max_connections
+
+    @property
+    def max_connections_per_host(self):
+        """The maximum number of connections per ``(host, port, ssl)`` key."""
+        return self._max_connections_per_host
+
+    @property
+    def idle_timeout(self):
+        """The number of seconds after which idle connections are closed."""
+        return self._idle_timeout
+
+    @property
+    def connections(self):
+        """The current number of connections, both idle and checked out."""
+        return self._nconnections
+
+    def _is_healthy(self, client):
+        # Check that a connection is open and has no traffic outstanding.
+        connection = client.connection
+        if connection is None:
+            return False
+        transport, protocol = connection
+        return not (transport._error or transport._closing or transport._handle.closed
+                    or protocol._error or protocol._requests or protocol._queue.qsize())
+
+    def _can_reuse(self, client):
+        # Check that a connection can be put back in the pool.
+        if not self._is_healthy(client):
+            return False
+        response = client.protocol._response
+        return response is None or bool(response.should_keep_alive and response.body.eof)
+
+    def _close_client(self, client):
+        # Close a client without waiting for it.
+        if client.connection is not None:
+            client.connection[0].close()
+
+    def _discard(self, key, client):
+        # Remove a connection from the pool. Must be called with the lock.
+        self._counts[key] -= 1
+        if not self._counts[key]:
+            del self._counts[key]
+        self._nconnections -= 1
+        if client is not None:
+            self._close_client(client)
+
+    def _expire_idle(self, now):
+        # Close connections that were idle for too long.
+        if now - self._last_expire < min(1, self._idle_timeout):
+            return
+        self._last_expire = now
+        for key in list(self._idle):
+            idle = self._idle[key]
+            while idle and now - idle[0][1] >= self._idle_timeout:
+                client, _ = idle.pop(0)
+                self._log.debug('closing idle connection to {}', key)
+                self._discard(key, client)
+            if not idle:
+                del self._idle[key]
+
+    def _evict_oldest(self):
+        # Close the connection that was idle for the longest time, if any.
+        oldest = None
+        for key, idle in self._idle.items():
+            if idle and (oldest is None or idle[0][1] < self._idle[oldest][0][1]):
+                oldest = key
+        if oldest is None:
+            return
+        client, _ = self._idle[oldest].pop(0)
+        if not self._idle[oldest]:
+            del self._idle[oldest]
+        self._discard(oldest, client)
+
+    def _pop_idle(self, key, now):
+        # Return the most recently used healthy idle connection for *key*.
+        idle = self._idle.get(key)
+        while idle:
+            client, since = idle.pop()
+            if now - since < self._idle_timeout and self._is_healthy(client):
+                return client
+            self._discard(key, client)
+        self._idle.pop(key, None)
+
+    @switchpoint
+    def get_client(self, address, ssl=False, ssl_args={}, timeout=-1):
+        """Check out a connection to *address*.
+
+        The *address* argument must be a ``(host, port)`` tuple. The *ssl* and
+        *ssl_args* arguments are passed to :meth:`HttpClient.connect` when a
+        new connection is made.
+
+        If the connection limits have been reached, this method waits for up
+        to *timeout* seconds for a connection to be released. A negative value
+        means the timeout passed to the constructor, and ``None`` means no
+        timeout. If no connection becomes available, a :class:`Timeout` is
+        raised.
+
+        The return value is a connected :class:`HttpClient`.
+        """
+        if timeout is not None and timeout < 0:
+            timeout = self._timeout
+        key = (address[0], address[1], bool(ssl))
+        client = None
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise HttpError('connection pool is closed')
+                now = time.time()
+                self._expire_idle(now)
+                client = self._pop_idle(key, now)
+                if client is not None:
+                    break
+                if self._counts.get(key, 0) < self._max_connections_per_host:
+                    if self._nconnections >= self._max_connections:
+                        self._evict_oldest()
+                    if self._nconnections < self._max_connections:
+                        self._counts[key] = self._counts.get(key, 0) + 1
+                        self._nconnections += 1
+                        break
+                if not self._cond.wait(timeout):
+                    raise Timeout('timeout waiting for a connection')
+        if client is None:
+            self._log.debug('new connection to {}', key)
+            client = HttpClient(timeout=self._timeout)
+            kwargs = {'ssl': ssl, 'ssl_args': ssl_args} if ssl else {}
+            try:
+                client.connect(address, **kwargs)
+            except Exception:
+                with self._cond:
+                    self._discard(key, None)
+                    self._cond.notify_all()
+                raise
+        self._keys[client] = key
+        return client
+
+    @switchpoint
+    def release(self, client):
+        """Return *client*, which must have been checked out with
+        :meth:`get_client`, to the pool."""
+        key = self._keys.pop(client, None)
+        if key is None:
+            raise ValueError('client was not checked out from this pool')
+        with self._cond:
+            if not self._closed and self._can_reuse(client):
+                self._idle.setdefault(key, []).append((client, time.time()))
+            else:
+                self._discard(key, client)
+            self._expire_idle(time.time())
+            self._cond.notify_all()
+
+    @switchpoint
+    def close(self):
+        """Close all idle connections.
+
+        Connections that are checked out are closed when they are released.
+        """
+        with self._cond:
+            self._closed = True
+            for key, idle in list(self._idle.items()):
+                for client, _ in idle:
+                    self._discard(key, client)
+            self._idle.clear()
+            self._cond.notify_all()
+
+
 class HttpServer(Server):
     """A HTTP server."""
 
-    def __init__(self, application, server_name=None, timeout=None):
+    #: The number of seconds within which the header of a request must be
+    #: received, counting from its first byte. ``None`` means no timeout.
+    header_timeout = None
+
+    #: The number of seconds within which the body of a request must be
+    #: received, counting from the end of the header. Time during which reading
+    #: is paused because the application is not consuming the body does not
+    #: count. ``None`` means no timeout.
+    body_timeout = None
+
+    def __init__(self, application, server_name=None, timeout=None, native=False):
         """The constructor takes the following arguments.  The *wsgi_handler*
         argument must be a WSGI callable. See :pep:`333`.
 
+        If *native* is true, *application* is instead a native request handler
+        that is called as ``application(message, writer)``. This avoids the
+        overhead of the WSGI environment. See :class:`ResponseWriter`.
+
         The optional *server_name* argument can be used to specify a server
         name. This might be needed by the WSGI application to construct
         absolute URLs. If not provided, then the host portion of the address
@@ -1057,7 +1561,9 @@ class HttpServer(Server):
         super(HttpServer, self).__init__(self._create_protocol, timeout)
         self._application = application
         self._server_name = server_name
+        self._native = native
 
     def _create_protocol(self):
         return HttpProtocol(True, self._application, server_name=self._server_name,
-                            timeout=self._timeout)
+                            timeout=self._timeout, header_timeout=self.header_timeout,
+                            body_timeout=self.body_timeout, native=self._native)
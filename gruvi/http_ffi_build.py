@@ -0,0 +1,108 @@
+#
+# This file is part of Gruvi. Gruvi is free software available under the
+# terms of the MIT license. See the file "LICENSE" that was provided
+# together with this source file for the licensing terms.
+#
+# Copyright (c) 2012-2014 the Gruvi authors. See the file "AUTHORS" for a
+# complete list.
+
+from __future__ import absolute_import, print_function
+
+# Build script for the "gruvi._http_ffi" extension module. The extension is
+# built ahead of time by setup.py through the "cffi_modules" keyword. When it
+# is not available, http_ffi.py uses the definitions here to build it on the
+# fly instead.
+
+import os.path
+from cffi import FFI
+
+__all__ = []
+
+
+cdef = """
+    typedef struct http_parser http_parser;
+    typedef struct http_parser_settings http_parser_settings;
+
+    typedef int (*http_data_cb) (http_parser*, const char *at, size_t length);
+    typedef int (*http_cb) (http_parser*);
+
+    enum http_parser_type { HTTP_REQUEST, HTTP_RESPONSE, HTTP_BOTH, ... };
+
+    struct http_parser {
+      unsigned short http_major;
+      unsigned short http_minor;
+      unsigned short status_code;
+      unsigned char method;
+      void *data;
+      ...;
+    };
+
+    struct http_parser_settings {
+      http_cb      on_message_begin;
+      http_data_cb on_url;
+      http_cb      on_status_complete;
+      http_data_cb on_header_field;
+      http_data_cb on_header_value;
+      http_cb      on_headers_complete;
+      http_data_cb on_body;
+      http_cb      on_message_complete;
+      ...;
+    };
+
+    void http_parser_init(http_parser *parser, enum http_parser_type type);
+    size_t http_parser_execute(http_parser *parser,
+                               const http_parser_settings *settings,
+                               const char *data,
+                               size_t len);
+
+    enum http_parser_url_fields {
+      UF_SCHEMA = 0, UF_HOST = 1, UF_PORT = 2, UF_PATH = 3, UF_QUERY = 4,
+      UF_FRAGMENT = 5, UF_USERINFO = 6, UF_MAX = 7
+    };
+
+    struct http_parser_url {
+      uint16_t field_set;
+      uint16_t port;
+      struct {
+        uint16_t off;
+        uint16_t len;
+      } field_data[7];
+    };
+
+    int http_parser_parse_url(const char *buf, size_t buflen, int is_connect,
+                              struct http_parser_url *u);
+
+    int http_should_keep_alive(const http_parser *parser);
+    const char *http_method_str(enum http_method m);
+    const char *http_errno_name(enum http_errno err);
+
+    /* Extra functions to extract bitfields not supported by cffi */
+    unsigned char http_message_type(http_parser *parser);
+    unsigned char http_errno(http_parser *parser);
+    unsigned char http_is_upgrade(http_parser *parser);
+
+"""
+
+source = """
+    #include <stdlib.h>
+    #include "src/http_parser.h"
+    #include "src/http_parser.c"
+
+    unsigned char http_message_type(http_parser *p) { return p->type; }
+    unsigned char http_errno(http_parser *p) { return p->http_errno; }
+    unsigned char http_is_upgrade(http_parser *p) { return p->upgrade; }
+
+    """
+
+parent, _ = os.path.split(os.path.abspath(__file__))
+topdir, _ = os.path.split(parent)
+
+ffi = FFI()
+ffi.cdef(cdef)
+# No package prefix: setup.py sets ext_package='gruvi', which applies to
+# the CFFI extensions as well.
+ffi.set_source('_http_ffi', source, include_dirs=[topdir])
+
+
+if __name__ == '__main__':
+    ffi.compile(tmpdir=parent)
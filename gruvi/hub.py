@@ -8,7 +8,9 @@
 
 from __future__ import absolute_import, print_function
 
+import time
 import signal
+import heapq
 import collections
 import threading
 import textwrap
@@ -22,8 +24,8 @@ from . import logging, compat, util
 from .errors import Timeout
 from .callbacks import add_callback, run_callbacks
 
-__all__ = ['switchpoint', 'assert_no_switchpoints', 'switch_back', 'get_hub',
-           'Hub', 'sleep']
+__all__ = ['switchpoint', 'assert_no_switchpoints', 'switch_back', 'TimerHandle',
+           'get_hub', 'Hub', 'sleep']
 
 
 # The @switchpoint decorator dynamically compiles the wrapping code at import
@@ -182,23 +184,26 @@ class switch_back(object):
 
     def __enter__(self):
         if self._timeout is not None:
-            # There are valid scenarios for a Gruvi application where the loop
-            # will not run for a long time. For example, a single fiber program
-            # that only calls out to the loop to perform a blocking action.
-            # Since a timer captures loop->time at when it is created, we need
-            # to make sure the loop's time is up to date. That's why we call
-            # update_time().
-            self._hub.loop.update_time()
-            self._timer = pyuv.Timer(self._hub.loop)
-            self._timer.start(self, self._timeout, 0)
+            self._timer = self._hub.call_later(self._timeout, self._on_timeout)
         return self
 
     def __exit__(self, *exc_info):
         if self._timeout is not None:
-            self._timer.close()
+            self._timer.cancel()
             self._timer = None
         run_callbacks(self)
 
+    def _on_timeout(self):
+        # Called by the Hub's timer. See the comment in __call__ on locking.
+        if self._lock:
+            self._lock.acquire()
+        try:
+            self._timeout = Timeout('timeout in switch_back() block')
+            self.throw(Timeout, self._timeout)
+        finally:
+            if self._lock:
+                self._lock.release()
+
     def __call__(self, *args, **kwargs):
         # This method is thread safe if a lock was passed into the constructor
         # (and is the only method in this class for which this is the case).
@@ -208,16 +213,43 @@ class switch_back(object):
         if self._lock:
             self._lock.acquire()
         try:
-            if self._timeout is not None and args == (self._timer,):
-                self._timeout = Timeout('timeout in switch_back() block')
-                self.throw(Timeout, self._timeout)
-            else:
-                self.switch((args, kwargs))
+            self.switch((args, kwargs))
         finally:
             if self._lock:
                 self._lock.release()
 
 
+class TimerHandle(object):
+    """A handle to a callback that was scheduled with :meth:`Hub.call_later`."""
+
+    __slots__ = ('_hub', '_deadline', '_callback', '_args')
+
+    def __init__(self, hub, deadline, callback, args):
+        self._hub = hub
+        self._deadline = deadline
+        self._callback = callback
+        self._args = args
+
+    @property
+    def active(self):
+        """Whether the callback is still scheduled to run."""
+        return self._callback is not None
+
+    def cancel(self):
+        """Cancel the callback. It is not an error to cancel a callback that
+        was already run or cancelled."""
+        if self._callback is None:
+            return
+        self._callback = self._args = None
+        self._hub._timer_cancelled()
+
+
+def _noop(*args):
+    pass
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+
 _local = threading.local()
 
 def get_hub():
@@ -257,17 +289,52 @@ class Hub(fibers.Fiber):
         self._data = {}
         self._noswitch_depth = 0
         self._callbacks = collections.deque()
+        # Timers scheduled with call_later() are kept in a heap of (deadline,
+        # seq, handle) tuples, and are all run from a single pyuv.Timer. This
+        # avoids creating a new timer handle for every wait with a timeout.
+        # Cancelled timers stay in the heap until they expire, unless they
+        # are more than half of it, in which case the heap is rebuilt.
+        self._timers = []
+        self._timer_seq = itertools.count()
+        self._timers_cancelled = 0
+        self._timer_deadline = None
+        self._timer = pyuv.Timer(self._loop)
         # Thread IDs may be recycled when a thread exits. But as long as the
         # hub is alive, it won't be recycled so in that case we can use just
         # the ID as a check whether we are in the same thread or not.
         self._thread = compat.get_thread_ident()
-        self._async = pyuv.Async(self._loop, lambda h: self._loop.stop())
+        self._async = pyuv.Async(self._loop, self._on_async)
+        self._async_pending = False
         self._sigint = pyuv.Signal(self._loop)
         self._sigint.start(self._on_sigint, signal.SIGINT)
+        # Callbacks are run in batches from inside the loop: by a prepare
+        # handle right before the loop polls for I/O, and by a check handle
+        # right after. The idle handle is only active while there are pending
+        # callbacks, and causes the next poll to not block.
+        self._prepare = pyuv.Prepare(self._loop)
+        self._prepare.start(self._on_prepare)
+        self._check = pyuv.Check(self._loop)
+        self._check.start(self._run_loop_callbacks)
+        self._idle = pyuv.Idle(self._loop)
+        # Instrumentation, see stats(). The monitor timer is created by
+        # start_monitor().
+        self._switches = 0
+        self._iterations = 0
+        self._callbacks_run = 0
+        self._iteration_callbacks = 0
+        self._iteration_start = None
+        self._iteration_time = 0.0
+        self._reset_stats()
+        self._monitor = None
+        self._monitor_callback = None
+        self._monitor_interval = None
+        self._monitor_deadline = None
+        self._lag = None
         # Mark our own handles as "system handles". This allows the test suite
         # to check that no active handles except these escape from tests.
-        self._async._system_handle = True
-        self._sigint._system_handle = True
+        for handle in (self._async, self._sigint, self._timer, self._prepare,
+                       self._check, self._idle):
+            handle._system_handle = True
         self._log = logging.get_logger()
         self._log.debug('new Hub for {.name}', threading.current_thread())
         self._closing = False
@@ -286,6 +353,94 @@ class Hub(fibers.Fiber):
         Keys starting with ``'gruvi:'`` are reserved for internal use."""
         return self._data
 
+    def stats(self, reset=False):
+        """Return a snapshot of the Hub's instrumentation counters.
+
+        The return value is a dictionary with the following keys:
+
+        * ``'switches'``: the total number of switches to the Hub.
+        * ``'iterations'``: the total number of event loop iterations.
+        * ``'callbacks'``: the total number of callbacks run.
+        * ``'queue_depth'``: the number of callbacks currently waiting to run.
+        * ``'max_queue_depth'``: the maximum number of callbacks that were
+          waiting to run at the start of a batch.
+        * ``'max_iteration_callbacks'``: the maximum number of callbacks run
+          in a single loop iteration.
+        * ``'mean_iteration_time'``: the mean duration of a loop iteration, in
+          seconds. This includes time spent waiting for I/O.
+        * ``'max_iteration_time'``: the maximum duration of a loop iteration.
+        * ``'lag'``: the most recent event loop lag in seconds, or ``None`` if
+          no monitor is running. See :meth:`start_monitor`.
+        * ``'max_lag'``: the maximum measured event loop lag, or ``None``.
+
+        The maximum values are taken since the Hub was created, or since the
+        last call with *reset* set to ``True``.
+        """
+        iterations = self._iterations
+        stats = {'switches': self._switches,
+                 'iterations': iterations,
+                 'callbacks': self._callbacks_run,
+                 'queue_depth': len(self._callbacks),
+                 'max_queue_depth': self._max_queue_depth,
+                 'max_iteration_callbacks': self._max_iteration_callbacks,
+                 'mean_iteration_time': self._iteration_time / iterations if iterations else 0.0,
+                 'max_iteration_time': self._max_iteration_time,
+                 'lag': self._lag,
+                 'max_lag': self._max_lag}
+        if reset:
+            self._reset_stats()
+        return stats
+
+    def _reset_stats(self):
+        self._max_queue_depth = 0
+        self._max_iteration_callbacks = 0
+        self._max_iteration_time = 0.0
+        self._max_lag = None
+
+    def start_monitor(self, interval=1.0, callback=None):
+        """Start monitoring the event loop lag.
+
+        A timer is started that expires every *interval* seconds. The event
+        loop lag is the time between when the timer was due and when it was
+        actually run. A high lag means that the loop is saturated, e.g.
+        because callbacks or fibers run for a long time without switching.
+
+        If *callback* is provided, it is called after each measurement with
+        the result of ``stats(reset=True)`` as its argument. It is run in the
+        Hub's fiber and may therefore not call a switchpoint.
+        """
+        if self._loop is None:
+            raise RuntimeError('hub is closed')
+        self.stop_monitor()
+        self._monitor_callback = callback
+        self._monitor_interval = interval
+        self._monitor_deadline = _clock() + interval
+        self._monitor = pyuv.Timer(self._loop)
+        self._monitor._system_handle = True
+        self._monitor.start(self._on_monitor, interval, interval)
+
+    def stop_monitor(self):
+        """Stop monitoring the event loop lag."""
+        if self._monitor is None:
+            return
+        self._monitor.close()
+        self._monitor = None
+        self._monitor_callback = None
+        self._lag = None
+
+    def _on_monitor(self, handle):
+        # Monitor timer callback.
+        now = _clock()
+        self._lag = max(0.0, now - self._monitor_deadline)
+        self._max_lag = max(self._max_lag or 0.0, self._lag)
+        self._monitor_deadline = now + self._monitor_interval
+        if self._monitor_callback is None:
+            return
+        try:
+            self._monitor_callback(self.stats(reset=True))
+        except Exception:
+            self._log.exception('Ignoring exception in monitor callback:')
+
     def _on_sigint(self, h, signo):
         # SIGINT handler. Terminate the hub and switch back to the root, where
         # a KeyboardInterrupt will be raised.
@@ -303,6 +458,13 @@ class Hub(fibers.Fiber):
         else:
             self._async.send()
 
+    def _on_async(self, handle):
+        # Async handle callback. Callbacks that were queued from another thread
+        # are run by the check handle that runs next.
+        self._async_pending = False
+        if self._closing:
+            self._loop.stop()
+
     def _uncaught_exception(self, *exc_info):
         # Installed as the handler for uncaught exceptions in pyuv callbacks.
         # The exception is cleared by pyuv when this method is called. So we
@@ -333,9 +495,8 @@ class Hub(fibers.Fiber):
             self._run_callbacks()
             if self._closing:
                 break
-            mode = pyuv.UV_RUN_NOWAIT if len(self._callbacks) else pyuv.UV_RUN_DEFAULT
             with assert_no_switchpoints(self):
-                self._loop.run(mode)
+                self._loop.run(pyuv.UV_RUN_DEFAULT)
         # Hub is going to exit at this point. Clean everyting up.
         for handle in self._loop.handles:
             if not handle.closed:
@@ -348,8 +509,11 @@ class Hub(fibers.Fiber):
             del _local.hub
         self._loop = None
         self._callbacks.clear()
+        del self._timers[:]
         self._async = None
         self._sigint = None
+        self._timer = None
+        self._prepare = self._check = self._idle = None
         self._log.debug('hub fiber terminated')
         if self._error:
             raise compat.saved_exc(self._error)
@@ -375,6 +539,7 @@ class Hub(fibers.Fiber):
             raise RuntimeError('cannot switch to myself')
         elif compat.get_thread_ident() != self._thread:
             raise RuntimeError('cannot switch from a different thread')
+        self._switches += 1
         value = super(Hub, self).switch()
         if isinstance(value, Exception):
             raise value
@@ -382,12 +547,50 @@ class Hub(fibers.Fiber):
 
     def _run_callbacks(self):
         """Run registered callbacks."""
-        for i in range(len(self._callbacks)):
+        # Only run the callbacks that are queued now. Callbacks that are added
+        # by these callbacks are run in the next batch.
+        ncallbacks = len(self._callbacks)
+        if ncallbacks > self._max_queue_depth:
+            self._max_queue_depth = ncallbacks
+        self._callbacks_run += ncallbacks
+        self._iteration_callbacks += ncallbacks
+        for i in range(ncallbacks):
             callback, args = self._callbacks.popleft()
             try:
                 callback(*args)
             except Exception:
                 self._log.exception('Ignoring exception in callback:')
+        if self._callbacks:
+            if not self._idle.active:
+                self._idle.start(_noop)
+        elif self._idle.active:
+            self._idle.stop()
+
+    def _on_prepare(self, handle):
+        # Prepare handle callback. This is run once per loop iteration and is
+        # where the per iteration statistics are updated.
+        now = _clock()
+        if self._iteration_start is not None:
+            duration = now - self._iteration_start
+            self._iteration_time += duration
+            if duration > self._max_iteration_time:
+                self._max_iteration_time = duration
+            if self._iteration_callbacks > self._max_iteration_callbacks:
+                self._max_iteration_callbacks = self._iteration_callbacks
+            self._iterations += 1
+        self._iteration_start = now
+        self._iteration_callbacks = 0
+        self._run_loop_callbacks(handle)
+
+    def _run_loop_callbacks(self, handle):
+        # Prepare and check handle callback. The callbacks switch to other
+        # fibers, which is allowed here, so lift the no-switch section that
+        # run() places around the loop.
+        depth, self._noswitch_depth = self._noswitch_depth, 0
+        try:
+            self._run_callbacks()
+        finally:
+            self._noswitch_depth = depth
 
     def run_callback(self, callback, *args):
         """Queue a callback.
@@ -405,7 +608,77 @@ class Hub(fibers.Fiber):
         elif not callable(callback):
             raise TypeError('"callback": expecting a callable')
         self._callbacks.append((callback, args))  # atomic
-        self._stop_loop()
+        # In the Hub's thread, the callback is picked up by the next batch.
+        # From other threads the loop needs to be woken up. Wake-ups are
+        # coalesced until the Hub has seen the first one.
+        if compat.get_thread_ident() != self._thread and not self._async_pending:
+            self._async_pending = True
+            self._async.send()
+
+    def call_later(self, delay, callback, *args):
+        """Schedule a callback to be run after *delay* seconds.
+
+        The *callback* will be called with positional arguments *args* in the
+        Hub's fiber. Callbacks that have the same deadline are called in the
+        order that they were added.
+
+        The return value is a :class:`TimerHandle` that can be used to cancel
+        the callback.
+
+        This method is not thread-safe. It must be called from the thread that
+        runs the Hub.
+        """
+        if self._loop is None:
+            raise RuntimeError('hub is closed')
+        elif not callable(callback):
+            raise TypeError('"callback": expecting a callable')
+        # There are valid scenarios for a Gruvi application where the loop
+        # will not run for a long time. For example, a single fiber program
+        # that only calls out to the loop to perform a blocking action. Make
+        # sure the deadline is calculated from the current time.
+        self._loop.update_time()
+        deadline = self._loop.now() + delay * 1000
+        handle = TimerHandle(self, deadline, callback, args)
+        heapq.heappush(self._timers, (deadline, next(self._timer_seq), handle))
+        if self._timer_deadline is None or deadline < self._timer_deadline:
+            self._start_timer()
+        return handle
+
+    def _start_timer(self):
+        # (Re)start the timer for the earliest deadline in the heap.
+        deadline = self._timers[0][0]
+        delay = max(0, deadline - self._loop.now()) / 1000
+        self._timer.start(self._on_timer, delay, 0)
+        self._timer_deadline = deadline
+
+    def _on_timer(self, handle):
+        # Run all expired timers. The loop time has a resolution of 1 msec, so
+        # anything that is due within the current millisecond is expired.
+        self._timer_deadline = None
+        timers = self._timers
+        now = self._loop.now() + 1
+        while timers and timers[0][0] < now:
+            timer = heapq.heappop(timers)[2]
+            callback, args = timer._callback, timer._args
+            if callback is None:
+                self._timers_cancelled -= 1
+                continue
+            timer._callback = timer._args = None
+            try:
+                callback(*args)
+            except Exception:
+                self._log.exception('Ignoring exception in timer callback:')
+        if timers:
+            self._start_timer()
+
+    def _timer_cancelled(self):
+        # Called by TimerHandle.cancel().
+        self._timers_cancelled += 1
+        if self._timers_cancelled > 100 and self._timers_cancelled > len(self._timers) // 2:
+            # Update in place, as _on_timer() may be iterating over the heap.
+            self._timers[:] = [entry for entry in self._timers if entry[2]._callback]
+            heapq.heapify(self._timers)
+            self._timers_cancelled = 0
 
 
 @switchpoint
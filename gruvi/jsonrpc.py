@@ -47,6 +47,24 @@ Message handlers run in a separate "distpacher" fiber, one per connection. This
 means that a client will have at most one dispatcher fiber, while a server will
 have exactly one fiber per connection. The fact that message handlers run in a
 separate fiber allows them to call into a switchpoint.
+
+A server can optionally handle multiple requests on a connection concurrently,
+by passing it a *concurrency* argument. In this case the dispatcher hands off
+each request to a fiber from a pool that is shared by all connections. This
+prevents a slow method call from blocking the other requests on the same
+connection. Responses are sent as they complete, which means they may be sent
+in a different order than the requests were received. This is allowed by the
+JSON-RPC spec because a response is matched to its request by its ID.
+
+Messages are encoded and decoded by a codec. By default, the fastest available
+codec is used: :class:`OrjsonCodec` if the orjson_ package is installed, and
+:class:`JsonCodec` otherwise. A different codec can be passed to the protocol,
+the client and the server using their *codec* argument. A codec is an object
+with an ``encode(message)`` method that returns ``bytes``, and a
+``decode(data)`` method that takes a bytes-like object. The latter must raise
+a ``ValueError`` if the data cannot be decoded.
+
+.. _orjson: https://pypi.python.org/pypi/orjson
 """
 
 from __future__ import absolute_import, print_function
@@ -57,13 +75,19 @@ import six
 from . import compat
 from .hub import switchpoint, switch_back
 from .protocols import ProtocolError, MessageProtocol
+from .futures import FiberPool
 from .stream import StreamWriter
 from .endpoints import Client, Server, add_protocol_method
 from .address import saddr
 from .jsonrpc_ffi import lib as _lib, ffi as _ffi
 
-__all__ = ['JsonRpcError', 'JsonRpcMethodCallError', 'JsonRpcProtocol',
-           'JsonRpcClient', 'JsonRpcServer']
+__all__ = ['JsonRpcError', 'JsonRpcMethodCallError', 'JsonCodec', 'OrjsonCodec',
+           'JsonRpcProtocol', 'JsonRpcClient', 'JsonRpcServer']
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 # JSON-RPC v2.0 error codes
@@ -89,6 +113,68 @@ def strerror(code):
     return _jsonrpc_errlist.get(code, 'No error description available')
 
 
+class JsonCodec(object):
+    """A JSON codec based on the :mod:`json` module from the standard library.
+
+    Messages are encoded without any whitespace. The *dumps_args* keyword
+    arguments are passed to :class:`json.JSONEncoder` and may be used to
+    override this, e.g. ``JsonCodec(indent=2)``.
+    """
+
+    # json.loads() accepts bytes on Python 3.6+, but it also auto-detects
+    # UTF-16 and UTF-32. JSON-RPC is always UTF-8 so decode explicitly.
+
+    def __init__(self, **dumps_args):
+        dumps_args.setdefault('separators', (',', ':'))
+        self._encoder = json.JSONEncoder(**dumps_args)
+        self._decoder = json.JSONDecoder()
+
+    def encode(self, message):
+        """Encode *message* into ``bytes``."""
+        return self._encoder.encode(message).encode('utf-8')
+
+    def decode(self, data):
+        """Decode the bytes-like object *data* into a message."""
+        return self._decoder.decode(data.decode('utf-8'))
+
+
+class OrjsonCodec(JsonCodec):
+    """A JSON codec based on the third-party orjson_ package.
+
+    This codec encodes to and decodes from bytes directly. Messages that
+    orjson does not support, such as integers that do not fit in 64 bits, are
+    handled by falling back to :class:`JsonCodec`.
+    """
+
+    def __init__(self):
+        if orjson is None:
+            raise RuntimeError('the orjson package is not installed')
+        super(OrjsonCodec, self).__init__()
+
+    def encode(self, message):
+        try:
+            return orjson.dumps(message)
+        except TypeError:
+            return super(OrjsonCodec, self).encode(message)
+
+    def decode(self, data):
+        try:
+            return orjson.loads(data)
+        except ValueError:
+            # Let the standard library decide if it's really an error.
+            return super(OrjsonCodec, self).decode(data)
+
+
+_default_codec = None
+
+def get_default_codec():
+    """Return the default codec. This is the fastest available codec."""
+    global _default_codec
+    if _default_codec is None:
+        _default_codec = OrjsonCodec() if orjson is not None else JsonCodec()
+    return _default_codec
+
+
 class JsonRpcError(ProtocolError):
     """Exception that is raised in case of JSON-RPC protocol errors."""
 
@@ -243,12 +329,19 @@ class JsonRpcProtocol(MessageProtocol):
     # read_buffer_size.
     read_buffer_size = 65536
 
-    def __init__(self, message_handler=None, version='2.0', timeout=None):
-        super(JsonRpcProtocol, self).__init__(callable(message_handler), timeout=timeout)
+    # Maximum number of messages that are split in one call to the splitter.
+    _split_batch_size = 64
+
+    def __init__(self, message_handler=None, version='2.0', timeout=None, codec=None,
+                 pool=None, max_inflight=None):
+        super(JsonRpcProtocol, self).__init__(callable(message_handler), timeout=timeout,
+                                              pool=pool, max_inflight=max_inflight)
         self._message_handler = message_handler
         self._version = version
+        self._codec = codec or get_default_codec()
         self._buffer = bytearray()
         self._context = _ffi.new('struct split_context *')
+        self._offsets = _ffi.new('int[]', self._split_batch_size)
         self._method_calls = {}
         self._tracefile = None
 
@@ -271,71 +364,78 @@ class JsonRpcProtocol(MessageProtocol):
         # Return the size of the read buffer
         return len(self._buffer) + self._queue.qsize()
 
-    def _set_buffer(self, data):
-        # Note: "struct split_context" does not keep a reference to its fields!
-        # Therefore use a Python variable to keep the cdata object alive
-        self._keepalive = self._context.buf = _ffi.new('char[]', data)
-        self._context.buflen = len(data)
-        self._context.offset = 0
-
     def data_received(self, data):
         # Protocol callback
-        self._set_buffer(data)
-        offset = 0
-        # Use the CFFI JSON splitter to delineate a single JSON dictionary from
-        # the input stream. Then decode, parse and check it.
-        while offset != len(data):
-            error = _lib.json_split(self._context)
-            if error and error != _lib.INCOMPLETE:
-                self._error = JsonRpcError('json_split() error: {}'.format(error))
-                break
-            size = len(self._buffer) + self._context.offset - offset
-            if size > self._read_buffer_high or size == self._read_buffer_high \
-                            and error == _lib.INCOMPLETE:
-                self._error = JsonRpcError('message too large')
-                break
-            if error == _lib.INCOMPLETE:
-                self._buffer.extend(data[offset:])
-                break
-            chunk = data[offset:self._context.offset]
-            if self._buffer:
-                self._buffer.extend(chunk)
-                chunk = self._buffer
-                self._buffer = bytearray()
-            try:
-                chunk = chunk.decode('utf8')
-                message = json.loads(chunk)
-                version = check_message(message)
-            except UnicodeDecodeError as e:
-                self._error = JsonRpcError('UTF-8 decoding error: {!s}'.format(e))
+        # Use the CFFI JSON splitter to find the end offsets of all complete
+        # JSON dictionaries in the input in one call. The splitter scans *data*
+        # in place, without copying it. Then decode, parse and check them.
+        context = self._context
+        context.offset = offset = 0
+        while not self._error:
+            count = _lib.json_split_batch(context, data, len(data), self._offsets,
+                                          self._split_batch_size)
+            for i in range(count):
+                end = self._offsets[i]
+                size = len(self._buffer) + end - offset
+                if size > self._read_buffer_high:
+                    self._error = JsonRpcError('message too large')
+                    break
+                chunk = data[offset:end]
+                if self._buffer:
+                    self._buffer.extend(chunk)
+                    chunk = self._buffer
+                    self._buffer = bytearray()
+                if not self._message_chunk_received(chunk, size):
+                    break
+                offset = end
+            if count < self._split_batch_size or context.offset == len(data):
                 break
-            except ValueError as e:
-                self._error = JsonRpcError('Illegal JSON-RPC message: {!s}'.format(e))
-                break
-            mtype = message_type(message)
-            if self._tracefile:
-                peername = self._transport.get_extra_info('peername', '(n/a)')
-                self._tracefile.write('\n\n/* <- {} ({}; version {}) */\n'
-                                       .format(peername, mtype, version))
-                self._tracefile.write(json.dumps(message, indent=2, sort_keys=True))
-                self._tracefile.write('\n')
-                self._tracefile.flush()
-            # Now route the message to its correct destination
-            if mtype in ('response', 'error') and message['id'] in self._method_calls:
-                # Response to a method call issues through call_method()
-                switcher = self._method_calls.pop(message['id'])
-                switcher(message)
-            elif self._message_handler:
-                # Queue to the dispatcher
-                self._queue.put_nowait(message, size=size)
-            else:
-                self._log.warning('inbound {} but no message handler', mtype)
-            offset = self._context.offset
+        if not self._error:
+            if context.error == _lib.INCOMPLETE:
+                size = len(self._buffer) + len(data) - offset
+                if size >= self._read_buffer_high:
+                    self._error = JsonRpcError('message too large')
+                else:
+                    self._buffer.extend(data[offset:])
+            elif context.error:
+                self._error = JsonRpcError('json_split() error: {}'.format(context.error))
         if self._error:
             self._transport.close()
             return
         self.read_buffer_size_changed()
 
+    def _message_chunk_received(self, chunk, size):
+        # Decode, parse and check a single message, and route it to its
+        # destination. Return False if there was an error.
+        try:
+            message = self._codec.decode(chunk)
+            version = check_message(message)
+        except UnicodeDecodeError as e:
+            self._error = JsonRpcError('UTF-8 decoding error: {!s}'.format(e))
+            return False
+        except ValueError as e:
+            self._error = JsonRpcError('Illegal JSON-RPC message: {!s}'.format(e))
+            return False
+        mtype = message_type(message)
+        if self._tracefile:
+            peername = self._transport.get_extra_info('peername', '(n/a)')
+            self._tracefile.write('\n\n/* <- {} ({}; version {}) */\n'
+                                   .format(peername, mtype, version))
+            self._tracefile.write(json.dumps(message, indent=2, sort_keys=True))
+            self._tracefile.write('\n')
+            self._tracefile.flush()
+        # Now route the message to its correct destination
+        if mtype in ('response', 'error') and message['id'] in self._method_calls:
+            # Response to a method call issues through call_method()
+            switcher = self._method_calls.pop(message['id'])
+            switcher(message)
+        elif self._message_handler:
+            # Queue to the dispatcher
+            self._queue_message(message, size)
+        else:
+            self._log.warning('inbound {} but no message handler', mtype)
+        return True
+
     def message_received(self, message):
         # Protocol callback
         self._message_handler(message, self._transport, self)
@@ -359,16 +459,16 @@ class JsonRpcProtocol(MessageProtocol):
         elif self._transport is None:
             raise JsonRpcError('not connected')
         version = check_message(message)
-        serialized = json.dumps(message, indent=2)
+        serialized = self._codec.encode(message)
         if self._tracefile:
             mtype = message_type(message)
             peername = self._transport.get_extra_info('peername', '(peer n/a)')
             self._tracefile.write('\n\n/* -> {} ({}; version {}) */\n'
                                     .format(saddr(peername), mtype, version))
-            self._tracefile.write(serialized)
+            self._tracefile.write(json.dumps(message, indent=2, sort_keys=True))
             self._tracefile.write('\n')
             self._tracefile.flush()
-        self._writer.write(serialized.encode('utf-8'))
+        self._writer.write(serialized)
 
     @switchpoint
     def send_notification(self, method, *args):
@@ -411,7 +511,7 @@ class JsonRpcProtocol(MessageProtocol):
 class JsonRpcClient(Client):
     """A JSON-RPC client."""
 
-    def __init__(self, message_handler=None, version='2.0', timeout=30):
+    def __init__(self, message_handler=None, version='2.0', timeout=30, codec=None):
         """
         The *message_handler* argument specifies an optional JSON-RPC message
         handler. You need to use a message handler if you want to listen to
@@ -420,17 +520,21 @@ class JsonRpcClient(Client):
         ``message_handler(message, protocol)``.
 
         The *version* argument specifies the JSON-RPC version to use. The
-        *timeout* argument specifies the default timeout in seconds.
+        *timeout* argument specifies the default timeout in seconds. The
+        *codec* argument specifies the codec to use for encoding and decoding
+        messages. By default the fastest available codec is used.
         """
         super(JsonRpcClient, self).__init__(self._create_protocol, timeout=timeout)
         self._message_handler = message_handler
         if version not in ('1.0', '2.0'):
             raise ValueError('version: must be "1.0" or "2.0"')
         self._version = version
+        self._codec = codec
 
     def _create_protocol(self):
         # Protocol factory
-        return JsonRpcProtocol(self._message_handler, self._version, self._timeout)
+        return JsonRpcProtocol(self._message_handler, self._version, self._timeout,
+                               self._codec)
 
     add_protocol_method(JsonRpcProtocol.send_message)
     add_protocol_method(JsonRpcProtocol.send_notification)
@@ -443,7 +547,8 @@ class JsonRpcServer(Server):
 
     max_connections = 1000
 
-    def __init__(self, message_handler, version='2.0', timeout=30):
+    def __init__(self, message_handler, version='2.0', timeout=30, codec=None,
+                 concurrency=None, max_inflight=None):
         """
         The *message_handler* argument specifies the JSON-RPC message handler.
         It must be a callable with signature ``message_handler(message,
@@ -451,22 +556,45 @@ class JsonRpcServer(Server):
         fiber (one per connection).
 
         The *version* argument specifies the default JSON-RPC version. The
-        *timeout* argument specifies the default timeout.
+        *timeout* argument specifies the default timeout. The *codec* argument
+        specifies the codec to use for encoding and decoding messages. By
+        default the fastest available codec is used.
+
+        By default, the requests on a connection are handled one at a time. If
+        *concurrency* is provided, up to this many requests are handled
+        concurrently, by a pool of fibers that is shared by all connections.
+        The *max_inflight* argument limits the number of concurrent requests
+        for a single connection. It defaults to *concurrency*.
         """
         super(JsonRpcServer, self).__init__(self._create_protocol, timeout=timeout)
         self._message_handler = message_handler
         if version not in ('1.0', '2.0'):
             raise ValueError('version: must be "1.0" or "2.0"')
         self._version = version
+        self._codec = codec
+        self._concurrency = concurrency
+        self._max_inflight = max_inflight if max_inflight is not None else concurrency
+        self._pool = None
         self._tracefile = None
 
     def _create_protocol(self):
         # Protocol factory
-        protocol = JsonRpcProtocol(self._message_handler, self._version, self._timeout)
+        if self._concurrency and self._pool is None:
+            self._pool = FiberPool(self._concurrency, name='JsonRpcServer')
+        protocol = JsonRpcProtocol(self._message_handler, self._version, self._timeout,
+                                   self._codec, self._pool, self._max_inflight)
         if self._tracefile:
             protocol._set_tracefile(self._tracefile)
         return protocol
 
+    @switchpoint
+    def close(self):
+        """Close the server and wait for in-flight requests to complete."""
+        super(JsonRpcServer, self).close()
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+
     def _set_tracefile(self, tracefile):
         """Set a tracefile for all new connections."""
         self._tracefile = tracefile
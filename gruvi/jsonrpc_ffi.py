@@ -8,31 +8,18 @@
 
 from __future__ import absolute_import, print_function
 
-import os.path
-from cffi import FFI
+from . import logging
 
 __all__ = []
 
-
-ffi = FFI()
-ffi.cdef("""
-    #define OK ...
-    #define INCOMPLETE ...
-    #define ERROR ...
-
-    struct split_context {
-        const char *buf;
-        int buflen;
-        int offset;
-        int error;
-        ...;
-    };
-
-    int json_split(struct split_context *ctx);
-""")
-
-parent, _ = os.path.split(os.path.abspath(__file__))
-topdir, _ = os.path.split(parent)
-lib = ffi.verify("""
-        #include "src/json_splitter.c"
-        """, modulename='_jsonrpc_ffi', ext_package='gruvi', include_dirs=[topdir])
+try:
+    from ._jsonrpc_ffi import ffi, lib
+except ImportError as e:
+    # Not built ahead of time. See the notes in http_ffi.py.
+    logging.get_logger().debug('cannot import _jsonrpc_ffi ({!s}), using ffi.verify()', e)
+    from cffi import FFI
+    from .jsonrpc_ffi_build import cdef, source, topdir
+    ffi = FFI()
+    ffi.cdef(cdef)
+    lib = ffi.verify(source, modulename='_jsonrpc_ffi_verify', ext_package='gruvi',
+                     include_dirs=[topdir])
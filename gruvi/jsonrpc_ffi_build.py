@@ -0,0 +1,53 @@
+#
+# This file is part of Gruvi. Gruvi is free software available under the
+# terms of the MIT license. See the file "LICENSE" that was provided
+# together with this source file for the licensing terms.
+#
+# Copyright (c) 2012-2014 the Gruvi authors. See the file "AUTHORS" for a
+# complete list.
+
+from __future__ import absolute_import, print_function
+
+# Build script for the "gruvi._jsonrpc_ffi" extension module. See the notes in
+# http_ffi_build.py.
+
+import os.path
+from cffi import FFI
+
+__all__ = []
+
+
+cdef = """
+    #define OK ...
+    #define INCOMPLETE ...
+    #define ERROR ...
+
+    struct split_context {
+        const char *buf;
+        int buflen;
+        int offset;
+        int error;
+        ...;
+    };
+
+    int json_split(struct split_context *ctx);
+    int json_split_batch(struct split_context *ctx, const char *buf, int buflen,
+                         int *offsets, int maxoffsets);
+"""
+
+source = """
+        #include "src/json_splitter.c"
+        """
+
+parent, _ = os.path.split(os.path.abspath(__file__))
+topdir, _ = os.path.split(parent)
+
+ffi = FFI()
+ffi.cdef(cdef)
+# No package prefix: setup.py sets ext_package='gruvi', which applies to
+# the CFFI extensions as well.
+ffi.set_source('_jsonrpc_ffi', source, include_dirs=[topdir])
+
+
+if __name__ == '__main__':
+    ffi.compile(tmpdir=parent)
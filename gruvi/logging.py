@@ -101,6 +101,9 @@ class ContextLogger(object):
         funcname = f.f_code.co_name
         return '{}:{}!{}()'.format(fname, f.f_lineno, funcname)
 
+    def isEnabledFor(self, level):
+        return self.logger.isEnabledFor(level)
+
     def log(self, level, msg, *args, **kwargs):
         if not self.logger.isEnabledFor(level):
             return
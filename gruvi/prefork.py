@@ -0,0 +1,334 @@
+#
+# This file is part of Gruvi. Gruvi is free software available under the
+# terms of the MIT license. See the file "LICENSE" that was provided
+# together with this source file for the licensing terms.
+#
+# Copyright (c) 2012-2014 the Gruvi authors. See the file "AUTHORS" for a
+# complete list.
+
+from __future__ import absolute_import, print_function
+
+import os
+import time
+import errno
+import fcntl
+import select
+import socket
+import signal
+import pyuv
+import six
+
+from . import logging, hub as hub_module
+from .hub import get_hub
+from .sync import Event
+
+__all__ = ['PreforkServer']
+
+
+class PreforkServer(object):
+    """Run a :class:`Server` in multiple pre-forked worker processes.
+
+    Each worker process runs its own :class:`Hub`, and therefore its own event
+    loop, which allows a server to make use of multiple CPU cores.
+
+    The *server_factory* argument must be a callable that returns a new
+    :class:`Server` instance. It is called once in each worker process. The
+    *workers* argument specifies the number of worker processes. It defaults
+    to the number of CPUs.
+
+    Listen addresses are added with :meth:`listen`. By default the listening
+    sockets are created by the supervisor process and inherited by the
+    workers. If *reuse_port* is set, each worker instead binds its own socket
+    with the ``SO_REUSEPORT`` socket option set, and the kernel distributes
+    new connections between them.
+
+    The supervisor is started with :meth:`run`. It restarts workers that exit
+    unexpectedly. When the supervisor receives a ``SIGTERM`` or ``SIGINT``,
+    the workers are shut down gracefully: they stop accepting new connections
+    and get up to :attr:`shutdown_timeout` seconds to finish the existing ones.
+
+    This class is available on Posix platforms only. Because a :class:`Hub`
+    cannot be safely shared with a child process, :meth:`run` must be called
+    before a hub is created in the supervisor.
+    """
+
+    #: The number of seconds a worker gets to finish its existing connections
+    #: when it is shut down.
+    shutdown_timeout = 30
+
+    #: Workers that exit within this number of seconds of being started are
+    #: considered to be crashing. These workers are restarted with an
+    #: exponential back-off, up to :attr:`max_restart_delay` seconds.
+    min_uptime = 1
+
+    #: The maximum delay before restarting a crashing worker.
+    max_restart_delay = 30
+
+    def __init__(self, server_factory, workers=None, reuse_port=False):
+        if not hasattr(os, 'fork'):
+            raise RuntimeError('PreforkServer requires os.fork()')
+        self._server_factory = server_factory
+        self._nworkers = workers or len(pyuv.util.cpu_info())
+        self._reuse_port = reuse_port
+        self._sockets = []
+        self._addresses = []
+        self._workers = {}
+        self._restart_delays = {}
+        self._restarts = {}
+        self._wakeup = None
+        self._stopping = False
+        self._stop_requested = False
+        self._kill_requested = False
+        self._log = logging.get_logger(self)
+
+    @property
+    def workers(self):
+        """The number of worker processes."""
+        return self._nworkers
+
+    @property
+    def addresses(self):
+        """A list of the addresses that the supervisor is listening on.
+
+        This is empty if *reuse_port* was passed to the constructor, as in that
+        case the workers bind their own sockets."""
+        return [sock.getsockname() for sock, _ in self._sockets]
+
+    @property
+    def pids(self):
+        """A list with the process IDs of the running workers."""
+        return list(self._workers)
+
+    def listen(self, address, ssl=False, ssl_args={}, family=0, flags=0, backlog=128):
+        """Add a listen address.
+
+        The *address* may be a ``(host, port)`` tuple, or a string referring
+        to a Unix domain socket. See :func:`create_server` for a description of
+        the other arguments.
+
+        Unless *reuse_port* was passed to the constructor, the address is
+        bound to immediately, so that errors are raised here rather than in
+        the workers.
+        """
+        kwargs = {'ssl': ssl, 'ssl_args': ssl_args, 'backlog': backlog}
+        if self._reuse_port:
+            if not isinstance(address, tuple):
+                raise ValueError('reuse_port requires a (host, port) address')
+            kwargs.update(family=family, flags=flags)
+            self._addresses.append((address, kwargs))
+            return
+        if isinstance(address, tuple):
+            result = socket.getaddrinfo(address[0], address[1], family, socket.SOCK_STREAM,
+                                        socket.IPPROTO_TCP, flags)
+            addresses = [(res[0], res[4]) for res in result]
+        elif isinstance(address, six.string_types):
+            addresses = [(socket.AF_UNIX, address)]
+        else:
+            raise TypeError('expecting a string or tuple')
+        for family, addr in addresses:
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            try:
+                if family != socket.AF_UNIX:
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                sock.bind(addr)
+                sock.listen(backlog)
+            except socket.error:
+                sock.close()
+                raise
+            self._log.debug('listen on {}', addr)
+            self._sockets.append((sock, kwargs))
+
+    def run(self):
+        """Start the workers and supervise them.
+
+        This method returns after :meth:`stop` was called, or a ``SIGTERM`` or
+        ``SIGINT`` was received, and all workers have exited.
+        """
+        if getattr(hub_module._local, 'hub', None) is not None:
+            raise RuntimeError('PreforkServer must be run before a Hub is created')
+        if not self._sockets and not self._addresses:
+            raise RuntimeError('no listen addresses')
+        # The supervisor has no event loop, as the workers must create their
+        # hub after the fork. Instead it waits for signals on a self-pipe,
+        # with a timeout for the next scheduled worker restart.
+        self._wakeup = os.pipe()
+        for fd in self._wakeup:
+            flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+            fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+        wakeup_fd = signal.set_wakeup_fd(self._wakeup[1])
+        handlers = {}
+        for signo in (signal.SIGTERM, signal.SIGINT, signal.SIGALRM, signal.SIGCHLD):
+            handlers[signo] = signal.signal(signo, self._on_signal)
+        self._stopping = False
+        self._stop_requested = self._kill_requested = False
+        self._restarts.clear()
+        try:
+            for index in range(self._nworkers):
+                self._start_worker(index)
+            while True:
+                self._reap_workers()
+                # Signal handlers only set a flag. The work is done here.
+                if self._stop_requested and not self._stopping:
+                    self._stop_workers()
+                if self._kill_requested:
+                    self._kill_requested = False
+                    self._log.warning('workers failed to exit, killing them')
+                    self._signal_workers(signal.SIGKILL)
+                self._start_scheduled_workers()
+                if not self._workers and not self._restarts:
+                    break
+                timeout = None
+                if self._restarts:
+                    timeout = max(0, min(self._restarts.values()) - time.time())
+                try:
+                    select.select([self._wakeup[0]], [], [], timeout)
+                except (select.error, OSError) as e:
+                    if e.args[0] != errno.EINTR:
+                        raise
+                try:
+                    os.read(self._wakeup[0], 4096)
+                except OSError as e:
+                    if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                        raise
+        finally:
+            signal.alarm(0)
+            for signo, handler in handlers.items():
+                signal.signal(signo, handler)
+            signal.set_wakeup_fd(wakeup_fd)
+            for fd in self._wakeup:
+                os.close(fd)
+            self._wakeup = None
+            for sock, _ in self._sockets:
+                sock.close()
+            del self._sockets[:]
+
+    def stop(self):
+        """Gracefully stop all workers.
+
+        Workers that did not exit :attr:`shutdown_timeout` seconds after
+        being asked to are killed. This method may be called from a signal
+        handler or from another thread.
+        """
+        self._stop_requested = True
+        if self._wakeup is not None:
+            try:
+                os.write(self._wakeup[1], b'\0')
+            except OSError:
+                pass  # the pipe is full, so run() will wake up anyway
+
+    def _stop_workers(self):
+        # Called by the main loop in run() after stop() was called.
+        self._stopping = True
+        self._restarts.clear()
+        self._log.debug('stopping {} workers', len(self._workers))
+        self._signal_workers(signal.SIGTERM)
+        signal.alarm(int(self.shutdown_timeout) + 1)
+
+    def _on_signal(self, signo, frame):
+        # Signal handler in the supervisor.
+        # Only set a flag. The main loop in run() is woken up through the
+        # wakeup fd, and it does the work. This includes reaping exited
+        # workers on SIGCHLD.
+        if signo == signal.SIGALRM:
+            self._kill_requested = True
+        elif signo != signal.SIGCHLD:
+            self._stop_requested = True
+
+    def _signal_workers(self, signo):
+        for pid in self._workers:
+            try:
+                os.kill(pid, signo)
+            except OSError as e:
+                if e.errno != errno.ESRCH:
+                    raise
+
+    def _reap_workers(self):
+        # Reap all workers that have exited, without blocking.
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                elif e.errno == errno.ECHILD:
+                    self._workers.clear()
+                    break
+                raise
+            if pid == 0:
+                break
+            if pid not in self._workers:
+                continue
+            index, started = self._workers.pop(pid)
+            self._worker_exited(index, started, pid, status)
+
+    def _start_scheduled_workers(self):
+        # Start the workers whose restart delay has passed.
+        now = time.time()
+        for index, when in list(self._restarts.items()):
+            if when > now:
+                continue
+            if self._restarts.pop(index, None) is None or self._stopping:
+                continue
+            self._start_worker(index)
+
+    def _worker_exited(self, index, started, pid, status):
+        if self._stopping:
+            self._log.debug('worker {} (pid {}) exited', index, pid)
+            return
+        self._log.warning('worker {} (pid {}) exited unexpectedly with status {}',
+                          index, pid, status)
+        delay = self._restart_delays.get(index, 0)
+        if time.time() - started < self.min_uptime:
+            delay = min(max(2 * delay, 0.1), self.max_restart_delay)
+        else:
+            delay = 0
+        self._restart_delays[index] = delay
+        if delay:
+            self._log.debug('restarting worker {} in {:.1f} seconds', index, delay)
+        # The restart is done by the main loop in run(), so that a back-off
+        # delay does not hold up reaping the other workers.
+        self._restarts[index] = time.time() + delay
+
+    def _start_worker(self, index):
+        pid = os.fork()
+        if pid:
+            self._log.debug('started worker {} (pid {})', index, pid)
+            self._workers[pid] = (index, time.time())
+            return
+        # In the child. Never return from here into the supervisor's code.
+        status = 1
+        try:
+            self._worker_main()
+            status = 0
+        except BaseException:
+            self._log.exception('uncaught exception in worker {}', index)
+        finally:
+            os._exit(status)
+
+    def _worker_main(self):
+        for signo in (signal.SIGTERM, signal.SIGALRM, signal.SIGCHLD):
+            signal.signal(signo, signal.SIG_DFL)
+        # A CTRL-C in a terminal is sent to the entire process group. The
+        # supervisor turns it into a graceful shutdown by sending the workers a
+        # SIGTERM, so the workers themselves ignore it.
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.set_wakeup_fd(-1)
+        for fd in self._wakeup:
+            os.close(fd)
+        hub = get_hub()
+        hub.ignore_interrupt = True
+        server = self._server_factory()
+        for sock, kwargs in self._sockets:
+            handle_type = pyuv.Pipe if sock.family == socket.AF_UNIX else pyuv.TCP
+            handle = handle_type(hub.loop)
+            handle.open(os.dup(sock.fileno()))
+            sock.close()
+            server.listen(handle, **kwargs)
+        for address, kwargs in self._addresses:
+            server.listen(address, reuse_port=True, **kwargs)
+        stopping = Event()
+        sigterm = pyuv.Signal(hub.loop)
+        sigterm.start(lambda h, signo: stopping.set(), signal.SIGTERM)
+        stopping.wait()
+        sigterm.close()
+        server.shutdown(self.shutdown_timeout)
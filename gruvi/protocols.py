@@ -9,7 +9,7 @@
 from __future__ import absolute_import, print_function
 
 from . import logging, util
-from .sync import Event, Queue
+from .sync import Event, Queue, QueueEmpty
 from .errors import Error, Cancelled
 from .hub import get_hub
 from .fibers import Fiber
@@ -42,6 +42,11 @@ class BaseProtocol(object):
         self._may_write.set()
         self._closed = Event()
         self._reading = False
+        self._idle_timeout = None
+        self._deadline = None
+        self._deadline_left = None
+        self._timeout_check = None
+        self._timeout_check_at = None
 
     def connection_made(self, transport):
         """Called when a connection is made."""
@@ -56,6 +61,78 @@ class BaseProtocol(object):
         self._closed.set()
         self._may_write.set()
         self._transport = None
+        if self._timeout_check is not None:
+            self._timeout_check.cancel()
+            self._timeout_check = None
+
+    def set_idle_timeout(self, timeout):
+        """Close the connection when no data was read from or written to it
+        for *timeout* seconds. A *timeout* of ``None`` disables the idle
+        timeout.
+
+        The timeout does not use a timer per connection that is restarted on
+        every read or write. Instead, the transport records the time of the
+        last activity, and a single callback per connection that is scheduled
+        with :meth:`Hub.call_later` checks it when the timeout could have
+        expired.
+        """
+        self._idle_timeout = timeout
+        if timeout is not None and self._transport is not None:
+            self._schedule_timeout_check(self._transport._last_activity + timeout * 1000)
+
+    def _set_deadline(self, timeout):
+        # Close the connection if it is still open after *timeout* seconds.
+        # This replaces any previous deadline. A *timeout* of None clears the
+        # deadline. A pending check is not cancelled when the deadline moves
+        # out: it will notice that nothing expired, and reschedule itself.
+        # While reading is paused for backpressure, the deadline is suspended
+        # and only starts running once reading is resumed.
+        self._deadline_left = None
+        if timeout is None:
+            self._deadline = None
+            return
+        if self._transport is not None and not self._reading:
+            self._deadline = None
+            self._deadline_left = timeout * 1000
+            return
+        self._deadline = self._hub.loop.now() + timeout * 1000
+        self._schedule_timeout_check(self._deadline)
+
+    def _next_deadline(self):
+        # Return the earliest of the idle timeout and the deadline, as a loop
+        # time in msecs, or None if there is neither.
+        deadline = self._deadline
+        if self._idle_timeout is not None:
+            idle = self._transport._last_activity + self._idle_timeout * 1000
+            if deadline is None or idle < deadline:
+                deadline = idle
+        return deadline
+
+    def _schedule_timeout_check(self, when):
+        # Ensure that a timeout check runs no later than *when*. The callback
+        # is only rescheduled when a deadline moves closer.
+        if self._timeout_check is not None:
+            if self._timeout_check_at <= when:
+                return
+            self._timeout_check.cancel()
+        delay = max(0, when - self._hub.loop.now()) / 1000
+        self._timeout_check = self._hub.call_later(delay, self._check_timeouts)
+        self._timeout_check_at = when
+
+    def _check_timeouts(self):
+        # Callback used with call_later().
+        self._timeout_check = None
+        if self._transport is None:
+            return
+        deadline = self._next_deadline()
+        if deadline is None:
+            return
+        # The loop time has a resolution of 1 msec, see Hub._on_timer().
+        if deadline >= self._hub.loop.now() + 1:
+            self._schedule_timeout_check(deadline)
+            return
+        self._log.debug('timeout expired, closing connection')
+        self._transport.abort()
 
     def pause_writing(self):
         """Called when the write buffer in the transport has exceeded the high
@@ -83,16 +160,29 @@ class BaseProtocol(object):
         self._read_buffer_low = low
 
     def read_buffer_size_changed(self):
-        """Notify the protocol that the buffer size has changed."""
+        """Notify the protocol that the buffer size has changed.
+
+        Reading is paused when the read buffer reaches the high water mark,
+        and resumed when it drops to the low water mark. A deadline does not
+        run while reading is paused: the peer cannot make progress when it is
+        the application that is not consuming data.
+        """
         if self._transport is None:
             return
         bufsize = self.get_read_buffer_size()
         if bufsize >= self._read_buffer_high and self._reading:
             self._transport.pause_reading()
             self._reading = False
+            if self._deadline is not None:
+                self._deadline_left = max(0, self._deadline - self._hub.loop.now())
+                self._deadline = None
         elif bufsize <= self._read_buffer_low and not self._reading:
             self._transport.resume_reading()
             self._reading = True
+            if self._deadline_left is not None:
+                self._deadline = self._hub.loop.now() + self._deadline_left
+                self._deadline_left = None
+                self._schedule_timeout_check(self._deadline)
 
 
 class Protocol(BaseProtocol):
@@ -108,25 +198,37 @@ class Protocol(BaseProtocol):
 class MessageProtocol(Protocol):
     """Base class for message oriented protocols."""
 
-    def __init__(self, dispatch, timeout=None):
-        """The *dispatch* argument controls whether a fiber is started that
-        will call the :meth:`message_received` callback for incoming messages.
+    #: The number of seconds after which an idle dispatcher fiber exits. A new
+    #: dispatcher is started when the next message is queued. This keeps the
+    #: number of fibers low when there are many mostly idle connections. Set
+    #: to ``None`` to keep the dispatcher running until the connection is lost.
+    dispatcher_idle_timeout = 10
+
+    def __init__(self, dispatch, timeout=None, pool=None, max_inflight=None):
+        """The *dispatch* argument controls whether a dispatcher fiber is used
+        to call the :meth:`message_received` callback for incoming messages.
+        The dispatcher is started when the first message is queued.
 
         The *timeout* argument specifies a default timeout for various protocol
         operations.
+
+        By default, messages are dispatched one at a time. If *pool* is
+        provided, it must be a :class:`FiberPool`. In this case the dispatcher
+        fiber hands off each message to the pool, and :meth:`message_received`
+        is called concurrently for multiple messages. The *max_inflight*
+        argument limits the number of messages that are handled concurrently
+        for this connection. If it is not provided, the only limit is the size
+        of the pool.
         """
         super(MessageProtocol, self).__init__(timeout=timeout)
         self._queue = Queue()
-        if not dispatch:
-            self._dispatcher = None
-            return
-        name = util.split_cap_words(type(self).__name__)[0]
-        key = 'gruvi:next_{}_dispatcher'.format(name.lower())
-        seq = self._hub.data.setdefault(key, 1)
-        self._hub.data[key] += 1
-        name = '{}-{}'.format(name, seq)
-        self._dispatcher = Fiber(self._dispatch_loop, name=name)
-        self._dispatcher.start()
+        self._pool = pool
+        self._max_inflight = max_inflight
+        self._inflight = 0
+        self._may_dispatch = Event()
+        self._may_dispatch.set()
+        self._dispatch = dispatch
+        self._dispatcher = None
 
     @property
     def queue(self):
@@ -135,32 +237,74 @@ class MessageProtocol(Protocol):
 
     @property
     def dispatcher(self):
-        """The dispatcher fiber, or None if there is no dispatcher."""
+        """The dispatcher fiber, or None if there is no dispatcher running."""
         return self._dispatcher
 
+    @property
+    def inflight(self):
+        """The number of messages that are being handled concurrently."""
+        return self._inflight
+
     def connection_lost(self, exc):
         # Protocol callback.
         # The connection is lost, which means that no requests that is either
         # outstanding or in-progress will be able to send output to the remote
         # peer. Therefore we just to discard everything here.
+        # Messages that are being handled in the pool are allowed to complete.
         super(MessageProtocol, self).connection_lost(exc)
         if self._dispatcher:
             self._dispatcher.cancel()
             self._dispatcher = None
+        self._may_dispatch.set()
 
     def message_received(self, message):
         """Called by the dispatcher fiber when a new message is added to the
         :attr:`queue`."""
 
+    def _queue_message(self, message, size=None):
+        # Add a message to the queue. Start a dispatcher if there's none.
+        self._queue.put_nowait(message, size=size)
+        if self._dispatch and self._dispatcher is None and self._transport is not None:
+            self._start_dispatcher()
+
+    def _start_dispatcher(self):
+        name = util.split_cap_words(type(self).__name__)[0]
+        key = 'gruvi:next_{}_dispatcher'.format(name.lower())
+        seq = self._hub.data.setdefault(key, 1)
+        self._hub.data[key] += 1
+        name = '{}-{}'.format(name, seq)
+        self._dispatcher = Fiber(self._dispatch_loop, name=name)
+        self._dispatcher.start()
+
     def _dispatch_loop(self):
         # Dispatcher loop: runs in a separate fiber and is only started
         # if dispatch=True in the constructor.
         self._log.debug('dispatcher starting')
         try:
             while True:
-                message = self._queue.get()
+                # Stop taking messages off the queue while at the in-flight
+                # limit. The queue fills up, and reading will be paused.
+                self._may_dispatch.wait()
+                try:
+                    message = self._queue.get(timeout=self.dispatcher_idle_timeout)
+                except QueueEmpty:
+                    # The timeout is delivered as a callback, so a message may
+                    # have been queued after it fired but before we resumed.
+                    # _queue_message() did not start a new dispatcher then.
+                    if self._queue.qsize():
+                        continue
+                    # Idle. There is no switch between here and the end of
+                    # this fiber, so _queue_message() will start a new one.
+                    self._dispatcher = None
+                    break
                 self.read_buffer_size_changed()
-                self.message_received(message)
+                if self._pool is None:
+                    self.message_received(message)
+                    continue
+                self._inflight += 1
+                if self._max_inflight and self._inflight >= self._max_inflight:
+                    self._may_dispatch.clear()
+                self._pool.submit(self._dispatch_message, message)
         except Cancelled as e:
             self._log.debug('dispatcher was canceled')
         except ProtocolError as e:
@@ -173,9 +317,38 @@ class MessageProtocol(Protocol):
             self._transport.close()
         self._log.debug('dispatcher exiting')
 
+    def _dispatch_message(self, message):
+        # Run in a pool worker when messages are dispatched concurrently.
+        try:
+            if self._transport is None:
+                return
+            self.message_received(message)
+        except Cancelled:
+            raise
+        except Exception as e:
+            if self._transport is None:
+                return  # Connection was lost while handling this message.
+            if isinstance(e, ProtocolError):
+                self._log.error('{!s}, closing connection', e)
+                self._error = e
+            else:
+                self._log.exception('uncaught exception in message handler')
+                self._error = ProtocolError('uncaught exception in message handler')
+            self._transport.close()
+        finally:
+            self._inflight -= 1
+            if not self._max_inflight or self._inflight < self._max_inflight:
+                self._may_dispatch.set()
+
 
 class DatagramProtocol(BaseProtocol):
-    """Base classs for datagram oriented protocols."""
+    """Base classs for datagram oriented protocols.
+
+    A protocol that handles many datagrams per second can define a method
+    ``datagrams_received(datagrams)``. If it is present, the transport calls it
+    once per iteration of the event loop with a list of ``(data, addr)``
+    tuples, instead of calling :meth:`datagram_received` for each datagram.
+    """
 
     def datagram_received(self, data, addr):
         """Called when a new datagram is received."""
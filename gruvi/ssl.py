@@ -10,14 +10,19 @@ from __future__ import absolute_import, print_function
 
 import pyuv
 import ssl
+import threading
+import collections
 
 from . import compat
+from .hub import get_hub
 from .transports import Transport, TransportError
 from .sync import Event
+from .futures import get_cpu_pool
 
 from .sslcompat import SSLContext, MemoryBIO, get_reason, wrap_bio
 
-__all__ = ['SslTransport', 'create_ssl_context']
+__all__ = ['SslTransport', 'SslSessionCache', 'create_ssl_context', 'get_ssl_context',
+           'get_ssl_session_cache']
 
 
 class SslPipe(object):
@@ -40,6 +45,17 @@ class SslPipe(object):
 
     bufsize = 65536
 
+    #: The maximum size of the records that are created at the start of a
+    #: connection, and after :meth:`reset_record_size`. A small record fits in
+    #: a single TCP segment, so that the peer can decrypt it as soon as it
+    #: arrives. This reduces the time to first byte.
+    small_record_size = 1400
+
+    #: The number of plaintext bytes that are sent in small records. After
+    #: that, full size records of 16 KB are used to reduce the overhead for
+    #: bulk transfers.
+    small_record_limit = 1048576
+
     # This previously used a socketpair to communicate with the SSL protocol
     # instance but since October 2014 we're using a Memory BIO! This is
     # cleaner, and more reliable on Windows. See for example issue #12 for more
@@ -47,7 +63,7 @@ class SslPipe(object):
 
     S_UNWRAPPED, S_DO_HANDSHAKE, S_WRAPPED, S_SHUTDOWN = range(4)
 
-    def __init__(self, context, server_side, server_hostname=None):
+    def __init__(self, context, server_side, server_hostname=None, session=None):
         """
         The *context* argument specifies the :class:`ssl.SSLContext` to use.
         It is recommended to use :func:`~gruvi.ssl.create_ssl_context` so that
@@ -59,14 +75,19 @@ class SslPipe(object):
         The optional *server_hostname* argument can be used to specify the
         hostname you are connecting to. You may only specify this parameter if
         the _ssl module supports Server Name Indication (SNI).
+
+        The optional *session* argument specifies a client side
+        :class:`ssl.SSLSession` to resume. This requires Python 3.6+.
         """
         self._context = context
         self._server_side = server_side
         self._server_hostname = server_hostname
+        self._session = session
         self._state = self.S_UNWRAPPED
         self._bios = (MemoryBIO(), MemoryBIO())
         self._sslobj = None
         self._need_ssldata = False
+        self._small_left = self.small_record_limit
 
     @property
     def context(self):
@@ -78,6 +99,22 @@ class SslPipe(object):
         """The internal :class:`ssl.SSLObject` instance."""
         return self._sslobj
 
+    @property
+    def session(self):
+        """The :class:`ssl.SSLSession` of the connection, or ``None`` if
+        sessions are not supported. The session remains available after the
+        security layer was removed."""
+        if self._sslobj is not None:
+            return getattr(self._sslobj, 'session', None)
+        return self._session
+
+    @property
+    def session_reused(self):
+        """Whether the session was resumed in the handshake."""
+        if self._sslobj is not None:
+            return getattr(self._sslobj, 'session_reused', False)
+        return False
+
     @property
     def need_ssldata(self):
         """Whether more record level data is needed to complete a handshake
@@ -98,7 +135,8 @@ class SslPipe(object):
         """
         if self._state != self.S_UNWRAPPED:
             raise RuntimeError('handshake in progress or completed')
-        wrapargs = (self._bios[0], self._bios[1], self._server_side, self._server_hostname)
+        wrapargs = (self._bios[0], self._bios[1], self._server_side, self._server_hostname,
+                    self._session)
         self._sslobj = wrap_bio(self._context, *wrapargs)
         self._state = self.S_DO_HANDSHAKE
         self._on_handshake_complete = callback
@@ -170,6 +208,7 @@ class SslPipe(object):
             if self._state == self.S_SHUTDOWN:
                 # Call shutdown() until it doesn't raise anymore.
                 self._sslobj.unwrap()
+                self._session = getattr(self._sslobj, 'session', None)
                 self._sslobj = None
                 self._state = self.S_UNWRAPPED
                 if self._on_handshake_complete:
@@ -188,6 +227,15 @@ class SslPipe(object):
             ssldata.append(self._bios[1].read())
         return (ssldata, appdata)
 
+    def reset_record_size(self):
+        """Start creating small records again.
+
+        This should be called when the connection was idle for a while. After
+        an idle period, the TCP congestion window is reset, and large records
+        would again be delayed until all of their segments arrive.
+        """
+        self._small_left = self.small_record_limit
+
     def feed_appdata(self, data, offset=0):
         """Feed plaintext data into the pipe.
 
@@ -199,9 +247,13 @@ class SslPipe(object):
         NOTE: In case of short writes, this call MUST be retried with the SAME
         buffer passed into the *data* argument (i.e. the ``id()`` must be the
         same). This is an OpenSSL requirement. A further particularity is that
-        a short write will always have offset == 0, because the _ssl module
-        does not enable partial writes. And even though the offset is zero,
-        there will still be encrypted data in ssldata.
+        the _ssl module does not enable partial writes, so a short write
+        returns the offset of the first record that could not be written. Even
+        if the offset is unchanged, there will still be encrypted data in
+        ssldata.
+
+        The first :attr:`small_record_limit` bytes are sent in records of at
+        most :attr:`small_record_size` bytes. See :meth:`reset_record_size`.
         """
         if self._state == self.S_UNWRAPPED:
             # pass through data in unwrapped mode
@@ -211,7 +263,12 @@ class SslPipe(object):
         while True:
             self._need_ssldata = False
             try:
-                if offset < len(view):
+                if offset < len(view) and self._small_left > 0:
+                    end = min(len(view), offset + self.small_record_size)
+                    nbytes = self._sslobj.write(view[offset:end])
+                    self._small_left -= nbytes
+                    offset += nbytes
+                elif offset < len(view):
                     offset += self._sslobj.write(view[offset:])
             except ssl.SSLError as e:
                 # It is not allowed to call write() after unwrap() until the
@@ -223,19 +280,41 @@ class SslPipe(object):
                                    ssl.SSL_ERROR_SYSCALL):
                     raise
                 self._need_ssldata = e.errno == ssl.SSL_ERROR_WANT_READ
-            # See if there's any record level data back for us.
-            if self._bios[1].pending:
-                ssldata.append(self._bios[1].read())
             if offset == len(view) or self._need_ssldata:
                 break
+        # See if there's any record level data back for us. The outgoing BIO
+        # is a memory BIO so it never blocks, and all records produced above
+        # can be returned as a single buffer.
+        if self._bios[1].pending:
+            ssldata.append(self._bios[1].read())
         return (ssldata, offset)
 
 
 class SslTransport(Transport):
-    """An SSL/TLS transport."""
+    """An SSL/TLS transport.
+
+    Small writes that are made while a write to the underlying handle is
+    outstanding are held back, and are encrypted together into a single
+    record once it completes. Records are small at the start of a connection
+    and after it was idle, and full size for bulk transfers. See
+    :attr:`SslPipe.small_record_size`.
+    """
+
+    #: In offload mode, writes of at least this many bytes are encrypted in
+    #: the CPU thread pool.
+    offload_threshold = 65536
+
+    #: Writes are coalesced while the amount of pending plaintext is less than
+    #: this number of bytes.
+    coalesce_size = 16384
+
+    #: After no data was written for this number of seconds, small records are
+    #: used again.
+    record_size_reset = 1.0
 
     def __init__(self, handle, context, server_side, server_hostname=None,
-                 do_handshake_on_connect=True, close_on_unwrap=True):
+                 do_handshake_on_connect=True, close_on_unwrap=True, session=None,
+                 offload=False):
         """
         The *context* argument specifies the :class:`ssl.SSLContext` to use.
         You can use :func:`create_ssl_context` to create a new context which
@@ -257,13 +336,31 @@ class SslTransport(Transport):
         ability to continue using the connection after you call :meth:`unwrap`
         of when an SSL "close_notify" is received from the remote peer. The
         default is to close the connection.
+
+        The optional *session* argument specifies a :class:`ssl.SSLSession` to
+        resume for a client side transport. This requires Python 3.6+.
+
+        The optional *offload* argument enables offload mode. In this mode,
+        handshake data received from the peer, and writes of at least
+        :attr:`offload_threshold` bytes, are processed in the CPU thread pool
+        (see :func:`~gruvi.get_cpu_pool`) instead of in the Hub's thread. This
+        keeps the latency of the event loop low when many connections are
+        doing expensive public key operations at the same time. The transport
+        does not read or encrypt other data while an operation is offloaded.
         """
         super(SslTransport, self).__init__(handle)
-        self._sslpipe = SslPipe(context, server_side, server_hostname)
+        self._sslpipe = SslPipe(context, server_side, server_hostname, session)
         self._do_handshake_on_connect = do_handshake_on_connect
         self._close_on_unwrap = close_on_unwrap
         self._write_backlog = []
         self._ssl_active = Event()
+        self._offload = offload
+        self._offloading = False
+        self._read_paused = False
+        self._hub = get_hub() if offload else None
+        self._backlog_size = 0
+        self._backlog_blocked = False
+        self._last_appdata = handle.loop.now()
 
     def start(self, protocol):
         # Bind to *protocol* and start calling callbacks on it.
@@ -288,12 +385,23 @@ class SslTransport(Transport):
                                 this transport.
         ``'sslctx'``            The ``ssl.SSLContext`` instance used to create
                                 the SSL object.
+        ``'session'``           The ``ssl.SSLSession`` of the connection, or
+                                ``None`` if not supported (Python 3.6+).
+        ``'session_reused'``    Whether the session was resumed.
+        ``'ssl_active'``        Whether the handshake completed and the
+                                security layer is in effect.
         ======================  ===============================================
         """
         if name == 'ssl':
             return self._sslpipe.ssl
         elif name == 'sslctx':
             return self._sslpipe.context
+        elif name == 'session':
+            return self._sslpipe.session
+        elif name == 'session_reused':
+            return self._sslpipe.session_reused
+        elif name == 'ssl_active':
+            return self._ssl_active.is_set()
         else:
             return super(SslTransport, self).get_extra_info(name, default)
 
@@ -308,50 +416,150 @@ class SslTransport(Transport):
             raise TransportError('transport is closing/closed')
         elif len(data) == 0:
             return
+        now = self._handle.loop.now()
+        if now - self._last_appdata > self.record_size_reset * 1000:
+            self._sslpipe.reset_record_size()
+        self._last_appdata = now
         self._write_backlog.append([data, 0])
+        self._backlog_size += len(data)
         self._write_buffer_size += len(data)
         if self._write_buffer_size >= self._write_buffer_high and self._writing:
             self._writing = False
             self._protocol.pause_writing()
         self._process_write_backlog()
 
-    def _process_write_backlog(self):
+    def _process_write_backlog(self, coalesce=True):
         # Try to make progress on the write backlog.
+        if self._offloading:
+            return  # Resumed when the offloaded call completes.
+        elif coalesce and self._write_sizes and self._may_coalesce():
+            return  # Resumed by _on_write_complete()
+        elif not self._backlog_blocked:
+            self._coalesce_backlog()
         try:
             for i in range(len(self._write_backlog)):
                 data, offset = self._write_backlog[0]
                 if data:
+                    if self._offload and len(data) - offset >= self.offload_threshold:
+                        self._offload_call(self._sslpipe.feed_appdata, (data, offset),
+                                           self._appdata_encrypted)
+                        break
                     ssldata, offset = self._sslpipe.feed_appdata(data, offset)
                 elif offset:
                     ssldata, offset = self._sslpipe.do_handshake(self._ssl_active.set), 1
                 else:
                     ssldata, offset = self._sslpipe.shutdown(self._ssl_active.clear), 1
-                # Temporarily set _closing to False to prevent
-                # Transport.write() from raising an error.
-                saved, self._closing = self._closing, False
-                for chunk in ssldata:
-                    super(SslTransport, self).write(chunk)
-                self._closing = saved
-                if offset < len(data):
-                    self._write_backlog[0][1] = offset
-                    # A short write means that a write is blocked on a read
-                    # We need to enable reading if it is not enabled!!
-                    assert self._sslpipe.need_ssldata
-                    if not self._reading:
-                        self.resume_reading()
+                if not self._write_backlog_step(ssldata, offset):
                     break
-                # An entire chunk from the backlog was processed. We can
-                # delete it and reduce the outstanding buffer size.
-                del self._write_backlog[0]
-                self._write_buffer_size -= offset
         except ssl.SSLError as e:
             self._log.warning('SSL error {} (reason {})', e.errno, e.reason)
             self._error = e
             self.abort()
 
+    def _write_backlog_step(self, ssldata, offset):
+        # Write out the record level data for the first entry of the write
+        # backlog. Return whether the entry was processed completely.
+        data = self._write_backlog[0][0]
+        # Temporarily set _closing to False to prevent
+        # Transport.write() from raising an error.
+        saved, self._closing = self._closing, False
+        for chunk in ssldata:
+            super(SslTransport, self).write(chunk)
+        self._closing = saved
+        if offset < len(data):
+            self._write_backlog[0][1] = offset
+            self._backlog_blocked = True
+            # A short write means that a write is blocked on a read
+            # We need to enable reading if it is not enabled!!
+            assert self._sslpipe.need_ssldata
+            if not self._reading:
+                self.resume_reading()
+            return False
+        # An entire chunk from the backlog was processed. We can
+        # delete it and reduce the outstanding buffer size.
+        del self._write_backlog[0]
+        self._write_buffer_size -= offset
+        self._backlog_size -= len(data)
+        self._backlog_blocked = False
+        return True
+
+    def _may_coalesce(self):
+        # Whether the write backlog can be held back to coalesce more writes.
+        # Handshakes and shutdowns are never held back.
+        return self._sslpipe.wrapped and not self._backlog_blocked \
+                    and self._write_backlog and self._write_backlog[-1][0] \
+                    and self._backlog_size < self.coalesce_size
+
+    def _coalesce_backlog(self):
+        # Join the small writes at the start of the backlog into a single
+        # write, so that they are encrypted into a single record.
+        backlog = self._write_backlog
+        count = size = 0
+        for data, offset in backlog:
+            size += len(data)
+            if not data or size > self.coalesce_size:
+                break
+            count += 1
+        if count > 1:
+            joined = bytearray()
+            for entry in backlog[:count]:
+                joined += entry[0]
+            backlog[:count] = [[joined, 0]]
+
+    def flush(self):
+        """Write out all queued buffers now, including writes that are held
+        back to be coalesced."""
+        if self._error:
+            raise compat.saved_exc(self._error)
+        self._process_write_backlog(False)
+        super(SslTransport, self).flush()
+
+    def _on_write_complete(self, handle, error):
+        # Callback used with handle.write(). Encrypt the writes that were
+        # held back while the write was outstanding.
+        super(SslTransport, self)._on_write_complete(handle, error)
+        if self._write_backlog and not self._write_sizes and not self._error \
+                    and not handle.closed:
+            self._process_write_backlog()
+
+    def _appdata_encrypted(self, result):
+        # Completion of an offloaded feed_appdata().
+        if self._write_backlog_step(*result):
+            self._process_write_backlog()
+
+    def _offload_call(self, func, args, callback):
+        # Run func(*args) in the CPU pool. Reading is paused, and the write
+        # backlog is not processed, until it completes. Then *callback* is
+        # called with its result in the Hub's thread.
+        self._offloading = True
+        if not self._read_paused:
+            self._read_paused = True
+            if self._reading:
+                self._handle.stop_read()
+        future = get_cpu_pool().submit(func, *args)
+        future.add_done_callback(self._hub.run_callback, self._offload_complete,
+                                 future, callback)
+
+    def _offload_complete(self, future, callback):
+        # Called in the Hub's thread when an offloaded call is complete.
+        self._offloading = False
+        if self._handle.closed:
+            return
+        self._read_paused = False
+        if self._reading:
+            self._handle.start_read(self._read_callback)
+        try:
+            callback(future.result())
+        except ssl.SSLError as e:
+            self._log.warning('SSL error {} (reason {})', e.errno,
+                              getattr(e, 'reason', 'unknown'))
+            self._error = e
+            self.abort()
+
     def _read_callback(self, handle, data, error):
         # Callback used with handle.start_read().
         assert handle is self._handle
+        self._last_activity = handle.loop.now()
         try:
             if self._error:
                 self._log.warning('ignore read status {} after close', error)
@@ -367,15 +575,10 @@ class SslTransport(Transport):
                 self._log.warning('pyuv error {} in read callback', error)
                 self._error = TransportError.from_errno(error)
                 self.abort()
+            elif self._offload and self._sslpipe._state == SslPipe.S_DO_HANDSHAKE:
+                self._offload_call(self._sslpipe.feed_ssldata, (data,), self._ssldata_received)
             else:
-                ssldata, appdata = self._sslpipe.feed_ssldata(data)
-                for chunk in ssldata:
-                    super(SslTransport, self).write(chunk)
-                for chunk in appdata:
-                    if chunk and not self._closing:
-                        self._protocol.data_received(chunk)
-                    elif not chunk and self._close_on_unwrap:
-                        self.close()
+                self._deliver_ssldata(*self._sslpipe.feed_ssldata(data))
         except ssl.SSLError as e:
             self._log.warning('SSL error {} (reason {})', e.errno,
                               getattr(e, 'reason', 'unknown'))
@@ -386,6 +589,23 @@ class SslTransport(Transport):
         if not self._error:
             self._process_write_backlog()
 
+    def _deliver_ssldata(self, ssldata, appdata):
+        # Send the record level data and deliver the plaintext data that were
+        # returned by feed_ssldata().
+        for chunk in ssldata:
+            super(SslTransport, self).write(chunk)
+        for chunk in appdata:
+            if chunk and not self._closing:
+                self._protocol.data_received(chunk)
+            elif not chunk and self._close_on_unwrap:
+                self.close()
+
+    def _ssldata_received(self, result):
+        # Completion of an offloaded feed_ssldata().
+        self._deliver_ssldata(*result)
+        if not self._error:
+            self._process_write_backlog()
+
     def pause_reading(self):
         """Stop reading data.
 
@@ -410,6 +630,10 @@ class SslTransport(Transport):
         """
         if self._sslpipe.need_ssldata:
             return
+        elif self._read_paused:
+            # Reading is restarted when the offloaded call completes.
+            self._reading = False
+            return
         super(SslTransport, self).pause_reading()
 
     def resume_reading(self):
@@ -418,6 +642,9 @@ class SslTransport(Transport):
         See the note in :meth:`pause_reading` for special considerations on
         flow control with SSL.
         """
+        if self._read_paused:
+            self._reading = True
+            return
         return super(SslTransport, self).resume_reading()
 
     def do_handshake(self):
@@ -474,6 +701,10 @@ class SslTransport(Transport):
         """Cleanly shut down the SSL protocol and close the transport."""
         if self._closing or self._handle.closed:
             return
+        # Don't wait for a corked transport to be uncorked.
+        if self._corked:
+            self._corked = False
+            self._flush_write_queue()
         self._closing = True
         self._write_backlog.append([b'', False])
         self._write_buffer_size += 1
@@ -482,7 +713,13 @@ class SslTransport(Transport):
 
 def create_ssl_context(**sslargs):
     """Create a new SSL context in a way that is compatible with different
-    Python versions."""
+    Python versions.
+
+    The keyword arguments *certfile*, *keyfile*, *ca_certs*, *cert_reqs* and
+    *ciphers* have the same meaning as for :func:`ssl.wrap_socket`. Session
+    tickets are enabled for server side connections, unless the keyword
+    argument *session_tickets* is false.
+    """
     context = SSLContext(ssl.PROTOCOL_SSLv23)
     if sslargs.get('certfile'):
         context.load_cert_chain(sslargs['certfile'], sslargs.get('keyfile'))
@@ -492,4 +729,110 @@ def create_ssl_context(**sslargs):
         context.verify_mode = sslargs['cert_reqs']
     if sslargs.get('ciphers'):
         context.set_ciphers(sslargs['ciphers'])
+    no_ticket = getattr(ssl, 'OP_NO_TICKET', 0)
+    if sslargs.get('session_tickets', True):
+        context.options &= ~no_ticket
+    else:
+        context.options |= no_ticket
     return context
+
+
+_contexts = {}
+_contexts_lock = threading.Lock()
+
+
+def get_ssl_context(**sslargs):
+    """Return a shared SSL context for the keyword arguments *sslargs*.
+
+    The arguments are the same as for :func:`create_ssl_context`, and must be
+    hashable. The context is created on first use, and is reused for all calls
+    with the same arguments. Reusing a context avoids loading the defaults and
+    certificates for every connection, and is a requirement for session
+    resumption, because OpenSSL caches the server side sessions in the
+    context.
+
+    This function is used for connections that are created with ``ssl=True``.
+    """
+    key = tuple(sorted(sslargs.items()))
+    with _contexts_lock:
+        context = _contexts.get(key)
+        if context is None:
+            context = _contexts[key] = create_ssl_context(**sslargs)
+    return context
+
+
+class SslSessionCache(object):
+    """A cache of client side SSL sessions.
+
+    Sessions are stored per key, usually the remote address and the server
+    host name, and are only returned for the context that they were created
+    with. A client that reconnects to the same server can resume the session,
+    which saves the public key operations of a full handshake.
+
+    The cache holds at most *maxsize* sessions. When it is full, the least
+    recently used session is evicted. Sessions require Python 3.6+. On older
+    versions the cache remains empty.
+
+    This class is thread safe.
+    """
+
+    def __init__(self, maxsize=1000):
+        self._maxsize = maxsize
+        self._sessions = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = self._misses = 0
+
+    @property
+    def maxsize(self):
+        """The maximum number of sessions in the cache."""
+        return self._maxsize
+
+    def get(self, key, context):
+        """Return the session for *key* and *context*, or ``None``."""
+        with self._lock:
+            entry = self._sessions.pop(key, None)
+            if entry is None or entry[0] is not context:
+                self._misses += 1
+                return
+            self._sessions[key] = entry
+            self._hits += 1
+            return entry[1]
+
+    def put(self, key, context, session):
+        """Store *session* that was created with *context* under *key*."""
+        if session is None:
+            return
+        with self._lock:
+            self._sessions.pop(key, None)
+            self._sessions[key] = (context, session)
+            while len(self._sessions) > self._maxsize:
+                self._sessions.popitem(last=False)
+
+    def remove(self, key):
+        """Remove the session for *key*, if any."""
+        with self._lock:
+            self._sessions.pop(key, None)
+
+    def clear(self):
+        """Remove all sessions."""
+        with self._lock:
+            self._sessions.clear()
+
+    def stats(self, reset=False):
+        """Return a dictionary with the "hits", "misses" and "size" of the
+        cache. If *reset* is true, the counters are reset to zero."""
+        with self._lock:
+            stats = {'hits': self._hits, 'misses': self._misses,
+                     'size': len(self._sessions)}
+            if reset:
+                self._hits = self._misses = 0
+        return stats
+
+
+_session_cache = SslSessionCache()
+
+
+def get_ssl_session_cache():
+    """Return the session cache that is used by
+    :func:`~gruvi.create_connection`."""
+    return _session_cache
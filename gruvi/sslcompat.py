@@ -196,9 +196,18 @@ def get_dummy_socket():
 _sock = None
 
 
-def wrap_bio(ctx, incoming, outgoing, server_side=False, server_hostname=None):
-    """Create a new SSL protocol instance from a context and a BIO pair."""
+def wrap_bio(ctx, incoming, outgoing, server_side=False, server_hostname=None,
+             session=None):
+    """Create a new SSL protocol instance from a context and a BIO pair.
+
+    The *session* argument is a session to resume. Sessions are only
+    available on Python 3.6+.
+    """
     if hasattr(ctx, 'wrap_bio'):
+        if session is not None:
+            # Python 3.6
+            return ctx.wrap_bio(incoming, outgoing, server_side, server_hostname,
+                                session=session)
         # Python 3.5
         return ctx.wrap_bio(incoming, outgoing, server_side, server_hostname)
     # Allocate a single global dummy socket to wrap on Python < 3.5
@@ -9,6 +9,7 @@
 from __future__ import absolute_import, print_function
 
 import textwrap
+import collections
 from io import BufferedIOBase
 
 from . import compat
@@ -19,8 +20,24 @@ from .protocols import Protocol, ProtocolError
 from .endpoints import Client, Server, add_method
 from .hub import switchpoint
 
-__all__ = ['StreamReader', 'StreamWriter', 'ReadWriteStream', 'StreamProtocol',
-           'StreamClient', 'StreamServer']
+__all__ = ['IncompleteReadError', 'StreamReader', 'StreamWriter', 'ReadWriteStream',
+           'StreamProtocol', 'StreamClient', 'StreamServer']
+
+
+class IncompleteReadError(EOFError):
+    """EOF was reached before a read could be completed.
+
+    The data that was read is available as the :attr:`partial` attribute, and
+    the number of bytes that was requested as :attr:`expected`. The latter is
+    ``None`` if the read was for a delimiter.
+    """
+
+    def __init__(self, partial, expected=None):
+        what = '{} bytes'.format(expected) if expected is not None else 'delimiter'
+        message = 'EOF after {} bytes while waiting for {}'.format(len(partial), what)
+        super(IncompleteReadError, self).__init__(message)
+        self.partial = partial
+        self.expected = expected
 
 
 class StreamReader(BufferedIOBase):
@@ -32,13 +49,23 @@ class StreamReader(BufferedIOBase):
     A stream reader always operates on ``bytes`` instances. To create a reader
     that works on unicode strings, you can wrap it with a
     :class:`io.TextIOWrapper`.
+
+    On Python 3, the reader may also be fed ``memoryview`` instances. This
+    allows a producer to pass in slices of a larger buffer without copying
+    them. The read methods still return ``bytes``, except for :meth:`read1`
+    which returns the chunks that were fed into the reader as-is.
     """
 
+    # The buffer is a deque of chunks, exactly as they were passed to feed().
+    # The first chunk may have been partially consumed, in which case _offset
+    # is the position in that chunk where the unread data starts. Whole chunks
+    # are moved out of the buffer without copying where possible.
+
     def __init__(self, on_buffer_size_change=None, timeout=None):
         self._on_buffer_size_change = on_buffer_size_change
         self._timeout = timeout
         self._can_read = Event()
-        self._buffers = []
+        self._buffers = collections.deque()
         self._buffer_size = 0
         self._offset = 0
         self._eof = False
@@ -78,36 +105,23 @@ class StreamReader(BufferedIOBase):
         self._can_read.set()
 
     @switchpoint
-    def _get_chunk(self, size=-1, delim=None):
-        # Get a single chunk of data. The chunk will be at most *size* bytes.
-        # If *delim* is provided, then return a partial chunk if it contains
-        # the delimiter.
-        if size != 0 and not self._can_read.wait(self._timeout):
-            raise Timeout('timeout waiting for data')
-        if not self._buffers:
-            return b''  # EOF or error
-        # Clamp the current buffer to *size* bytes.
-        endpos = len(self._buffers[0])
-        if size == -1:
-            size = endpos
-        if self._offset + size < endpos:
-            endpos = self._offset + size
-        # Reduce it even further if the delimiter is found
-        if delim:
-            pos = self._buffers[0].find(delim, self._offset, endpos)
-            if pos != -1:
-                endpos = pos + len(delim)
-        nbytes = endpos - self._offset
-        # Try to move a buffer instead of copying.
-        if self._offset == 0 and endpos == len(self._buffers[0]):
-            chunk = self._buffers.pop(0)
-        else:
-            chunk = self._buffers[0][self._offset:endpos]
-            self._offset = endpos
-            if self._offset == len(self._buffers[0]):
-                del self._buffers[0]
-                self._offset = 0
-        # Adjust buffer size and notify callback
+    def _wait_for_data(self, size=1):
+        # Wait until at least *size* bytes are buffered, or until EOF or an
+        # error condition is set.
+        while self._buffer_size < size and not self._eof and not self._error:
+            self._can_read.clear()
+            try:
+                ready = self._can_read.wait(self._timeout)
+            finally:
+                # Keep the indicator set if we still have data, e.g. after a
+                # timeout, so that a subsequent read will not block.
+                if self._buffers:
+                    self._can_read.set()
+            if not ready:
+                raise Timeout('timeout waiting for data')
+
+    def _buffer_consumed(self, nbytes):
+        # Adjust buffer size and notify callback.
         oldsize = self._buffer_size
         self._buffer_size -= nbytes
         if self._on_buffer_size_change:
@@ -115,7 +129,98 @@ class StreamReader(BufferedIOBase):
         # If there's no data and no error, clear the reading indicator.
         if not self._buffers and not self._eof and not self._error:
             self._can_read.clear()
-        return chunk
+
+    def _consume(self, size, chunks):
+        # Move *size* bytes from the buffer to the list *chunks*. The caller
+        # must ensure that at least *size* bytes are available.
+        buffers = self._buffers
+        nbytes = 0
+        while nbytes < size:
+            buf = buffers[0]
+            end = self._offset + size - nbytes
+            if self._offset == 0 and end >= len(buf):
+                chunk = buffers.popleft()
+            else:
+                end = min(end, len(buf))
+                chunk = buf[self._offset:end]
+                if end == len(buf):
+                    buffers.popleft()
+                    self._offset = 0
+                else:
+                    self._offset = end
+            chunks.append(chunk)
+            nbytes += len(chunk)
+        self._buffer_consumed(nbytes)
+
+    def _consume_into(self, view):
+        # Copy as many bytes as are available and fit into the memoryview
+        # *view*, and remove them from the buffer. Return the number of bytes
+        # copied.
+        buffers = self._buffers
+        size = len(view)
+        nbytes = 0
+        while nbytes < size and buffers:
+            buf = buffers[0]
+            count = min(len(buf) - self._offset, size - nbytes)
+            view[nbytes:nbytes+count] = memoryview(buf)[self._offset:self._offset+count]
+            nbytes += count
+            self._offset += count
+            if self._offset == len(buf):
+                buffers.popleft()
+                self._offset = 0
+        self._buffer_consumed(nbytes)
+        return nbytes
+
+    def _find(self, delim):
+        # Return the position just after the first occurrence of *delim* in
+        # the buffer, or -1 if it is not found. The delimiter may span chunks.
+        dlen = len(delim)
+        base = 0
+        tail = b''
+        for i, buf in enumerate(list(self._buffers)):
+            if isinstance(buf, memoryview):
+                # No find() on memoryviews. The copy is made at most once.
+                buf = self._buffers[i] = buf.tobytes()
+            start = self._offset if i == 0 else 0
+            if tail:
+                window = tail + buf[start:start+dlen-1]
+                pos = window.find(delim)
+                if pos != -1:
+                    return base - len(tail) + pos + dlen
+            pos = buf.find(delim, start)
+            if pos != -1:
+                return base + pos - start + dlen
+            base += len(buf) - start
+            if dlen > 1:
+                tail = (tail + buf[start:])[1-dlen:]
+        return -1
+
+    def _read_until(self, delim, limit=-1):
+        # Read until and including *delim*, or at most *limit* bytes. Returns
+        # a (chunks, found) tuple. Data is consumed while we wait for the
+        # delimiter so that long lines cannot stall flow control.
+        chunks = []
+        nbytes = 0
+        needed = 1
+        while limit < 0 or nbytes < limit:
+            self._wait_for_data(needed)
+            left = self._buffer_size if limit < 0 else min(self._buffer_size, limit-nbytes)
+            if self._buffer_size < needed:
+                # EOF or error: return whatever is left.
+                self._consume(left, chunks)
+                break
+            pos = self._find(delim)
+            if pos != -1 and pos <= left:
+                self._consume(pos, chunks)
+                return chunks, True
+            # Keep the last len(delim)-1 bytes as they may hold the start of a
+            # delimiter that is completed by the next chunk.
+            size = min(left, self._buffer_size - len(delim) + 1)
+            if size > 0:
+                self._consume(size, chunks)
+                nbytes += size
+            needed = self._buffer_size + 1
+        return chunks, False
 
     @switchpoint
     def read(self, size=-1):
@@ -129,18 +234,16 @@ class StreamReader(BufferedIOBase):
         If *size* is not specified or negative, read until EOF.
         """
         chunks = []
-        bytes_read = 0
         bytes_left = size
-        while True:
-            chunk = self._get_chunk(bytes_left)
-            if not chunk:
-                break
-            chunks.append(chunk)
-            bytes_read += len(chunk)
-            if bytes_read == size or not chunk:
-                break
+        while bytes_left != 0:
+            self._wait_for_data()
+            if not self._buffers:
+                break  # EOF or error
+            nbytes = self._buffer_size
             if bytes_left > 0:
-                bytes_left -= len(chunk)
+                nbytes = min(nbytes, bytes_left)
+                bytes_left -= nbytes
+            self._consume(nbytes, chunks)
         if not chunks and self._error:
             raise compat.saved_exc(self._error)
         return b''.join(chunks)
@@ -154,10 +257,100 @@ class StreamReader(BufferedIOBase):
         big enough, then this method will return the chunks passed into the
         memory buffer verbatim without any copying or slicing.
         """
-        chunk = self._get_chunk(size)
-        if not chunk and self._error:
+        if size == 0:
+            return b''
+        self._wait_for_data()
+        if not self._buffers:
+            if self._error:
+                raise compat.saved_exc(self._error)
+            return b''
+        nbytes = len(self._buffers[0]) - self._offset
+        if size > 0:
+            nbytes = min(nbytes, size)
+        chunks = []
+        self._consume(nbytes, chunks)
+        return chunks[0]
+
+    @switchpoint
+    def readinto(self, b):
+        """Read bytes into the pre-allocated, writable bytes-like object *b*.
+
+        This reads up to ``len(b)`` bytes with the same blocking behavior as
+        :meth:`read`, and returns the number of bytes read. The data is
+        copied directly from the buffered chunks into *b*. On Python 3, *b*
+        may have any item size: it is filled as a sequence of bytes.
+        """
+        view = memoryview(b)
+        if compat.PY3:
+            view = view.cast('B')
+        nbytes = 0
+        while nbytes < len(view):
+            self._wait_for_data()
+            if not self._buffers:
+                break  # EOF or error
+            nbytes += self._consume_into(view[nbytes:])
+        if not nbytes and len(view) and self._error:
+            raise compat.saved_exc(self._error)
+        return nbytes
+
+    @switchpoint
+    def readexactly(self, size):
+        """Read exactly *size* bytes.
+
+        If EOF is reached before *size* bytes could be read, an
+        :class:`IncompleteReadError` is raised. The data that was read is
+        available as its *partial* attribute.
+        """
+        data = self.read(size)
+        if len(data) < size:
+            raise IncompleteReadError(data, size)
+        return data
+
+    @switchpoint
+    def peek(self, size=-1):
+        """Return up to *size* buffered bytes without consuming them.
+
+        If no data is buffered, this waits until some data becomes available.
+        Like :meth:`read1` it waits at most once, so the result may be shorter
+        than *size*. If *size* is not specified or negative, all buffered data
+        is returned.
+        """
+        self._wait_for_data()
+        if not self._buffers and self._error:
+            raise compat.saved_exc(self._error)
+        if size < 0 or size > self._buffer_size:
+            size = self._buffer_size
+        chunks = []
+        offset = self._offset
+        nbytes = 0
+        for buf in self._buffers:
+            if nbytes == size:
+                break
+            end = min(len(buf), offset + size - nbytes)
+            chunks.append(buf[offset:end] if offset or end < len(buf) else buf)
+            nbytes += end - offset
+            offset = 0
+        return b''.join(chunks)
+
+    @switchpoint
+    def readuntil(self, delim=b'\n', limit=-1):
+        """Read until and including the delimiter *delim*.
+
+        If EOF is reached before the delimiter is found, an
+        :class:`IncompleteReadError` is raised with the data that was read as
+        its *partial* attribute. If *limit* is specified and the delimiter is
+        not found within the first *limit* bytes, a :class:`ProtocolError` is
+        raised.
+        """
+        chunks, found = self._read_until(delim, limit)
+        data = b''.join(chunks)
+        if found:
+            return data
+        if not data and self._error:
             raise compat.saved_exc(self._error)
-        return chunk
+        if limit >= 0 and len(data) == limit:
+            raise ProtocolError('delimiter not found within {} bytes'.format(limit))
+        raise IncompleteReadError(data)
 
     @switchpoint
     def readline(self, limit=-1, delim=b'\n'):
@@ -166,18 +359,7 @@ class StreamReader(BufferedIOBase):
         If EOF is reached before a full line can be read, a partial line is
         returned. If *limit* is specified, at most this many bytes will be read.
         """
-        chunks = []
-        while True:
-            chunk = self._get_chunk(limit, delim)
-            if not chunk:
-                break
-            chunks.append(chunk)
-            if chunk.endswith(delim):
-                break
-            if limit >= 0:
-                limit -= len(chunk)
-                if limit == 0:
-                    break
+        chunks, found = self._read_until(delim, limit)
         if not chunks and self._error:
             raise compat.saved_exc(self._error)
         return b''.join(chunks)
@@ -190,21 +372,15 @@ class StreamReader(BufferedIOBase):
         size of all lines exceeds *hint*.
         """
         lines = []
-        chunks = []
         bytes_read = 0
         while True:
-            chunk = self._get_chunk(-1, b'\n')
-            if not chunk:
+            chunks, found = self._read_until(b'\n')
+            if not chunks:
                 break
-            chunks.append(chunk)
-            if chunk.endswith(b'\n'):
-                lines.append(b''.join(chunks))
-                del chunks[:]
-                bytes_read += len(lines[-1])
+            lines.append(b''.join(chunks))
+            bytes_read += len(lines[-1])
             if hint >= 0 and bytes_read > hint:
                 break
-        if chunks:
-            lines.append(b''.join(chunks))
         if not lines and self._error:
             raise compat.saved_exc(self._error)
         return lines
@@ -272,6 +448,18 @@ class StreamWriter(BufferedIOBase):
                 raise ProtocolError('not connected')
             self._transport.write(line)
 
+    def flush(self):
+        """Write out the data that is buffered in the transport.
+
+        Normally there is no need to call this method. The transport only
+        queues data while a previous write is outstanding, or while it is
+        corked, and writes it out when that write completes or when it is
+        uncorked. See :meth:`Transport.flush`.
+        """
+        if self._transport is None:
+            raise ProtocolError('not connected')
+        self._transport.flush()
+
     @switchpoint
     def write_eof(self):
         """Close the write direction of the transport.
@@ -313,9 +501,14 @@ class ReadWriteStream(BufferedIOBase):
         self.read1 = reader.read1
         self.readline = reader.readline
         self.readlines = reader.readlines
+        self.readinto = reader.readinto
+        self.readexactly = reader.readexactly
+        self.readuntil = reader.readuntil
+        self.peek = reader.peek
         self.__iter__ = reader.__iter__
         self.write = writer.write
         self.writelines = writer.writelines
+        self.flush = writer.flush
         self.write_eof = writer.write_eof
         self.close = writer.close
 
@@ -395,6 +588,10 @@ class StreamClient(Client):
     add_method(_stream_method, StreamReader.read1)
     add_method(_stream_method, StreamReader.readline)
     add_method(_stream_method, StreamReader.readlines)
+    add_method(_stream_method, StreamReader.readinto)
+    add_method(_stream_method, StreamReader.readexactly)
+    add_method(_stream_method, StreamReader.readuntil)
+    add_method(_stream_method, StreamReader.peek)
     add_method(_stream_method, StreamReader.__iter__)
 
     add_method(_stream_method, StreamWriter.write)
@@ -12,6 +12,7 @@ import pyuv
 import functools
 import socket
 import struct
+import collections
 
 from . import logging, compat
 from .errors import Error
@@ -58,6 +59,9 @@ class BaseTransport(object):
         self._reading = False
         self._writing = True
         self._started = False
+        # The loop time in msecs of the last read or write. Used by protocols
+        # to implement an idle timeout without a timer per read or write.
+        self._last_activity = handle.loop.now()
 
     def start(self, protocol):
         """Bind to *protocol* and start calling callbacks on it."""
@@ -142,7 +146,14 @@ class BaseTransport(object):
 
 
 class Transport(BaseTransport):
-    """A connection oriented transport."""
+    """A connection oriented transport.
+
+    Writes are coalesced. If no write is outstanding, a buffer passed to
+    :meth:`write` is passed to the handle immediately. Otherwise it is queued,
+    and all queued buffers are passed to the handle as a single vectored write
+    once the outstanding write completes. See :meth:`cork` for gathering a
+    number of writes into one explicitly.
+    """
 
     def __init__(self, handle, mode='rw'):
         """
@@ -157,6 +168,10 @@ class Transport(BaseTransport):
             raise TypeError("handle: expecting a 'pyuv.Stream' instance, got {!r}"
                                 .format(type(handle).__name__))
         super(Transport, self).__init__(handle, mode)
+        self._write_queue = []
+        self._write_queue_size = 0
+        self._write_sizes = collections.deque()
+        self._corked = False
 
     def start(self, protocol):
         events = super(Transport, self).start(protocol)
@@ -168,6 +183,7 @@ class Transport(BaseTransport):
     def _read_callback(self, handle, data, error):
         # Callback used with handle.start_read().
         assert handle is self._handle
+        self._last_activity = handle.loop.now()
         if self._error:
             self._log.warning('ignore read status {} after close', error)
         elif error == pyuv.errno.UV_EOF:
@@ -213,10 +229,12 @@ class Transport(BaseTransport):
         self._handle.start_read(self._read_callback)
         self._reading = True
 
-    def _on_write_complete(self, datalen, handle, error):
-        # Callback used with handle.write().
+    def _on_write_complete(self, handle, error):
+        # Callback used with handle.write() and handle.shutdown(). Requests
+        # complete in the order they were issued.
         assert handle is self._handle
-        self._write_buffer_size -= datalen
+        self._last_activity = handle.loop.now()
+        self._write_buffer_size -= self._write_sizes.popleft()
         assert self._write_buffer_size >= 0
         if self._error:
             self._log.debug('write status {} after close', error)
@@ -224,6 +242,9 @@ class Transport(BaseTransport):
             self._log.warning('pyuv error {} in write callback', error)
             self._error = TransportError.from_errno(error)
             self.abort()
+        if self._write_queue and (not self._corked or not self._writing) \
+                    and not handle.closed:
+            self._flush_write_queue()
         if not self._closing and not handle.closed and not self._writing \
                     and self._write_buffer_size <= self._write_buffer_low:
             self._protocol.resume_writing()
@@ -251,14 +272,66 @@ class Transport(BaseTransport):
         if self._write_buffer_size > self._write_buffer_high:
             self._protocol.pause_writing()
             self._writing = False
-        callback = functools.partial(self._on_write_complete, len(data))
+        self._write_queue.append(data)
+        self._write_queue_size += len(data)
+        self._write_buffer_size += len(data)
+        if self._corked:
+            # Don't let a corked transport buffer without bounds. Also don't
+            # hold back data while the protocol is paused: writing is only
+            # resumed once the buffered data has been written.
+            if not self._writing or self._write_queue_size > self._write_buffer_high:
+                self._flush_write_queue()
+        elif not self._write_sizes:
+            self._flush_write_queue()
+        if self._error:
+            raise compat.saved_exc(self._error)
+
+    def _flush_write_queue(self):
+        # Issue all queued buffers as a single write.
+        if not self._write_queue or self._handle.closed:
+            return
+        if len(self._write_queue) == 1:
+            data = self._write_queue[0]
+        else:
+            data = self._write_queue[:]
+        size = self._write_queue_size
+        del self._write_queue[:]
+        self._write_queue_size = 0
         try:
-            self._handle.write(data, callback)
+            self._handle.write(data, self._on_write_complete)
         except pyuv.error.UVError as e:
+            self._write_buffer_size -= size
             self._error = TransportError.from_errno(e.args[0])
             self.abort()
+            return
+        self._write_sizes.append(size)
+
+    def flush(self):
+        """Write out all queued buffers now.
+
+        Normally there is no need to call this method. Queued buffers are
+        written automatically when the outstanding write completes, or when
+        :meth:`uncork` is called.
+        """
+        if self._error:
             raise compat.saved_exc(self._error)
-        self._write_buffer_size += len(data)
+        self._flush_write_queue()
+
+    def cork(self):
+        """Stop writing out queued buffers.
+
+        Buffers passed to :meth:`write` are queued until :meth:`uncork` or
+        :meth:`flush` is called, so that they go out together in a single
+        vectored write. This is useful when a message is produced by a number
+        of small writes. If the queue grows beyond the high-water mark of the
+        write buffer, or if writing is paused, it is written out anyway.
+        """
+        self._corked = True
+
+    def uncork(self):
+        """Undo a previous :meth:`cork`, and write out all queued buffers."""
+        self._corked = False
+        self.flush()
 
     def writelines(self, seq):
         """Write all elements from *seq* to the transport."""
@@ -275,15 +348,35 @@ class Transport(BaseTransport):
             raise TransportError('transport is closing/closed')
         elif self._protocol is None:
             raise RuntimeError('transport not started')
-        callback = functools.partial(self._on_write_complete, 1)
+        self._flush_write_queue()
+        if self._error:
+            raise compat.saved_exc(self._error)
         try:
-            self._handle.shutdown(callback)
+            self._handle.shutdown(self._on_write_complete)
         except pyuv.error.UVError as e:
             self._error = TransportError.from_errno(e.args[0])
             self.abort()
             raise compat.saved_exc(self._error)
+        self._write_sizes.append(1)
         self._write_buffer_size += 1
 
+    def close(self):
+        """Close the transport after all oustanding data has been written."""
+        # Don't wait for a corked transport to be uncorked.
+        if self._corked and not self._closing and not self._handle.closed:
+            self._corked = False
+            self._flush_write_queue()
+        super(Transport, self).close()
+
+    def abort(self):
+        """Close the transport immediately."""
+        # Discard queued buffers. Buffers that were already passed to the
+        # handle are cancelled by it.
+        self._write_buffer_size -= self._write_queue_size
+        del self._write_queue[:]
+        self._write_queue_size = 0
+        super(Transport, self).abort()
+
     def can_write_eof(self):
         """Whether this transport can close the write direction."""
         return True
@@ -322,38 +415,118 @@ class Transport(BaseTransport):
 
 
 class DatagramTransport(BaseTransport):
-    """A datagram transport."""
+    """A datagram transport.
 
-    def __init__(self, handle, mode='rw'):
+    If the protocol has a ``datagrams_received()`` method, the datagrams that
+    are received in one iteration of the event loop are passed to it in a
+    single call, as a list of ``(data, addr)`` tuples. Otherwise
+    ``datagram_received()`` is called for each datagram.
+    """
+
+    def __init__(self, handle, mode='rw', remote_address=None):
         """
         The *handle* argument is the pyuv handle for which to create the
         transport. It must be a :class:`pyuv.UDP` instance.
 
         The *mode* argument specifies if this is transport is read-only
         (``'r'``), write-only (``'w'``) or read-write (``'rw'``).
+
+        The *remote_address* argument specifies the default address for
+        :meth:`sendto`.
         """
         if not isinstance(handle, pyuv.UDP):
             raise TypeError("handle: expecting a 'pyuv.UDP' instance, got {!r}"
                                 .format(type(handle).__name__))
         super(DatagramTransport, self).__init__(handle, mode)
+        self._remote_address = remote_address
+        self._recv_batch = None
+        self._flush_batch = None
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._datagrams_sent = self._bytes_sent = 0
+        self._datagrams_received = self._bytes_received = 0
+        self._send_errors = self._receive_errors = 0
+
+    def stats(self, reset=False):
+        """Return a dictionary with statistics for this transport.
+
+        The statistics are: "datagrams_sent", "bytes_sent",
+        "datagrams_received", "bytes_received", "send_errors" and
+        "receive_errors". If *reset* is true, the counters are reset to zero.
+        """
+        stats = {'datagrams_sent': self._datagrams_sent, 'bytes_sent': self._bytes_sent,
+                 'datagrams_received': self._datagrams_received,
+                 'bytes_received': self._bytes_received,
+                 'send_errors': self._send_errors, 'receive_errors': self._receive_errors}
+        if reset:
+            self._reset_stats()
+        return stats
+
+    def get_extra_info(self, name, default=None):
+        """Get transport specific data.
+
+        In addition to the fields from :meth:`BaseTransport.get_extra_info`,
+        the following information is also available:
+
+        ===================  ===============================================
+        Name                 Description
+        ===================  ===============================================
+        ``'remote_address'`` The default address for :meth:`sendto`.
+        ===================  ===============================================
+        """
+        if name == 'remote_address':
+            return self._remote_address
+        elif name == 'peername':
+            return self._remote_address or default
+        return super(DatagramTransport, self).get_extra_info(name, default)
 
     def start(self, protocol):
         events = super(DatagramTransport, self).start(protocol)
         if self._readable:
+            if hasattr(protocol, 'datagrams_received'):
+                self._recv_batch = []
+                self._flush_batch = pyuv.Check(self._handle.loop)
             self._handle.start_recv(self._recv_callback)
         return events
 
+    def _on_close_complete(self, handle):
+        if self._flush_batch:
+            self._flush_batch.close()
+        super(DatagramTransport, self)._on_close_complete(handle)
+
     def _recv_callback(self, handle, addr, flags, data, error):
         """Callback used with handle.start_recv()."""
         assert handle is self._handle
         if error:
             self._log.warning('pyuv error {} in recv callback', error)
+            self._receive_errors += 1
+            self._deliver_batch()
             self._protocol.error_received(TransportError.from_errno(error))
         elif flags:
             assert flags & pyuv.UV_UDP_PARTIAL
             self._log.warning('ignoring partial datagram')
+            self._receive_errors += 1
         elif data and not self._closing:
-            self._protocol.datagram_received(data, addr)
+            self._datagrams_received += 1
+            self._bytes_received += len(data)
+            if self._recv_batch is None:
+                self._protocol.datagram_received(data, addr)
+                return
+            if not self._recv_batch:
+                # Deliver the batch once libuv has read all datagrams that
+                # are available in this iteration of the loop.
+                self._flush_batch.start(self._deliver_batch)
+            self._recv_batch.append((data, addr))
+
+    def _deliver_batch(self, handle=None):
+        # Callback used with the Check handle.
+        if not self._recv_batch:
+            return
+        self._flush_batch.stop()
+        batch, self._recv_batch = self._recv_batch, []
+        if self._protocol is not None and not self._closing:
+            self._protocol.datagrams_received(batch)
 
     def _on_send_complete(self, datalen, handle, error):
         """Callback used with handle.send()."""
@@ -362,6 +535,7 @@ class DatagramTransport(BaseTransport):
         assert self._write_buffer_size >= 0
         if error and error != pyuv.errno.UV_ECANCELED:
             self._log.warning('pyuv error {} in sendto callback', error)
+            self._send_errors += 1
             self._protocol.error_received(TransportError.from_errno(error))
         if not self._closing and not self._writing and \
                     self._write_buffer_size <= self._write_buffer_low:
@@ -372,24 +546,87 @@ class DatagramTransport(BaseTransport):
                 self._handle.close(self._on_close_complete)
             self._closing = False
 
-    def sendto(self, data, addr=None):
-        """Send a datagram containing *data* to *addr*.
-
-        The *addr* argument may be omitted only if the handle was bound to a
-        default remote address.
-        """
-        if not isinstance(data, bytes):
-            raise TypeError("data: expecting a 'bytes' instance, got {!r}"
-                                .format(type(data).__name__))
+    def _check_can_send(self, addr):
+        # Raise an exception if we cannot send to *addr* now.
         if not self._writable:
             raise TransportError('transport is not writable')
         elif self._closing or self._handle.closed:
             raise TransportError('transport is closing/closed')
-        elif len(data) == 0:
-            return
-        self._write_buffer_size += len(data)
-        if self._write_buffer_size > self._write_buffer_high:
-            self._protocol.pause_writing()
-            self._writing = False
+        elif addr is None:
+            raise TransportError('no address and no default remote address')
+
+    def _send(self, data, addr, queued=0):
+        # Send one datagram. Try to send it right away, without allocating a
+        # send request, if nothing is queued. The *queued* argument is the
+        # number of bytes queued by the caller that are not yet accounted for
+        # in the write buffer size. Returns the number of bytes that were
+        # queued, or None if the datagram could not be sent.
+        if self._write_buffer_size == 0 and queued == 0:
+            try:
+                self._handle.try_send(addr, data)
+            except pyuv.error.UDPError as e:
+                if e.args[0] not in (pyuv.errno.UV_EAGAIN, pyuv.errno.UV_ENOSYS):
+                    self._log.warning('pyuv error {} in try_send', e.args[0])
+                    self._send_errors += 1
+                    self._protocol.error_received(TransportError.from_errno(e.args[0]))
+                    return
+            else:
+                return 0
         callback = functools.partial(self._on_send_complete, len(data))
         self._handle.send(addr, data, callback)
+        return len(data)
+
+    def _sent(self, count, nbytes, queued):
+        # Update statistics and flow control after sending datagrams.
+        self._datagrams_sent += count
+        self._bytes_sent += nbytes
+        self._write_buffer_size += queued
+        if self._writing and self._write_buffer_size > self._write_buffer_high:
+            self._protocol.pause_writing()
+            self._writing = False
+
+    def sendto(self, data, addr=None):
+        """Send a datagram containing *data* to *addr*.
+
+        The *data* argument must be a bytes-like object. The *addr* argument
+        may be omitted only if the transport has a default remote address.
+        """
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            raise TypeError("data: expecting a bytes-like instance, got {!r}"
+                                .format(type(data).__name__))
+        addr = addr or self._remote_address
+        self._check_can_send(addr)
+        if len(data) == 0:
+            return
+        queued = self._send(data, addr)
+        if queued is not None:
+            self._sent(1, len(data), queued)
+
+    def sendmany(self, datagrams, addr=None):
+        """Send a sequence of datagrams to *addr*.
+
+        This is equivalent to calling :meth:`sendto` for each element of
+        *datagrams*, but it is more efficient. Datagrams are sent immediately
+        if the socket can take them, and the flow control state is updated
+        only once for the whole sequence.
+        """
+        addr = addr or self._remote_address
+        self._check_can_send(addr)
+        count = nbytes = queued = 0
+        try:
+            for data in datagrams:
+                if not isinstance(data, (bytes, bytearray, memoryview)):
+                    raise TypeError("datagrams: expecting bytes-like elements, got {!r}"
+                                        .format(type(data).__name__))
+                if len(data) == 0:
+                    continue
+                # Once a datagram is queued, the ones after it must be queued
+                # too, or they could be sent before it.
+                size = self._send(data, addr, queued)
+                if size is None:
+                    continue
+                queued += size
+                count += 1
+                nbytes += len(data)
+        finally:
+            self._sent(count, nbytes, queued)
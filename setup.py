@@ -12,7 +12,6 @@ import os
 import sys
 import textwrap
 import json
-import time
 import re
 
 from setuptools import setup, Extension
@@ -31,9 +30,9 @@ except ImportError:
 
 re_int = re.compile('^(\d*).*$')
 cffi_ver = tuple((int(re_int.sub('0\\1', x)) for x in cffi.__version__.split('.')))
-if cffi_ver < (0, 8):
+if cffi_ver < (1, 0):
     sys.stderr.write('Error: CFFI (required for setup) is too old.\n')
-    sys.stderr.write('Please install at least version 0.8.\n')
+    sys.stderr.write('Please install at least version 1.0.\n')
     sys.exit(1)
 
 
@@ -86,32 +85,9 @@ def update_version():
 def main():
     os.chdir(topdir)
     update_version()
-    # Import the FFI modules without importing the package.
-    sys.path.append('gruvi')
-    try:
-        import http_ffi
-        import jsonrpc_ffi
-    except cffi.VerificationError:
-        if not sys.platform.startswith('win'):
-            raise
-        # On my Windows 7 system, the first build reproducably results in a
-        # link.exe error 1104. There multiple reports on the Internet of people
-        # running into this. It is caused by /some/ process locking an
-        # executable file (here a .pyd file created by CFFI). Different people
-        # reported success disabling different programs like a virus scanner
-        # but none of those worked for me. However, it appears that if we just
-        # try again importing the ffi modules that things *do* work. So just do
-        # that.
-        # The sleep() below isn't really necessary for me but since I don't
-        # know which program is locking the file I put it in just in case there
-        # is a race condition that for some reason I am not triggering.
-        print('Enabling workaround for link.exe error 1104')
-        time.sleep(1)
-        import http_ffi
-        import jsonrpc_ffi
-    sys.path.pop()
-    ext_modules = [http_ffi.ffi.verifier.get_extension(),
-                   jsonrpc_ffi.ffi.verifier.get_extension()]
+    # The CFFI extensions are built ahead of time ("out-of-line"), so that
+    # importing Gruvi does not need to invoke the CFFI verifier.
+    ext_modules = []
     # Note that on Windows it's more involved to compile _sslcompat because
     # there's no system provided OpenSSL and you need to match the version that
     # was used to compile your Python.
@@ -120,7 +96,9 @@ def main():
                                      libraries=['ssl', 'crypto']))
     setup(
         packages=['gruvi', 'gruvi.txdbus'],
-        install_requires=['cffi', 'fibers', 'pyuv', 'six'],
+        setup_requires=['cffi >= 1.0'],
+        install_requires=['cffi >= 1.0', 'fibers', 'pyuv', 'six'],
+        cffi_modules=['gruvi/http_ffi_build.py:ffi', 'gruvi/jsonrpc_ffi_build.py:ffi'],
         ext_package='gruvi',
         ext_modules=ext_modules,
         **version_info
@@ -83,3 +83,33 @@ int json_split(struct split_context *ctx)
 
     return ctx->error;
 }
+
+/*
+ * Split multiple JSON objects in one call.
+ *
+ * Scan *buf* starting at ctx->offset, and store the end offsets of up to
+ * *maxoffsets* complete objects into *offsets*. The buffer is used in place
+ * and is not referenced after this function returns. Return the number of
+ * offsets stored. On return, ctx->offset is the offset up to which the
+ * buffer was scanned and ctx->error is set like json_split() sets it.
+ */
+
+int json_split_batch(struct split_context *ctx, const char *buf, int buflen,
+                     int *offsets, int maxoffsets)
+{
+    int count = 0;
+
+    ctx->buf = buf;
+    ctx->buflen = buflen;
+    ctx->error = 0;
+    while (count < maxoffsets && ctx->offset < ctx->buflen) {
+        if (json_split(ctx))
+            break;
+        offsets[count++] = ctx->offset;
+    }
+    if (ctx->offset == ctx->buflen && ctx->error == 0 && ctx->state != s_preamble)
+        ctx->error = INCOMPLETE;
+    ctx->buf = NULL;
+
+    return count;
+}
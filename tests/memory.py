@@ -13,6 +13,8 @@ import unittest
 import gruvi
 from gruvi.logging import get_logger
 from gruvi import callbacks
+from gruvi.jsonrpc import JsonRpcProtocol
+from gruvi.dbus import DbusProtocol
 from support import MemoryTest, sizeof
 
 
@@ -62,6 +64,23 @@ class TestMemory(MemoryTest):
     def mem_dllist_node(self):
         self.add_result(sizeof(callbacks.Node()))
 
+    def mem_jsonrpc_protocol(self):
+        # The memory used by an idle JSON-RPC connection. The dispatcher fiber
+        # only exists while there are messages to dispatch.
+        protocol = JsonRpcProtocol(lambda *args: None)
+        self.add_result(sizeof(protocol, exclude=('_log', '_hub', '_codec')))
+
+    def mem_jsonrpc_protocol_dispatching(self):
+        protocol = JsonRpcProtocol(lambda *args: None)
+        protocol._start_dispatcher()
+        self.add_result(sizeof(protocol, exclude=('_log', '_hub', '_codec')))
+        protocol.dispatcher.cancel()
+        gruvi.sleep(0)
+
+    def mem_dbus_protocol(self):
+        protocol = DbusProtocol(True, lambda *args: None)
+        self.add_result(sizeof(protocol, exclude=('_log', '_hub')))
+
 
 if __name__ == '__main__':
     TestMemory.setup_loader()
@@ -32,6 +32,20 @@ class PerfFiber(PerformanceTest):
         speed = count[0] / (t1 - t0)
         self.add_result(speed)
 
+    def perf_spawn_join_throughput(self):
+        # Measure the number of fibers we can spawn and join per second.
+        t0 = t1 = time.time()
+        count = 0
+        def dummy_fiber():
+            pass
+        while t1 - t0 < 0.2:
+            fiber = gruvi.spawn(dummy_fiber)
+            fiber.join()
+            count += 1
+            t1 = time.time()
+        speed = count / (t1 - t0)
+        self.add_result(speed)
+
     def perf_switch_throughput(self):
         # Measure the number of switches we can do per second.
         t0 = t1 = time.time()
@@ -50,6 +64,47 @@ class PerfFiber(PerformanceTest):
         fiber.cancel()
         gruvi.sleep(0)
 
+    def perf_callback_switch_throughput(self):
+        # Measure the number of switches per second that go through
+        # Hub.run_callback(), which is how most fibers are woken up.
+        hub = gruvi.get_hub()
+        t0 = t1 = time.time()
+        count = 0
+        while t1 - t0 < 0.2:
+            with gruvi.switch_back() as switcher:
+                hub.run_callback(switcher)
+                hub.switch()
+            count += 1
+            t1 = time.time()
+        speed = count / (t1 - t0)
+        self.add_result(speed)
+
+    def perf_timeout_throughput(self):
+        # Measure the number of switch_back blocks with a timeout that we can
+        # enter and leave per second.
+        hub = gruvi.get_hub()
+        t0 = t1 = time.time()
+        count = 0
+        while t1 - t0 < 0.2:
+            with gruvi.switch_back(10) as switcher:
+                hub.run_callback(switcher)
+                hub.switch()
+            count += 1
+            t1 = time.time()
+        speed = count / (t1 - t0)
+        self.add_result(speed)
+
+    def perf_concurrent_sleep(self):
+        # Measure the number of fibers per second that can sleep concurrently.
+        nfibers = 10000
+        t0 = time.time()
+        fibers = [gruvi.spawn(gruvi.sleep, 0.01) for i in range(nfibers)]
+        for fiber in fibers:
+            fiber.join()
+        t1 = time.time()
+        speed = nfibers / (t1 - t0)
+        self.add_result(speed)
+
 
 if __name__ == '__main__':
     unittest.defaultTestLoader.testMethodPrefix = 'perf'
@@ -10,11 +10,21 @@ from __future__ import absolute_import, print_function, division
 
 import time
 import unittest
+import six
 
 from gruvi.http import HttpProtocol
 from support import PerformanceTest, MockTransport
 
 
+def hello_app(environ, start_response):
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [b'Hello!']
+
+
+def native_hello(message, writer):
+    writer.send('200 OK', [('Content-Type', 'text/plain')], b'Hello!')
+
+
 class PerfHttp(PerformanceTest):
 
     def perf_parsing_speed(self):
@@ -34,6 +44,67 @@ class PerfHttp(PerformanceTest):
         speed = nbytes / (t1 - t0) / (1024 * 1024)
         self.add_result(speed)
 
+    def _body_speed(self, zero_copy):
+        # Parse responses with a 10 MB body, fed in 64 KB chunks like a
+        # transport would, and read the body back. Return the speed in MB/s.
+        transport = MockTransport()
+        protocol = HttpProtocol(False)
+        protocol.zero_copy_body = zero_copy
+        transport.start(protocol)
+        size = 10 * 1024 * 1024
+        header = 'HTTP/1.1 200 OK\r\nContent-Length: {0}\r\n\r\n'.format(size)
+        chunk = b'x' * 65536
+        nbytes = 0
+        t0 = t1 = time.time()
+        while t1 - t0 < 1:
+            protocol.data_received(header.encode('ascii'))
+            for i in range(size // len(chunk)):
+                protocol.data_received(chunk)
+            message = protocol._queue.get_nowait()
+            body = message.body.read()
+            assert len(body) == size
+            nbytes += size
+            t1 = time.time()
+        return nbytes / (t1 - t0) / (1024 * 1024)
+
+    def perf_body_speed_copy(self):
+        speed = self._body_speed(False)
+        self.add_result(speed)
+
+    def perf_body_speed_zero_copy(self):
+        if six.PY2:
+            raise unittest.SkipTest('zero-copy bodies require Python 3')
+        speed = self._body_speed(True)
+        self.add_result(speed)
+
+    def _handler_speed(self, application, native):
+        # Dispatch requests directly to the message handler of a server side
+        # protocol. Return the number of requests per second.
+        transport = MockTransport()
+        protocol = HttpProtocol(True, application, native=native)
+        transport.start(protocol)
+        r = b'GET /foo?bar=baz HTTP/1.1\r\nHost: example.com\r\n' \
+            b'User-Agent: perf\r\nAccept: */*\r\n\r\n'
+        nrequests = 0
+        t0 = t1 = time.time()
+        while t1 - t0 < 0.2:
+            protocol.data_received(r)
+            message = protocol._queue.get_nowait()
+            protocol.message_received(message)
+            transport.buffer.seek(0)
+            transport.buffer.truncate()
+            nrequests += 1
+            t1 = time.time()
+        return nrequests / (t1 - t0)
+
+    def perf_wsgi_handler(self):
+        speed = self._handler_speed(hello_app, False)
+        self.add_result(speed)
+
+    def perf_native_handler(self):
+        speed = self._handler_speed(native_hello, True)
+        self.add_result(speed)
+
 
 if __name__ == '__main__':
     unittest.defaultTestLoader.testMethodPrefix = 'perf'
@@ -9,10 +9,11 @@
 from __future__ import absolute_import, print_function, division
 
 import time
+import json
 import unittest
 
-from gruvi.jsonrpc import JsonRpcClient, JsonRpcServer
-from gruvi import jsonrpc_ffi
+from gruvi.jsonrpc import JsonRpcClient, JsonRpcServer, JsonCodec, OrjsonCodec
+from gruvi import jsonrpc, jsonrpc_ffi
 
 from support import PerformanceTest
 from test_jsonrpc import set_buffer, echo_app
@@ -36,6 +37,53 @@ class PerfJsonRpc(PerformanceTest):
         speed = nbytes / (t1 - t0) / (1024 * 1024)
         self.add_result(speed)
 
+    def perf_split_batch_throughput(self):
+        chunk = b'{"jsonrpc": "2.0", "method": "notify", "params": [1]}'
+        buf = chunk * 1000
+        ctx = jsonrpc_ffi.ffi.new('struct split_context *')
+        offsets = jsonrpc_ffi.ffi.new('int[]', 64)
+        nmessages = 0
+        t0 = t1 = time.time()
+        while t1 - t0 < 0.2:
+            ctx.offset = 0
+            while ctx.offset != len(buf):
+                count = jsonrpc_ffi.lib.json_split_batch(ctx, buf, len(buf), offsets, 64)
+                nmessages += count
+            t1 = time.time()
+        throughput = nmessages / (t1 - t0)
+        self.add_result(throughput)
+
+    def _codec_throughput(self, encode, decode):
+        message = {'jsonrpc': '2.0', 'id': 1, 'method': 'update',
+                   'params': [{'name': 'item{}'.format(i), 'value': i * 1.5,
+                               'tags': ['foo', 'bar'], 'valid': True}
+                              for i in range(10)]}
+        nmessages = 0
+        t0 = t1 = time.time()
+        while t1 - t0 < 0.2:
+            for i in range(100):
+                decode(encode(message))
+            nmessages += 100
+            t1 = time.time()
+        throughput = nmessages / (t1 - t0)
+        self.add_result(throughput)
+
+    def perf_codec_throughput_legacy(self):
+        # How messages were encoded before codecs were introduced.
+        encode = lambda m: json.dumps(m, indent=2).encode('utf-8')
+        decode = lambda b: json.loads(b.decode('utf-8'))
+        self._codec_throughput(encode, decode)
+
+    def perf_codec_throughput_json(self):
+        codec = JsonCodec()
+        self._codec_throughput(codec.encode, codec.decode)
+
+    def perf_codec_throughput_orjson(self):
+        if jsonrpc.orjson is None:
+            raise unittest.SkipTest('orjson is not installed')
+        codec = OrjsonCodec()
+        self._codec_throughput(codec.encode, codec.decode)
+
     def perf_message_throughput(self):
         server = JsonRpcServer(echo_app)
         server.listen(('127.0.0.1', 0))
@@ -9,13 +9,14 @@
 from __future__ import absolute_import, print_function, division
 
 import os
+import ssl
 import time
 import unittest
 from unittest import SkipTest
 
 from gruvi.ssl import SslPipe
 from support import PerformanceTest
-from test_ssl import communicate
+from test_ssl import communicate, count_records
 
 
 class PerfSsl(PerformanceTest):
@@ -46,6 +47,65 @@ class PerfSsl(PerformanceTest):
         speed = nbytes / (t1 - t0) / (1024 * 1024)
         self.add_result(speed, name=name)
 
+    def _records(self, small):
+        # Encrypt and decrypt 16 KB writes for a while, using small or full
+        # size records. Return the speed in MB/sec and the records per MB.
+        client, server = self.client, self.server
+        communicate(b'x', client, server, client.do_handshake(), server.do_handshake())
+        buf = b'x' * 16384
+        if not small:
+            client.small_record_limit = 0
+        nbytes = nrecords = 0
+        t0 = t1 = time.time()
+        while t1 - t0 < 0.2:
+            client.reset_record_size()
+            ssldata, offset = client.feed_appdata(buf)
+            nrecords += count_records(ssldata)
+            nbytes += sum(len(chunk) for chunk in server.feed_ssldata(b''.join(ssldata))[1])
+            t1 = time.time()
+        mbytes = nbytes / (1024 * 1024)
+        return mbytes / (t1 - t0), nrecords / mbytes
+
+    def perf_small_records(self):
+        speed, records = self._records(True)
+        self.add_result(speed, name='ssl_small_records_throughput')
+        self.add_result(records, name='ssl_small_records_per_mb')
+
+    def perf_large_records(self):
+        speed, records = self._records(False)
+        self.add_result(speed, name='ssl_large_records_throughput')
+        self.add_result(records, name='ssl_large_records_per_mb')
+
+    def _handshakes(self, resume):
+        # Perform handshakes for a while, with or without session resumption.
+        context = self.client.context
+        session = None
+        count = 0
+        t0 = t1 = time.time()
+        while t1 - t0 < 0.5:
+            client = SslPipe(context, False, session=session)
+            server = SslPipe(context, True)
+            clientssl = client.do_handshake()
+            serverssl = server.do_handshake()
+            communicate(b'x', client, server, clientssl, serverssl)
+            # With TLS 1.3 the session ticket is sent after the handshake.
+            communicate(b'x', server, client, [], [])
+            if resume:
+                session = client.session
+            count += 1
+            t1 = time.time()
+        return count / (t1 - t0)
+
+    def perf_handshakes(self):
+        speed = self._handshakes(False)
+        self.add_result(speed, name='ssl_handshakes')
+
+    def perf_handshakes_resumed(self):
+        if not hasattr(ssl, 'SSLSession'):
+            raise SkipTest('sessions require Python 3.6+')
+        speed = self._handshakes(True)
+        self.add_result(speed, name='ssl_handshakes_resumed')
+
 
 if __name__ == '__main__':
     unittest.defaultTestLoader.testMethodPrefix = 'perf'
@@ -0,0 +1,53 @@
+#
+# This file is part of Gruvi. Gruvi is free software available under the
+# terms of the MIT license. See the file "LICENSE" that was provided
+# together with this source file for the licensing terms.
+#
+# Copyright (c) 2012-2014 the Gruvi authors. See the file "AUTHORS" for a
+# complete list.
+
+from __future__ import absolute_import, print_function, division
+
+import os
+import sys
+import time
+import subprocess
+import unittest
+
+import gruvi
+from support import PerformanceTest
+
+
+class PerfStartup(PerformanceTest):
+
+    def _startup_time(self, script, count=10):
+        # Return the mean time in milliseconds to start a new Python
+        # interpreter and run *script*.
+        env = os.environ.copy()
+        env['PYTHONPATH'] = os.path.dirname(os.path.dirname(os.path.abspath(gruvi.__file__)))
+        args = [sys.executable, '-c', script]
+        subprocess.check_call(args, env=env)  # warm up the OS and .pyc caches
+        t0 = time.time()
+        for i in range(count):
+            subprocess.check_call(args, env=env)
+        t1 = time.time()
+        return (t1 - t0) / count * 1000
+
+    def perf_python(self):
+        # The baseline: starting the interpreter without importing Gruvi.
+        self.add_result(self._startup_time('pass'))
+
+    def perf_import_gruvi(self):
+        self.add_result(self._startup_time('import gruvi'))
+
+    def perf_import_gruvi_http(self):
+        self.add_result(self._startup_time('import gruvi; gruvi.HttpServer'))
+
+    def perf_import_gruvi_all(self):
+        script = 'import gruvi; gruvi.HttpServer, gruvi.JsonRpcServer, gruvi.DbusServer'
+        self.add_result(self._startup_time(script))
+
+
+if __name__ == '__main__':
+    unittest.defaultTestLoader.testMethodPrefix = 'perf'
+    unittest.main()
@@ -0,0 +1,61 @@
+#
+# This file is part of Gruvi. Gruvi is free software available under the
+# terms of the MIT license. See the file "LICENSE" that was provided
+# together with this source file for the licensing terms.
+#
+# Copyright (c) 2012-2014 the Gruvi authors. See the file "AUTHORS" for a
+# complete list.
+
+from __future__ import absolute_import, print_function
+
+import time
+import unittest
+
+from gruvi.stream import StreamReader
+from support import PerformanceTest
+
+
+class PerfStreamReader(PerformanceTest):
+
+    def perf_readline_throughput(self):
+        # Measure the number of lines per second we can read, when the lines
+        # arrive in chunks that do not line up with the line boundaries.
+        data = b'x' * 50 + b'\n'
+        chunk = data * 100
+        chunk = chunk[:-30]
+        t0 = t1 = time.time()
+        count = 0
+        reader = StreamReader()
+        while t1 - t0 < 0.2:
+            reader.feed(chunk)
+            for i in range(99):
+                reader.readline()
+            reader.feed(data[-30:])
+            reader.readline()
+            count += 100
+            t1 = time.time()
+        speed = count / (t1 - t0)
+        self.add_result(speed)
+
+    def perf_readexactly_throughput(self):
+        # Measure the number of fixed size frames per second we can read, when
+        # the data arrives in many small chunks.
+        frame = b'x' * 64
+        t0 = t1 = time.time()
+        count = 0
+        reader = StreamReader()
+        while t1 - t0 < 0.2:
+            for i in range(100):
+                reader.feed(frame[:24])
+                reader.feed(frame[24:])
+            for i in range(100):
+                reader.readexactly(64)
+            count += 100
+            t1 = time.time()
+        speed = count / (t1 - t0)
+        self.add_result(speed)
+
+
+if __name__ == '__main__':
+    unittest.defaultTestLoader.testMethodPrefix = 'perf'
+    unittest.main()
@@ -357,6 +357,15 @@ class MockTransport(object):
         if len(self.buffer.getvalue()) > self.write_buffer_high:
             self.protocol.pause_writing()
 
+    def flush(self):
+        pass
+
+    def cork(self):
+        pass
+
+    def uncork(self):
+        pass
+
     def writelines(self, seq):
         self.buffer.writelines(seq)
 
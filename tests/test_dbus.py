@@ -398,6 +398,18 @@ class TestGruviDbus(UnitTest):
         server.close()
         client.close()
 
+    def test_call_method_concurrent(self):
+        # Ensure that calling a method works with concurrent dispatch.
+        server = DbusServer(echo_app, concurrency=10)
+        addr = 'tcp:host=127.0.0.1,port=0'
+        server.listen(addr)
+        client = DbusClient()
+        client.connect(server.addresses[0])
+        result = client.call_method('bus.name', '/path', 'my.iface', 'Echo')
+        self.assertEqual(result, ())
+        server.close()
+        client.close()
+
     def test_call_method_str_args(self):
         # Ensure that calling a method with string arguments works.
         server = DbusServer(echo_app)
@@ -483,21 +495,24 @@ class TestGruviDbus(UnitTest):
 
     def test_connection_limit(self):
         # Establish more connections than the DBUS server is willing to accept.
-        # The connections should be closed.
+        # The extra connection is accepted only after another one is closed.
         server = DbusServer(echo_app)
         addr = 'unix:path=' + self.pipename()
         server.listen(addr)
         server.max_connections = 10
         clients = []
-        exc = None
-        try:
-            for i in range(15):
-                client = DbusClient()
-                client.connect(addr)
-                clients.append(client)
-        except Exception as e:
-            exc = e
-        self.assertIsInstance(exc, TransportError)
+        for i in range(10):
+            client = DbusClient()
+            client.connect(addr)
+            clients.append(client)
+        client = DbusClient()
+        fiber = gruvi.spawn(client.connect, addr)
+        gruvi.sleep(0.1)
+        self.assertTrue(fiber.alive)
+        self.assertEqual(len(server.connections), server.max_connections)
+        clients[0].close()
+        fiber.join(2)
+        clients[0] = client
         self.assertLessEqual(len(server.connections), server.max_connections)
         for client in clients:
             client.close()
@@ -0,0 +1,279 @@
+#
+# This file is part of Gruvi. Gruvi is free software available under the
+# terms of the MIT license. See the file "LICENSE" that was provided
+# together with this source file for the licensing terms.
+#
+# Copyright (c) 2012-2014 the Gruvi authors. See the file "AUTHORS" for a
+# complete list.
+
+from __future__ import absolute_import, print_function
+
+import socket
+import struct
+import unittest
+import pyuv
+
+import gruvi
+from gruvi.dns import StubResolver, build_query, parse_message, parse_resolv_conf
+from gruvi.dns import parse_hosts, parse_services, T_A, T_AAAA, C_IN, F_RESPONSE, F_TRUNCATED
+from gruvi.address import DnsCache
+from gruvi.protocols import DatagramProtocol
+from gruvi.transports import DatagramTransport
+from gruvi.stream import StreamServer
+from support import UnitTest
+
+
+class DnsServer(DatagramProtocol):
+    """A stand-in DNS server that serves a fixed set of records.
+
+    The server listens on the same port for UDP and TCP. Names in *truncate*
+    get a truncated reply over UDP.
+    """
+
+    def __init__(self, records, truncate=()):
+        super(DnsServer, self).__init__()
+        self.records = records
+        self.truncate = truncate
+        self.queries = []
+
+    def start(self):
+        self.tcp_server = StreamServer(self._handle_stream)
+        self.tcp_server.listen(('127.0.0.1', 0))
+        self.address = self.tcp_server.addresses[0]
+        handle = pyuv.UDP(gruvi.get_hub().loop)
+        handle.bind(self.address)
+        self.udp_transport = DatagramTransport(handle)
+        self.udp_transport.start(self)
+
+    def close(self):
+        self.udp_transport.close()
+        self.tcp_server.close()
+
+    def build_reply(self, query, tcp=False):
+        message = parse_message(query)
+        name, qtype, qclass = message.questions[0]
+        self.queries.append((name, qtype, tcp))
+        header = struct.pack('!HHHHHH', message.id, F_RESPONSE, 1, 0, 0, 0)
+        question = query[12:]
+        if name not in self.records:
+            return header[:2] + struct.pack('!H', F_RESPONSE | 3) + header[4:] + question
+        if name in self.truncate and not tcp:
+            return header[:2] + struct.pack('!H', F_RESPONSE | F_TRUNCATED) + header[4:] \
+                        + question
+        answers = []
+        for address in self.records[name]:
+            family = socket.AF_INET6 if ':' in address else socket.AF_INET
+            if (family == socket.AF_INET6) != (qtype == T_AAAA):
+                continue
+            rdata = socket.inet_pton(family, address)
+            answers.append(b'\xc0\x0c' + struct.pack('!HHIH', qtype, C_IN, 60, len(rdata))
+                           + rdata)
+        header = struct.pack('!HHHHHH', message.id, F_RESPONSE, 1, len(answers), 0, 0)
+        return header + question + b''.join(answers)
+
+    def datagram_received(self, data, addr):
+        # Protocol callback
+        self.udp_transport.sendto(self.build_reply(data), addr)
+
+    def _handle_stream(self, stream, transport, protocol):
+        size = struct.unpack('!H', stream.readexactly(2))[0]
+        reply = self.build_reply(stream.readexactly(size), tcp=True)
+        stream.write(struct.pack('!H', len(reply)) + reply)
+
+
+class TestStubResolver(UnitTest):
+
+    records = {'foo.test': ['10.0.0.1', '10.0.0.2', 'fd00::1'],
+               'bar.test': ['10.0.0.3'],
+               'big.test': ['10.0.0.4']}
+
+    def setUp(self):
+        super(TestStubResolver, self).setUp()
+        self.server = DnsServer(self.records, truncate=('big.test',))
+        self.server.start()
+        self.resolver = StubResolver([self.server.address], resolv_conf=None, hosts=None)
+
+    def tearDown(self):
+        self.resolver.close()
+        self.server.close()
+        super(TestStubResolver, self).tearDown()
+
+    def test_resolve(self):
+        result = self.resolver.resolve('foo.test', socket.AF_INET)
+        self.assertEqual(result, [(socket.AF_INET, '10.0.0.1'), (socket.AF_INET, '10.0.0.2')])
+        result = self.resolver.resolve('foo.test', socket.AF_INET6)
+        self.assertEqual(result, [(socket.AF_INET6, 'fd00::1')])
+
+    def test_resolve_unspec(self):
+        # Both families are resolved, IPv6 first.
+        result = self.resolver.resolve('foo.test')
+        self.assertEqual([addr for _, addr in result], ['fd00::1', '10.0.0.1', '10.0.0.2'])
+        self.assertEqual(len(self.server.queries), 2)
+
+    def test_nxdomain(self):
+        exc = self.assertRaises(pyuv.error.UVError, self.resolver.resolve, 'baz.test')
+        self.assertEqual(exc.args[0], pyuv.errno.UV_EAI_NONAME)
+
+    def test_invalid_name(self):
+        # A name with an empty label, or a label that is too long, cannot be
+        # queried. This is reported as a failed lookup.
+        for name in ('foo..test', 'x' * 64 + '.test'):
+            exc = self.assertRaises(pyuv.error.UVError, self.resolver.resolve, name)
+            self.assertEqual(exc.args[0], pyuv.errno.UV_EAI_NONAME)
+        self.assertEqual(self.server.queries, [])
+
+    def test_numeric(self):
+        self.assertEqual(self.resolver.resolve('10.0.0.1'), [(socket.AF_INET, '10.0.0.1')])
+        self.assertEqual(self.resolver.resolve('::1'), [(socket.AF_INET6, '::1')])
+        self.assertEqual(self.server.queries, [])
+
+    def test_search(self):
+        resolver = StubResolver([self.server.address], search=['test'], resolv_conf=None,
+                                hosts=None)
+        result = resolver.resolve('bar', socket.AF_INET)
+        self.assertEqual(result, [(socket.AF_INET, '10.0.0.3')])
+        self.assertEqual(self.server.queries[0][0], 'bar.test')
+        resolver.close()
+
+    def test_truncated(self):
+        # A truncated reply is retried over TCP.
+        result = self.resolver.resolve('big.test', socket.AF_INET)
+        self.assertEqual(result, [(socket.AF_INET, '10.0.0.4')])
+        self.assertEqual(self.server.queries, [('big.test', T_A, False), ('big.test', T_A, True)])
+
+    def test_next_server(self):
+        # A name server that does not reply is skipped.
+        handle = pyuv.UDP(gruvi.get_hub().loop)
+        handle.bind(('127.0.0.1', 0))
+        resolver = StubResolver([handle.getsockname(), self.server.address], timeout=0.1,
+                                resolv_conf=None, hosts=None)
+        result = resolver.resolve('bar.test', socket.AF_INET)
+        self.assertEqual(result, [(socket.AF_INET, '10.0.0.3')])
+        resolver.close()
+        handle.close()
+
+    def test_timeout(self):
+        handle = pyuv.UDP(gruvi.get_hub().loop)
+        handle.bind(('127.0.0.1', 0))
+        resolver = StubResolver([handle.getsockname()], timeout=0.05, attempts=2,
+                                resolv_conf=None, hosts=None)
+        exc = self.assertRaises(pyuv.error.UVError, resolver.resolve, 'bar.test')
+        self.assertEqual(exc.args[0], pyuv.errno.UV_EAI_AGAIN)
+        self.assertRaises(gruvi.Timeout, resolver.query, 'bar.test', T_A, timeout=0.01)
+        resolver.close()
+        handle.close()
+
+    def test_concurrent(self):
+        results = []
+        def resolve():
+            results.append(self.resolver.resolve('foo.test', socket.AF_INET))
+        fibers = [gruvi.spawn(resolve) for i in range(50)]
+        for fiber in fibers:
+            fiber.join()
+        self.assertEqual(len(results), 50)
+        for result in results:
+            self.assertEqual(len(result), 2)
+        self.assertEqual(len(self.server.queries), 50)
+
+    def test_hosts(self):
+        fname = self.tempname()
+        with open(fname, 'w') as fout:
+            fout.write('# comment\n10.1.1.1 myhost myhost.test  # alias\n::1 myhost\n')
+        resolver = StubResolver([self.server.address], resolv_conf=None, hosts=fname)
+        self.assertEqual(resolver.resolve('MyHost'), [(socket.AF_INET6, '::1'),
+                                                      (socket.AF_INET, '10.1.1.1')])
+        self.assertEqual(resolver.resolve('myhost.test', socket.AF_INET),
+                         [(socket.AF_INET, '10.1.1.1')])
+        self.assertEqual(self.server.queries, [])
+        resolver.close()
+
+    def test_getaddrinfo(self):
+        result = self.resolver.getaddrinfo('bar.test', 80, socket.AF_INET, socket.SOCK_STREAM)
+        self.assertEqual(len(result), 1)
+        self.assertEqual(result[0].family, socket.AF_INET)
+        self.assertEqual(result[0].socktype, socket.SOCK_STREAM)
+        self.assertEqual(result[0].sockaddr, ('10.0.0.3', 80))
+        result = self.resolver.getaddrinfo('foo.test', '80', socket.AF_INET6)
+        self.assertEqual(len(result), 2)
+        self.assertEqual(result[0].sockaddr, ('fd00::1', 80, 0, 0))
+
+    def test_getaddrinfo_service(self):
+        fname = self.tempname()
+        with open(fname, 'w') as fout:
+            fout.write('http 80/tcp www # WorldWideWeb\n')
+        resolver = StubResolver([self.server.address], resolv_conf=None, hosts=None,
+                                services=fname)
+        result = resolver.getaddrinfo('bar.test', 'www', socket.AF_INET, socket.SOCK_STREAM)
+        self.assertEqual(result[0].sockaddr, ('10.0.0.3', 80))
+        exc = self.assertRaises(pyuv.error.UVError, resolver.getaddrinfo, 'bar.test', 'foo')
+        self.assertEqual(exc.args[0], pyuv.errno.UV_EAI_SERVICE)
+        resolver.close()
+
+    def test_multiple_threads(self):
+        # A resolver can be used from other threads, each with its own Hub.
+        result = self.resolver.resolve('bar.test', socket.AF_INET)
+        future = gruvi.get_io_pool().submit(self.resolver.resolve, 'bar.test', socket.AF_INET)
+        self.assertEqual(future.result(), result)
+        self.assertEqual(len(self.server.queries), 2)
+
+    def test_dns_cache(self):
+        cache = DnsCache(resolver=self.resolver.getaddrinfo)
+        result = cache.getaddrinfo('bar.test', 80, socket.AF_INET)
+        self.assertEqual(result[0].sockaddr, ('10.0.0.3', 80))
+        cache.getaddrinfo('bar.test', 80, socket.AF_INET)
+        self.assertEqual(len(self.server.queries), 1)
+        self.assertRaises(pyuv.error.UVError, cache.getaddrinfo, 'baz.test')
+        self.assertEqual(cache.stats()['misses'], 2)
+
+
+class TestResolverConfig(UnitTest):
+
+    def test_parse_resolv_conf(self):
+        fname = self.tempname()
+        with open(fname, 'w') as fout:
+            fout.write('; comment\nnameserver 10.0.0.1\nnameserver ::1\n'
+                       'search example.com example.org\noptions ndots:2 timeout:1 rotate\n')
+        conf = parse_resolv_conf(fname)
+        self.assertEqual(conf['nameservers'], ['10.0.0.1', '::1'])
+        self.assertEqual(conf['search'], ['example.com', 'example.org'])
+        self.assertEqual(conf['ndots'], 2)
+        self.assertEqual(conf['timeout'], 1)
+        self.assertEqual(conf['attempts'], 2)
+
+    def test_parse_resolv_conf_missing(self):
+        conf = parse_resolv_conf(self.tempname())
+        self.assertEqual(conf['nameservers'], [])
+
+    def test_parse_hosts(self):
+        fname = self.tempname()
+        with open(fname, 'w') as fout:
+            fout.write('127.0.0.1 localhost Local\n::1 localhost\n\n#10.0.0.1 foo\n')
+        hosts = parse_hosts(fname)
+        self.assertEqual(hosts, {'localhost': ['127.0.0.1', '::1'], 'local': ['127.0.0.1']})
+
+    def test_parse_services(self):
+        fname = self.tempname()
+        with open(fname, 'w') as fout:
+            fout.write('# comment\nhttp 80/tcp www\nhttp 80/udp\ndomain 53/udp\nbad x/tcp\n')
+        services = parse_services(fname)
+        self.assertEqual(services, {'http': 80, 'www': 80, 'domain': 53})
+
+    def test_resolver_config(self):
+        fname = self.tempname()
+        with open(fname, 'w') as fout:
+            fout.write('nameserver 10.0.0.1\nsearch example.com\n')
+        resolver = StubResolver(resolv_conf=fname, hosts=None)
+        self.assertEqual(resolver.nameservers, [('10.0.0.1', 53)])
+        self.assertEqual(resolver.search, ['example.com'])
+
+    def test_build_query(self):
+        query = build_query(0x1234, 'www.example.com', T_A)
+        message = parse_message(query)
+        self.assertEqual(message.id, 0x1234)
+        self.assertEqual(message.questions, [('www.example.com', T_A, C_IN)])
+        self.assertEqual(message.answers, [])
+        self.assertRaises(ValueError, parse_message, query[:-2])
+
+
+if __name__ == '__main__':
+    unittest.main()
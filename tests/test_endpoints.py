@@ -8,19 +8,30 @@
 
 from __future__ import absolute_import, print_function
 
+import ssl
+import time
 import socket
 import unittest
+import pyuv
 
 import gruvi
 from gruvi.stream import StreamProtocol
 from gruvi.endpoints import create_server, create_connection, getaddrinfo
+from gruvi.endpoints import _connect_tcp, _interleave_addresses
+from gruvi.endpoints import create_datagram_endpoint, DatagramClient, DatagramServer
+from gruvi.protocols import DatagramProtocol
+from gruvi.address import DnsCache, get_dns_cache
 from gruvi.transports import TransportError
+from gruvi.ssl import get_ssl_session_cache
 
 from support import UnitTest
 
 
 class TestCreateConnection(UnitTest):
 
+    # An address in TEST-NET-1 (RFC 5737) that should never be reachable.
+    blackhole = ('192.0.2.1', 9)
+
     def test_tcp(self):
         # Ensure that create_connection() and create_server() can be used to
         # connect to each other over TCP.
@@ -36,6 +47,35 @@ class TestCreateConnection(UnitTest):
         self.assertEqual(cproto.stream.readline(), b'')
         ctrans.close()
 
+    def test_tcp_no_ssl_session(self):
+        # A connection without SSL does not use the SSL session cache.
+        server = create_server(StreamProtocol, ('localhost', 0))
+        addr = server.addresses[0]
+        get_ssl_session_cache().clear()
+        ctrans, cproto = create_connection(StreamProtocol, addr)
+        self.assertNotIn('connection_lost', vars(cproto))
+        cproto.stream.write(b'foo\n')
+        gruvi.sleep(0.1)
+        ctrans.close()
+        self.assertEqual(get_ssl_session_cache().stats()['size'], 0)
+        server.close()
+
+    def test_tcp_reuse_port(self):
+        # Ensure that two servers can listen on the same port when reuse_port
+        # is set, and that both can be connected to.
+        if not hasattr(socket, 'SO_REUSEPORT'):
+            raise unittest.SkipTest('SO_REUSEPORT not supported')
+        server1 = create_server(StreamProtocol, ('127.0.0.1', 0), reuse_port=True)
+        addr = server1.addresses[0]
+        server2 = create_server(StreamProtocol, addr, reuse_port=True)
+        self.assertEqual(server2.addresses[0], addr)
+        ctrans, cproto = create_connection(StreamProtocol, addr)
+        gruvi.sleep(0.1)  # allow Server to accept()
+        self.assertEqual(len(list(server1.connections)) + len(list(server2.connections)), 1)
+        ctrans.close()
+        server1.close()
+        server2.close()
+
     def test_pipe(self):
         # Ensure that create_connection() and create_server() can be used to
         # connect to each other over a pipe.
@@ -68,6 +108,70 @@ class TestCreateConnection(UnitTest):
         self.assertEqual(cproto.stream.readline(), b'')
         ctrans.close()
 
+    def test_tcp_ssl_offload(self):
+        # Handshakes and large writes are processed in the CPU pool.
+        context = self.get_ssl_context()
+        server = create_server(StreamProtocol, ('localhost', 0), ssl=context,
+                               ssl_args={'offload': True})
+        addr = server.addresses[0]
+        ctrans, cproto = create_connection(StreamProtocol, addr, ssl=context,
+                                           ssl_args={'offload': True})
+        strans, sproto = list(server.connections)[0]
+        self.assertTrue(ctrans.get_extra_info('ssl') is not None)
+        cproto.stream.write(b'foo\n')
+        self.assertEqual(sproto.stream.readline(), b'foo\n')
+        buf = b'x' * (3 * strans.offload_threshold)
+        sproto.stream.write(buf)
+        self.assertEqual(cproto.stream.readexactly(len(buf)), buf)
+        ctrans.close()
+        self.assertEqual(sproto.stream.read(), b'')
+        server.close()
+
+    def test_tcp_ssl_coalesce(self):
+        # Many small writes are coalesced, and all of them arrive in order.
+        context = self.get_ssl_context()
+        server = create_server(StreamProtocol, ('localhost', 0), ssl=context)
+        addr = server.addresses[0]
+        ctrans, cproto = create_connection(StreamProtocol, addr, ssl=context)
+        strans, sproto = list(server.connections)[0]
+        for i in range(1000):
+            ctrans.write('{:04d}\n'.format(i).encode('ascii'))
+        ctrans.flush()
+        for i in range(1000):
+            self.assertEqual(sproto.stream.readline(), '{:04d}\n'.format(i).encode('ascii'))
+        ctrans.close()
+        server.close()
+
+    def test_tcp_ssl_session_resumption(self):
+        # A new connection to the same address resumes the SSL session.
+        if not hasattr(ssl, 'SSLSession'):
+            raise unittest.SkipTest('sessions require Python 3.6+')
+        context = self.get_ssl_context()
+        server = create_server(StreamProtocol, ('localhost', 0), ssl=context)
+        addr = server.addresses[0]
+        for i in range(2):
+            ctrans, cproto = create_connection(StreamProtocol, addr, ssl=context)
+            self.assertEqual(ctrans.get_extra_info('session_reused'), i == 1)
+            strans, sproto = list(server.connections)[0]
+            sproto.stream.write(b'foo\n')
+            self.assertEqual(cproto.stream.readline(), b'foo\n')
+            ctrans.close()
+            gruvi.sleep(0.1)
+        self.assertGreater(get_ssl_session_cache().stats()['size'], 0)
+        server.close()
+
+    def test_pipe_ssl_no_session_cache(self):
+        # Sessions are cached for (host, port) addresses only.
+        context = self.get_ssl_context()
+        addr = self.pipename()
+        server = create_server(StreamProtocol, addr, ssl=context)
+        get_ssl_session_cache().clear()
+        ctrans, cproto = create_connection(StreamProtocol, addr, ssl=context)
+        ctrans.close()
+        gruvi.sleep(0.1)
+        self.assertEqual(get_ssl_session_cache().stats()['size'], 0)
+        server.close()
+
     def test_pipe_ssl(self):
         # Ensure that create_connection() and create_server() can be used to
         # connect to each other over a pipe using SSL.
@@ -147,6 +251,247 @@ class TestCreateConnection(UnitTest):
         addr = self.pipename()
         self.assertRaises(TransportError, create_connection, StreamProtocol, addr)
 
+    def test_tcp_happy_eyeballs(self):
+        # Ensure that an unreachable address does not delay the connection to
+        # a reachable one by more than the connection attempt delay.
+        server = create_server(StreamProtocol, ('localhost', 0))
+        addr = server.addresses[0]
+        t0 = time.time()
+        handle, error = _connect_tcp([self.blackhole, addr], timeout=5, delay=0.1)
+        t1 = time.time()
+        self.assertIsNone(error)
+        self.assertLess(t1 - t0, 1)
+        self.assertEqual(handle.getpeername(), addr)
+        handle.close()
+        server.close()
+
+    def test_tcp_happy_eyeballs_sequential(self):
+        # With a delay of None, an attempt is only started when the previous
+        # one failed or timed out.
+        server = create_server(StreamProtocol, ('localhost', 0))
+        addr = server.addresses[0]
+        handle, error = _connect_tcp([self.blackhole, addr], timeout=0.1, delay=None)
+        self.assertIsNone(error)
+        self.assertEqual(handle.getpeername(), addr)
+        handle.close()
+        server.close()
+
+    def test_tcp_happy_eyeballs_all_failed(self):
+        # If all attempts fail, the last error is returned.
+        server = create_server(StreamProtocol, ('localhost', 0))
+        addr = server.addresses[0]
+        server.close()
+        handle, error = _connect_tcp([addr, addr], timeout=5, delay=0.1)
+        self.assertIsNone(handle)
+        self.assertIsNotNone(error)
+
+    def test_interleave_addresses(self):
+        v4 = [(socket.AF_INET, 0, 0, '', ('127.0.0.{}'.format(i), 0)) for i in range(3)]
+        v6 = [(socket.AF_INET6, 0, 0, '', ('::{}'.format(i), 0, 0, 0)) for i in range(2)]
+        result = _interleave_addresses(v6 + v4)
+        self.assertEqual(result, [v6[0][4], v4[0][4], v6[1][4], v4[1][4], v4[2][4]])
+
+    def test_shutdown(self):
+        # Ensure that Server.shutdown() stops listening, and closes existing
+        # connections after the timeout.
+        server = create_server(StreamProtocol, ('localhost', 0))
+        addr = server.addresses[0]
+        ctrans, cproto = create_connection(StreamProtocol, addr)
+        gruvi.sleep(0.1)  # allow Server to accept()
+        self.assertEqual(len(list(server.connections)), 1)
+        server.shutdown(0.1)
+        self.assertEqual(len(list(server.connections)), 0)
+        self.assertEqual(cproto.stream.readline(), b'')
+        ctrans.close()
+        self.assertRaises(TransportError, create_connection, StreamProtocol, addr)
+
+
+class TestServerAdmission(UnitTest):
+
+    def connect(self, addr, count):
+        clients = [create_connection(StreamProtocol, addr) for i in range(count)]
+        gruvi.sleep(0.1)  # allow Server to accept()
+        return clients
+
+    def test_pause_resume(self):
+        # At max_connections the server stops accepting, and resumes once a
+        # connection is closed.
+        server = create_server(StreamProtocol, ('localhost', 0))
+        server.max_connections = 2
+        clients = self.connect(server.addresses[0], 3)
+        self.assertEqual(len(list(server.connections)), 2)
+        stats = server.stats()
+        self.assertEqual(stats['accepted'], 2)
+        self.assertEqual(stats['pauses'], 1)
+        self.assertEqual(stats['rejected'], 0)
+        clients[0][0].close()
+        gruvi.sleep(0.1)
+        self.assertEqual(len(list(server.connections)), 2)
+        self.assertEqual(server.stats()['accepted'], 3)
+        for ctrans, _ in clients[1:]:
+            ctrans.close()
+        server.close()
+
+    def test_low_water(self):
+        server = create_server(StreamProtocol, ('localhost', 0))
+        server.max_connections = 3
+        server.low_water_connections = 2
+        clients = self.connect(server.addresses[0], 4)
+        self.assertEqual(len(list(server.connections)), 3)
+        clients[0][0].close()
+        gruvi.sleep(0.1)
+        self.assertEqual(len(list(server.connections)), 2)
+        clients[1][0].close()
+        gruvi.sleep(0.1)
+        self.assertEqual(len(list(server.connections)), 2)
+        for ctrans, _ in clients[2:]:
+            ctrans.close()
+        server.close()
+
+    def test_admission_queue(self):
+        # Connections over the limit are accepted into the admission queue,
+        # and started in order when a connection is closed.
+        server = create_server(StreamProtocol, ('localhost', 0))
+        server.max_connections = 1
+        server.max_queued_connections = 1
+        clients = self.connect(server.addresses[0], 3)
+        stats = server.stats()
+        self.assertEqual(stats['connections'], 1)
+        self.assertEqual(stats['queued'], 1)
+        self.assertEqual(stats['accepted'], 2)
+        self.assertEqual(stats['pauses'], 1)
+        clients[0][0].close()
+        gruvi.sleep(0.1)
+        stats = server.stats()
+        self.assertEqual(stats['connections'], 1)
+        self.assertEqual(stats['queued'], 1)
+        self.assertEqual(stats['accepted'], 3)
+        for ctrans, _ in clients[1:]:
+            ctrans.close()
+        server.close()
+        self.assertEqual(server.stats()['rejected'], 1)
+
+    def test_admission_timeout(self):
+        server = create_server(StreamProtocol, ('localhost', 0))
+        server.max_connections = 1
+        server.max_queued_connections = 1
+        server.admission_timeout = 0.1
+        clients = self.connect(server.addresses[0], 2)
+        self.assertEqual(server.stats()['queued'], 1)
+        # The queued connection is closed after the timeout.
+        self.assertEqual(clients[1][1].stream.readline(), b'')
+        stats = server.stats()
+        self.assertEqual(stats['queued'], 0)
+        self.assertEqual(stats['rejected'], 1)
+        for ctrans, _ in clients:
+            ctrans.close()
+        server.close()
+
+    def test_idle_timeout(self):
+        # Idle connections are closed, active ones are not.
+        server = create_server(StreamProtocol, ('localhost', 0))
+        server.idle_timeout = 0.2
+        clients = self.connect(server.addresses[0], 2)
+        for i in range(4):
+            clients[0][0].write(b'x')
+            gruvi.sleep(0.1)
+        self.assertEqual(len(list(server.connections)), 1)
+        self.assertEqual(clients[1][1].stream.read(), b'')
+        for ctrans, _ in clients:
+            ctrans.close()
+        server.close()
+
+    def test_stats_reset(self):
+        server = create_server(StreamProtocol, ('localhost', 0))
+        clients = self.connect(server.addresses[0], 2)
+        stats = server.stats(reset=True)
+        self.assertEqual(stats['accepted'], 2)
+        self.assertGreater(stats['accept_rate'], 0)
+        self.assertEqual(server.stats()['accepted'], 0)
+        for ctrans, _ in clients:
+            ctrans.close()
+        server.close()
+
+
+class DatagramEcho(DatagramProtocol):
+
+    def datagram_received(self, data, addr):
+        self._transport.sendto(data, addr)
+
+
+class DatagramCollector(DatagramProtocol):
+
+    def __init__(self):
+        super(DatagramCollector, self).__init__()
+        self.datagrams = []
+        self.batches = 0
+        self.received = gruvi.Event()
+
+    def datagrams_received(self, datagrams):
+        self.batches += 1
+        self.datagrams.extend(datagrams)
+        self.received.set()
+
+
+class TestDatagramEndpoint(UnitTest):
+
+    def test_echo(self):
+        server = DatagramServer(DatagramEcho)
+        server.listen(('127.0.0.1', 0))
+        addr = server.addresses[0]
+        client = DatagramClient(DatagramCollector)
+        client.connect(addr)
+        self.assertEqual(client.transport.get_extra_info('remote_address'), addr)
+        client.transport.sendto(b'foo')
+        client.protocol.received.wait(1)
+        self.assertEqual(client.protocol.datagrams, [(b'foo', addr)])
+        stats = client.stats()
+        self.assertEqual(stats['datagrams_sent'], 1)
+        self.assertEqual(stats['bytes_sent'], 3)
+        self.assertEqual(stats['datagrams_received'], 1)
+        self.assertEqual(server.stats()['datagrams_received'], 1)
+        client.close()
+        server.close()
+
+    def test_sendmany(self):
+        # Datagrams that arrive in the same loop iteration are delivered in
+        # batches.
+        server = DatagramServer(DatagramCollector)
+        server.listen(('127.0.0.1', 0))
+        addr = server.addresses[0]
+        transport, protocol = create_datagram_endpoint(DatagramProtocol, remote_address=addr)
+        datagrams = [bytearray(b'x' * (i+1)) for i in range(100)]
+        transport.sendmany(datagrams)
+        self.assertEqual(transport.stats()['datagrams_sent'], 100)
+        collector = server.endpoints[0][1]
+        while len(collector.datagrams) < 100:
+            collector.received.clear()
+            self.assertTrue(collector.received.wait(1))
+        self.assertEqual([data for data, _ in collector.datagrams], datagrams)
+        self.assertLess(collector.batches, 100)
+        stats = server.stats(reset=True)
+        self.assertEqual(stats['datagrams_received'], 100)
+        self.assertEqual(stats['bytes_received'], sum(range(1, 101)))
+        self.assertEqual(server.stats()['datagrams_received'], 0)
+        transport.close()
+        server.close()
+
+    def test_sendto_no_address(self):
+        transport, protocol = create_datagram_endpoint(DatagramProtocol, ('127.0.0.1', 0))
+        self.assertRaises(TransportError, transport.sendto, b'foo')
+        transport.close()
+
+    def test_reuse_address(self):
+        server = DatagramServer(DatagramCollector)
+        server.listen(('127.0.0.1', 0), reuse_address=True)
+        addr = server.addresses[0]
+        server.listen(addr, reuse_address=True)
+        self.assertEqual(server.addresses, [addr, addr])
+        server.close()
+
+    def test_no_address(self):
+        self.assertRaises(ValueError, create_datagram_endpoint, DatagramProtocol)
+
 
 class TestGetAddrInfo(UnitTest):
 
@@ -160,5 +505,73 @@ class TestGetAddrInfo(UnitTest):
         self.assertRaises(gruvi.Timeout, getaddrinfo, 'localhost', timeout=0)
 
 
+class TestDnsCache(UnitTest):
+
+    def test_cache_hit(self):
+        cache = DnsCache()
+        res1 = cache.getaddrinfo('localhost', family=socket.AF_INET)
+        res2 = cache.getaddrinfo('localhost', family=socket.AF_INET)
+        self.assertEqual(res1, res2)
+        stats = cache.stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['size'], 1)
+
+    def test_cache_expire(self):
+        cache = DnsCache(ttl=0.01)
+        cache.getaddrinfo('localhost', family=socket.AF_INET)
+        gruvi.sleep(0.02)
+        cache.getaddrinfo('localhost', family=socket.AF_INET)
+        stats = cache.stats()
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['hits'], 0)
+
+    def test_negative_cache(self):
+        cache = DnsCache()
+        self.assertRaises(pyuv.error.UVError, cache.getaddrinfo, 'nonexistent.invalid')
+        self.assertRaises(pyuv.error.UVError, cache.getaddrinfo, 'nonexistent.invalid')
+        stats = cache.stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['negative_hits'], 1)
+
+    def test_coalesce(self):
+        cache = DnsCache()
+        fibers = [gruvi.spawn(cache.getaddrinfo, 'localhost', family=socket.AF_INET)
+                  for i in range(10)]
+        for fiber in fibers:
+            fiber.join()
+        stats = cache.stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['coalesced'], 9)
+        self.assertEqual(stats['pending'], 0)
+
+    def test_flush(self):
+        cache = DnsCache()
+        cache.getaddrinfo('localhost', family=socket.AF_INET)
+        cache.getaddrinfo('127.0.0.1')
+        self.assertEqual(cache.stats()['size'], 2)
+        cache.flush('localhost')
+        self.assertEqual(cache.stats()['size'], 1)
+        cache.flush()
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_maxsize(self):
+        cache = DnsCache(maxsize=2)
+        for port in range(3):
+            cache.getaddrinfo('127.0.0.1', port)
+        self.assertEqual(cache.stats()['size'], 2)
+
+    def test_stats_reset(self):
+        cache = DnsCache()
+        cache.getaddrinfo('127.0.0.1')
+        self.assertEqual(cache.stats(reset=True)['misses'], 1)
+        self.assertEqual(cache.stats()['misses'], 0)
+
+    def test_default_cache(self):
+        self.assertIsInstance(get_dns_cache(), DnsCache)
+        getaddrinfo('127.0.0.1')
+        self.assertGreater(get_dns_cache().stats()['size'], 0)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -180,6 +180,20 @@ class PoolTest(object):
         fut = self.pool.submit(func)
         self.assertRaises(ValueError, fut.result)
 
+    def test_submit_exception_reuse_worker(self):
+        # A work item raising an exception should not kill its worker.
+        def func(val):
+            if val is None:
+                raise ValueError()
+            return val
+        pool = self.Pool(1)
+        self.assertEqual(pool.submit(func, 'foo').result(), 'foo')
+        workers = set(pool._workers)
+        self.assertRaises(ValueError, pool.submit(func, None).result)
+        self.assertEqual(pool.submit(func, 'bar').result(), 'bar')
+        self.assertEqual(pool._workers, workers)
+        pool.close()
+
     def test_map(self):
         def double(x):
             return x*2
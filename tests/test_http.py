@@ -12,11 +12,11 @@ import unittest
 import six
 
 import gruvi
-from gruvi.http import HttpServer, HttpClient
+from gruvi.http import HttpServer, HttpClient, HttpConnectionPool
 from gruvi.http import HttpMessage, HttpProtocol, HttpResponse
 from gruvi.http import parse_option_header
 from gruvi.http_ffi import lib as _lib
-from gruvi.stream import StreamReader
+from gruvi.stream import StreamReader, StreamClient
 
 from support import UnitTest, MockTransport
 
@@ -137,6 +137,23 @@ class TestHttpProtocol(UnitTest):
         self.assertTrue(m.body.eof)
         self.assertEqual(env['test.body'], b'Foo')
 
+    @unittest.skipIf(six.PY2, 'zero-copy bodies require Python 3')
+    def test_request_with_body_zero_copy(self):
+        r = b'POST / HTTP/1.1\r\nHost: example.com\r\n' \
+            b'Content-Length: 7\r\n\r\nFoo\nBar'
+        transport = MockTransport()
+        protocol = HttpProtocol(True, self.store_request)
+        protocol.zero_copy_body = True
+        transport.start(protocol)
+        protocol.data_received(r[:-5])
+        protocol.data_received(r[-5:])
+        self.assertIsNone(protocol._error)
+        env = self.get_request()
+        m = env['test.message']
+        self.assertEqual(m.headers, [('Host', 'example.com'), ('Content-Length', '7')])
+        self.assertTrue(m.body.eof)
+        self.assertEqual(env['test.body'], b'Foo\nBar')
+
     def test_request_with_chunked_body(self):
         r = b'GET / HTTP/1.1\r\nHost: example.com\r\n' \
             b'Transfer-Encoding: chunked\r\n\r\n' \
@@ -223,6 +240,38 @@ class TestHttpProtocol(UnitTest):
         m = env['test.message']
         self.assertEqual(m.parsed_url, ('http', 'user:pass@example.com:80',
                                         '/foo/bar', 'baz=qux', 'quux'))
+        self.assertEqual(m.path, '/foo/bar')
+        self.assertEqual(m.query, 'baz=qux')
+
+    def test_request_url_components(self):
+        r = b'GET /foo?bar=baz HTTP/1.1\r\n' \
+            b'Host: example.com\r\n\r\n'
+        self.parse_request(r)
+        env = self.get_request()
+        m = env['test.message']
+        self.assertIsNotNone(m.url_fields)
+        self.assertEqual(m.path, '/foo')
+        self.assertEqual(m.query, 'bar=baz')
+        self.assertEqual(m.parsed_url, ('', '', '/foo', 'bar=baz', ''))
+        self.assertEqual(env['PATH_INFO'], '/foo')
+        self.assertEqual(env['QUERY_STRING'], 'bar=baz')
+
+    def test_request_url_asterisk(self):
+        r = b'OPTIONS * HTTP/1.1\r\n' \
+            b'Host: example.com\r\n\r\n'
+        self.parse_request(r)
+        env = self.get_request()
+        m = env['test.message']
+        self.assertEqual(m.path, '*')
+        self.assertEqual(m.query, '')
+
+    def test_request_url_connect(self):
+        r = b'CONNECT example.com:443 HTTP/1.1\r\n' \
+            b'Host: example.com\r\n\r\n'
+        self.parse_request(r)
+        env = self.get_request()
+        m = env['test.message']
+        self.assertEqual(m.parsed_url, ('', 'example.com:443', '', '', ''))
 
     # Tests that parse a response
 
@@ -404,6 +453,17 @@ def echo_app(environ, start_response):
     return [body]
 
 
+def native_hello(message, writer):
+    writer.send('200 OK', [('Content-Type', 'text/plain')], b'Hello!')
+
+
+def native_echo(message, writer):
+    writer.start('200 OK', [('Content-Type', 'text/plain')])
+    writer.write(message.path)
+    writer.write(message.body.read())
+    writer.end([('X-Query', message.query)])
+
+
 class TestHttp(UnitTest):
 
     def test_simple(self):
@@ -490,6 +550,225 @@ class TestHttp(UnitTest):
         server.close()
         client.close()
 
+    def test_native_handler(self):
+        server = HttpServer(native_hello, native=True)
+        server.listen(('localhost', 0))
+        addr = server.addresses[0]
+        client = HttpClient()
+        client.connect(addr)
+        for i in range(3):
+            client.request('GET', '/')
+            response = client.getresponse()
+            self.assertEqual(response.status, 200)
+            self.assertEqual(response.get_header('Content-Type'), 'text/plain')
+            self.assertEqual(response.get_header('Content-Length'), '6')
+            self.assertTrue(response.get_header('Server').startswith('gruvi'))
+            self.assertIsNotNone(response.get_header('Date'))
+            self.assertEqual(response.read(), b'Hello!')
+        server.close()
+        client.close()
+
+    def test_native_handler_chunked(self):
+        server = HttpServer(native_echo, native=True)
+        server.listen(('localhost', 0))
+        addr = server.addresses[0]
+        client = HttpClient()
+        client.connect(addr)
+        client.request('POST', '/foo?bar', body=b'baz')
+        response = client.getresponse()
+        self.assertEqual(response.get_header('Transfer-Encoding'), 'chunked')
+        self.assertEqual(response.read(), b'/foobaz')
+        self.assertEqual(response.get_trailer('X-Query'), 'bar')
+        server.close()
+        client.close()
+
+    def test_native_handler_no_response(self):
+        # A handler that does not start a response sends a 204, which does
+        # not have a Content-Length header, and keeps the connection open.
+        server = HttpServer(lambda message, writer: None, native=True)
+        server.listen(('localhost', 0))
+        addr = server.addresses[0]
+        client = HttpClient()
+        client.connect(addr)
+        for i in range(2):
+            client.request('GET', '/')
+            response = client.getresponse()
+            self.assertEqual(response.status, 204)
+            self.assertIsNone(response.get_header('Content-Length'))
+            self.assertEqual(response.read(), b'')
+        server.close()
+        client.close()
+
+    def test_idle_timeout(self):
+        server = HttpServer(hello_app)
+        server.idle_timeout = 0.1
+        server.listen(('localhost', 0))
+        addr = server.addresses[0]
+        client = HttpClient()
+        client.connect(addr)
+        client.request('GET', '/')
+        self.assertEqual(client.getresponse().read(), b'Hello!')
+        gruvi.sleep(0.2)
+        self.assertEqual(len(list(server.connections)), 0)
+        server.close()
+        client.close()
+
+    def test_header_timeout(self):
+        server = HttpServer(hello_app)
+        server.header_timeout = 0.1
+        server.listen(('localhost', 0))
+        addr = server.addresses[0]
+        client = StreamClient()
+        client.connect(addr)
+        client.write(b'GET / HTTP/1.1\r\nHost: localhost\r\n')
+        # The connection is closed before the header is complete.
+        self.assertEqual(client.read(), b'')
+        client.close()
+        # A complete header is not affected.
+        client = HttpClient()
+        client.connect(addr)
+        client.request('GET', '/')
+        self.assertEqual(client.getresponse().read(), b'Hello!')
+        gruvi.sleep(0.2)
+        self.assertEqual(len(list(server.connections)), 1)
+        server.close()
+        client.close()
+
+    def test_body_timeout(self):
+        server = HttpServer(echo_app)
+        server.body_timeout = 0.1
+        server.listen(('localhost', 0))
+        addr = server.addresses[0]
+        client = StreamClient()
+        client.connect(addr)
+        client.write(b'POST / HTTP/1.1\r\nHost: localhost\r\nContent-Length: 10\r\n\r\nfoo')
+        self.assertEqual(client.read(), b'')
+        client.close()
+        server.close()
+
+    def test_body_timeout_paused(self):
+        # The body deadline does not run while reading is paused because the
+        # application is slow to consume the body.
+        def slow_echo_app(environ, start_response):
+            gruvi.sleep(0.5)
+            return echo_app(environ, start_response)
+        server = HttpServer(slow_echo_app)
+        server.body_timeout = 0.2
+        server.listen(('localhost', 0))
+        addr = server.addresses[0]
+        client = HttpClient()
+        client.connect(addr)
+        body = b'x' * 200000
+        client.request('POST', '/', body=body)
+        response = client.getresponse()
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.read(), body)
+        server.close()
+        client.close()
+
+
+class TestHttpConnectionPool(UnitTest):
+
+    def setUp(self):
+        super(TestHttpConnectionPool, self).setUp()
+        self.server = HttpServer(hello_app)
+        self.server.listen(('localhost', 0))
+        self.addr = self.server.addresses[0]
+
+    def tearDown(self):
+        self.server.close()
+        super(TestHttpConnectionPool, self).tearDown()
+
+    def get(self, client):
+        client.request('GET', '/')
+        response = client.getresponse()
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.read(), b'Hello!')
+
+    def test_reuse(self):
+        # Ensure that a released connection is reused.
+        pool = HttpConnectionPool()
+        client = pool.get_client(self.addr)
+        self.get(client)
+        pool.release(client)
+        self.assertIs(pool.get_client(self.addr), client)
+        self.get(client)
+        pool.release(client)
+        self.assertEqual(pool.connections, 1)
+        pool.close()
+        self.assertEqual(pool.connections, 0)
+
+    def test_no_reuse_unread_body(self):
+        # Ensure that a connection with an unread body is not reused.
+        pool = HttpConnectionPool()
+        client = pool.get_client(self.addr)
+        client.request('GET', '/')
+        client.getresponse()
+        pool.release(client)
+        self.assertEqual(pool.connections, 0)
+        client2 = pool.get_client(self.addr)
+        self.assertIsNot(client2, client)
+        pool.release(client2)
+        pool.close()
+
+    def test_no_reuse_closed(self):
+        # Ensure that an idle connection that was closed is not checked out.
+        pool = HttpConnectionPool()
+        client = pool.get_client(self.addr)
+        self.get(client)
+        pool.release(client)
+        client.transport.close()
+        gruvi.sleep(0.1)
+        client2 = pool.get_client(self.addr)
+        self.assertIsNot(client2, client)
+        self.assertEqual(pool.connections, 1)
+        pool.release(client2)
+        pool.close()
+
+    def test_idle_timeout(self):
+        # Ensure that idle connections are closed after the idle timeout.
+        pool = HttpConnectionPool(idle_timeout=0.1)
+        client = pool.get_client(self.addr)
+        self.get(client)
+        pool.release(client)
+        gruvi.sleep(0.2)
+        client2 = pool.get_client(self.addr)
+        self.assertIsNot(client2, client)
+        self.assertEqual(pool.connections, 1)
+        pool.release(client2)
+        pool.close()
+
+    def test_per_host_limit(self):
+        # Ensure that the per host limit is enforced.
+        pool = HttpConnectionPool(max_connections_per_host=1)
+        client = pool.get_client(self.addr)
+        self.assertRaises(gruvi.Timeout, pool.get_client, self.addr, timeout=0.1)
+        def release():
+            gruvi.sleep(0.1)
+            pool.release(client)
+        gruvi.spawn(release)
+        self.assertIs(pool.get_client(self.addr, timeout=1), client)
+        pool.release(client)
+        pool.close()
+
+    def test_global_limit(self):
+        # Ensure that an idle connection to another host is evicted when the
+        # global limit is reached.
+        server = HttpServer(hello_app)
+        server.listen(('localhost', 0))
+        addr2 = server.addresses[0]
+        pool = HttpConnectionPool(max_connections=1)
+        client = pool.get_client(self.addr)
+        self.get(client)
+        pool.release(client)
+        client2 = pool.get_client(addr2)
+        self.get(client2)
+        self.assertEqual(pool.connections, 1)
+        self.assertRaises(gruvi.Timeout, pool.get_client, self.addr, timeout=0.1)
+        pool.release(client2)
+        pool.close()
+        server.close()
+
 
 if __name__ == '__main__':
     unittest.main()
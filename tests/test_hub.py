@@ -144,6 +144,33 @@ class TestHub(UnitTest):
         self.assertEqual(len(result), 100)
         self.assertEqual(result, list(range(100)))
 
+    def test_callback_from_callback(self):
+        # A callback that is added by a callback should be run in a later
+        # batch, without the loop blocking in between.
+        hub = gruvi.get_hub()
+        result = []
+        def callback(i):
+            result.append(i)
+            if i < 10:
+                hub.run_callback(callback, i+1)
+        hub.run_callback(callback, 0)
+        gruvi.sleep(0.01)
+        self.assertEqual(result, list(range(11)))
+        self.assertFalse(hub._idle.active)
+
+    def test_callback_from_thread(self):
+        # Callbacks that are added from a different thread should wake up the
+        # loop, and should be run in the order that they were added.
+        hub = gruvi.get_hub()
+        result = []
+        def add_callbacks():
+            for i in range(100):
+                hub.run_callback(result.append, i)
+        t1 = threading.Thread(target=add_callbacks)
+        t1.start(); t1.join()
+        gruvi.sleep(0.01)
+        self.assertEqual(result, list(range(100)))
+
     def test_sleep(self):
         # Test that sleep() works
         hub = gruvi.get_hub()
@@ -157,6 +184,57 @@ class TestHub(UnitTest):
         t1 = hub.loop.now()
         self.assertGreaterEqual(t1-t0, 100)
 
+    def test_stats(self):
+        # Test that the instrumentation counters are updated.
+        hub = gruvi.get_hub()
+        stats = hub.stats()
+        for i in range(10):
+            gruvi.sleep(0)
+        stats2 = hub.stats(reset=True)
+        self.assertGreaterEqual(stats2['switches'], stats['switches'] + 10)
+        self.assertGreater(stats2['iterations'], stats['iterations'])
+        self.assertGreaterEqual(stats2['callbacks'], stats['callbacks'] + 10)
+        self.assertGreaterEqual(stats2['max_queue_depth'], 1)
+        self.assertGreater(stats2['mean_iteration_time'], 0)
+        self.assertIsNone(stats2['lag'])
+        self.assertEqual(hub.stats()['max_queue_depth'], 0)
+
+    def test_monitor(self):
+        # Test that the monitor measures the event loop lag, and calls the
+        # monitor callback.
+        hub = gruvi.get_hub()
+        result = []
+        hub.start_monitor(0.01, result.append)
+        gruvi.sleep(0.02)
+        time.sleep(0.05)  # block the loop
+        gruvi.sleep(0.02)
+        hub.stop_monitor()
+        self.assertGreaterEqual(len(result), 2)
+        self.assertGreaterEqual(max(stats['lag'] for stats in result), 0.03)
+        self.assertIsNone(hub.stats()['lag'])
+
+    def test_call_later(self):
+        # Test that call_later() runs callbacks in deadline order, and that a
+        # cancelled callback is not run.
+        hub = gruvi.get_hub()
+        result = []
+        hub.call_later(0.02, result.append, 2)
+        hub.call_later(0.01, result.append, 1)
+        timer = hub.call_later(0.01, result.append, 3)
+        self.assertTrue(timer.active)
+        timer.cancel()
+        self.assertFalse(timer.active)
+        gruvi.sleep(0.03)
+        self.assertEqual(result, [1, 2])
+
+    def test_call_later_cancelled(self):
+        # Test that cancelled timers do not accumulate in the heap.
+        hub = gruvi.get_hub()
+        timers = [hub.call_later(10, lambda: None) for i in range(1000)]
+        for timer in timers:
+            timer.cancel()
+        self.assertLess(len(hub._timers), 1000)
+
 
 class TestAssertNoSwitchpoints(UnitTest):
 
@@ -184,6 +262,22 @@ class TestSwitchBack(UnitTest):
         with gruvi.switch_back(0.01):
             self.assertRaises(gruvi.Timeout, hub.switch)
 
+    def test_many_timeouts(self):
+        # Many concurrent switch_back timeouts should fire in deadline order.
+        hub = gruvi.get_hub()
+        result = []
+        def waiter(timeout):
+            with gruvi.switch_back(timeout):
+                try:
+                    hub.switch()
+                except gruvi.Timeout:
+                    result.append(timeout)
+        timeouts = [0.01 * (i % 5) for i in range(100)]
+        fibers = [gruvi.spawn(waiter, timeout) for timeout in timeouts]
+        for fiber in fibers:
+            fiber.join()
+        self.assertEqual(result, sorted(timeouts))
+
     def test_throw(self):
         # An exception thrown with the throw() method of a switch_back instance
         # should cause hub.switch to raise that exception.
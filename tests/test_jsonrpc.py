@@ -10,12 +10,14 @@ from __future__ import absolute_import, print_function
 
 import os
 import json
+import time
 import unittest
 
 import gruvi
 from gruvi import jsonrpc
 from gruvi.jsonrpc import JsonRpcError, JsonRpcMethodCallError
 from gruvi.jsonrpc import JsonRpcProtocol, JsonRpcClient, JsonRpcServer
+from gruvi.jsonrpc import JsonCodec, OrjsonCodec
 from gruvi.jsonrpc_ffi import ffi as _ffi, lib as _lib
 from gruvi.transports import TransportError
 from support import UnitTest, MockTransport
@@ -24,7 +26,9 @@ from support import UnitTest, MockTransport
 _keepalive = None
 
 def set_buffer(ctx, buf):
-    global _keepalive  # See note in JsonRpcProtocol
+    # Note: "struct split_context" does not keep a reference to its fields!
+    # Therefore use a Python variable to keep the cdata object alive.
+    global _keepalive
     _keepalive = ctx.buf = _ffi.new('char[]', buf)
     ctx.buflen = len(buf)
     ctx.offset = 0
@@ -111,6 +115,76 @@ class TestJsonRpcFfi(UnitTest):
         self.assertEqual(error, ctx.error) == 0
         self.assertEqual(ctx.offset, 1)
 
+    def test_batch(self):
+        r = b'{ "foo": "bar" } {"baz": "qux"}\n{ "quux'
+        ctx = _ffi.new('struct split_context *')
+        offsets = _ffi.new('int[]', 10)
+        count = _lib.json_split_batch(ctx, r, len(r), offsets, 10)
+        self.assertEqual(count, 2)
+        self.assertEqual(list(offsets[0:count]), [16, 31])
+        self.assertEqual(ctx.error, _lib.INCOMPLETE)
+        self.assertEqual(ctx.offset, len(r))
+        r = b'": 1 }'
+        ctx.offset = 0
+        count = _lib.json_split_batch(ctx, r, len(r), offsets, 10)
+        self.assertEqual(count, 1)
+        self.assertEqual(offsets[0], len(r))
+        self.assertEqual(ctx.error, 0)
+
+    def test_batch_max_offsets(self):
+        r = b'{}' * 5
+        ctx = _ffi.new('struct split_context *')
+        offsets = _ffi.new('int[]', 3)
+        count = _lib.json_split_batch(ctx, r, len(r), offsets, 3)
+        self.assertEqual(count, 3)
+        self.assertEqual(list(offsets[0:count]), [2, 4, 6])
+        self.assertEqual(ctx.error, 0)
+        self.assertEqual(ctx.offset, 6)
+        count = _lib.json_split_batch(ctx, r, len(r), offsets, 3)
+        self.assertEqual(count, 2)
+        self.assertEqual(list(offsets[0:count]), [8, 10])
+        self.assertEqual(ctx.offset, len(r))
+
+    def test_batch_error(self):
+        r = b'{} x {}'
+        ctx = _ffi.new('struct split_context *')
+        offsets = _ffi.new('int[]', 10)
+        count = _lib.json_split_batch(ctx, r, len(r), offsets, 10)
+        self.assertEqual(count, 1)
+        self.assertEqual(offsets[0], 2)
+        self.assertEqual(ctx.error, _lib.ERROR)
+        self.assertEqual(ctx.offset, 3)
+
+
+class TestJsonCodec(UnitTest):
+
+    def check_codec(self, codec):
+        message = {'id': 1, 'method': 'foo', 'params': [u'b\xe4r', 2**70, None]}
+        encoded = codec.encode(message)
+        self.assertIsInstance(encoded, bytes)
+        self.assertEqual(codec.decode(encoded), message)
+        self.assertEqual(codec.decode(bytearray(encoded)), message)
+        self.assertRaises(ValueError, codec.decode, b'{ "xxxx" }')
+        self.assertRaises(UnicodeDecodeError, codec.decode, b'{ "foo": "\xff" }')
+
+    def test_json(self):
+        codec = JsonCodec()
+        self.check_codec(codec)
+        message = {'id': 1, 'method': 'foo', 'params': []}
+        self.assertNotIn(b' ', codec.encode(message))
+        codec = JsonCodec(indent=2)
+        self.assertIn(b'\n', codec.encode(message))
+
+    def test_orjson(self):
+        if jsonrpc.orjson is None:
+            raise unittest.SkipTest('orjson is not installed')
+        self.check_codec(OrjsonCodec())
+
+    def test_default(self):
+        codec = jsonrpc.get_default_codec()
+        self.assertIs(jsonrpc.get_default_codec(), codec)
+        self.check_codec(codec)
+
 
 class TestJsonRpcProtocol(UnitTest):
 
@@ -143,6 +217,21 @@ class TestJsonRpcProtocol(UnitTest):
         self.assertEqual(len(pp), 1)
         self.assertIs(pp[0], proto)
 
+    def test_lazy_dispatcher(self):
+        # The dispatcher should be started by the first message, and should
+        # exit when it is idle.
+        proto = self.protocol
+        proto.dispatcher_idle_timeout = 0.01
+        self.assertIsNone(proto.dispatcher)
+        proto.data_received(b'{ "id": "1", "method": "foo" }')
+        self.assertIsNotNone(proto.dispatcher)
+        self.assertEqual(len(self.get_messages()), 1)
+        gruvi.sleep(0.05)
+        self.assertIsNone(proto.dispatcher)
+        proto.data_received(b'{ "id": "2", "method": "bar" }')
+        self.assertIsNotNone(proto.dispatcher)
+        self.assertEqual(len(self.get_messages()), 2)
+
     def test_multiple(self):
         m = b'{ "id": "1", "method": "foo" }' \
             b'{ "id": "2", "method": "bar" }'
@@ -249,6 +338,12 @@ def reflect_app(message, transport, protocol):
     message = jsonrpc.create_response(message, value)
     protocol.send_message(message)
 
+def sleep_app(message, transport, protocol):
+    if message.get('method') == 'sleep':
+        gruvi.sleep(message['params'][0])
+    message = jsonrpc.create_response(message, message['params'])
+    protocol.send_message(message)
+
 def notification_app():
     notifications = []
     def application(message, transport, protocol):
@@ -282,6 +377,50 @@ class TestJsonRpc(UnitTest):
         server.close()
         client.close()
 
+    def test_call_method_codec(self):
+        server = JsonRpcServer(echo_app, codec=JsonCodec(indent=2))
+        server.listen(('localhost', 0))
+        addr = server.addresses[0]
+        client = JsonRpcClient(codec=JsonCodec())
+        client.connect(addr)
+        result = client.call_method('echo', 'foo')
+        self.assertEqual(result, ['foo'])
+        server.close()
+        client.close()
+
+    def test_call_method_concurrent(self):
+        server = JsonRpcServer(sleep_app, concurrency=10)
+        server.listen(('localhost', 0))
+        addr = server.addresses[0]
+        client = JsonRpcClient()
+        client.connect(addr)
+        fiber = gruvi.spawn(client.call_method, 'sleep', 0.2)
+        gruvi.sleep(0)
+        t0 = time.time()
+        result = client.call_method('echo', 'foo')
+        self.assertEqual(result, ['foo'])
+        self.assertLess(time.time() - t0, 0.2)
+        self.assertTrue(fiber.is_alive())
+        fiber.join()
+        server.close()
+        client.close()
+
+    def test_call_method_max_inflight(self):
+        server = JsonRpcServer(sleep_app, concurrency=10, max_inflight=1)
+        server.listen(('localhost', 0))
+        addr = server.addresses[0]
+        client = JsonRpcClient()
+        client.connect(addr)
+        fiber = gruvi.spawn(client.call_method, 'sleep', 0.2)
+        gruvi.sleep(0)
+        t0 = time.time()
+        result = client.call_method('echo', 'foo')
+        self.assertEqual(result, ['foo'])
+        self.assertGreater(time.time() - t0, 0.1)
+        fiber.join()
+        server.close()
+        client.close()
+
     def test_call_method_pipe(self):
         server = JsonRpcServer(echo_app)
         server.listen(self.pipename(abstract=True))
@@ -438,18 +577,19 @@ class TestJsonRpc(UnitTest):
         addr = server.addresses[0]
         server.max_connections = 10
         clients = []
-        exc = None
-        try:
-            for i in range(15):
-                client = JsonRpcClient(timeout=2)
-                client.connect(addr)
-                client.call_method('echo')
-                clients.append(client)
-        except Exception as e:
-            exc = e
-        self.assertIsInstance(exc, TransportError)
+        for i in range(15):
+            client = JsonRpcClient(timeout=0.2)
+            client.connect(addr)
+            clients.append(client)
+        for client in clients[:10]:
+            client.call_method('echo')
+        # The remaining connections wait in the listen backlog.
+        self.assertRaises(gruvi.Timeout, clients[10].call_method, 'echo')
+        self.assertEqual(len(server.connections), server.max_connections)
+        clients[0].close()
+        self.assertEqual(clients[10].call_method('echo', timeout=2), [])
         self.assertLessEqual(len(server.connections), server.max_connections)
-        for client in clients:
+        for client in clients[1:]:
             client.close()
         server.close()
 
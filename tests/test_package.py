@@ -0,0 +1,50 @@
+#
+# This file is part of Gruvi. Gruvi is free software available under the
+# terms of the MIT license. See the file "LICENSE" that was provided
+# together with this source file for the licensing terms.
+#
+# Copyright (c) 2012-2014 the Gruvi authors. See the file "AUTHORS" for a
+# complete list.
+
+from __future__ import absolute_import, print_function
+
+import os
+import sys
+import importlib
+import subprocess
+import unittest
+
+import gruvi
+from support import UnitTest
+
+
+class TestPackage(UnitTest):
+
+    def test_lazy_exports(self):
+        # The names that are imported lazily must match the __all__ of their
+        # subpackages.
+        for modname, names in gruvi._lazy_exports.items():
+            module = importlib.import_module('gruvi.' + modname)
+            self.assertEqual(sorted(names), sorted(module.__all__))
+
+    def test_lazy_names(self):
+        # All lazily imported names must be available as attributes.
+        for name, modname in gruvi._lazy_names.items():
+            module = importlib.import_module('gruvi.' + modname)
+            self.assertIs(getattr(gruvi, name), getattr(module, name))
+        self.assertRaises(AttributeError, getattr, gruvi, 'NoSuchName')
+
+    def test_lazy_import(self):
+        # The protocol subpackages should not be imported by "import gruvi".
+        env = os.environ.copy()
+        env['PYTHONPATH'] = os.path.dirname(os.path.dirname(os.path.abspath(gruvi.__file__)))
+        script = 'import sys, gruvi; print(",".join(sorted(sys.modules)))'
+        output = subprocess.check_output([sys.executable, '-c', script], env=env)
+        modules = output.decode('ascii').strip().split(',')
+        self.assertIn('gruvi.stream', modules)
+        for modname in gruvi._lazy_exports:
+            self.assertNotIn('gruvi.' + modname, modules)
+
+
+if __name__ == '__main__':
+    unittest.main()
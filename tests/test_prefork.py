@@ -0,0 +1,117 @@
+#
+# This file is part of Gruvi. Gruvi is free software available under the
+# terms of the MIT license. See the file "LICENSE" that was provided
+# together with this source file for the licensing terms.
+#
+# Copyright (c) 2012-2014 the Gruvi authors. See the file "AUTHORS" for a
+# complete list.
+
+from __future__ import absolute_import, print_function
+
+import os
+import sys
+import signal
+import socket
+import textwrap
+import unittest
+
+import gruvi
+from gruvi.process import Process, PIPE
+from gruvi.http import HttpClient
+
+from support import UnitTest
+
+
+server_script = textwrap.dedent("""\
+    import os
+    import sys
+    import gruvi
+
+    def pid_app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [str(os.getpid()).encode('ascii')]
+
+    def make_server():
+        return gruvi.HttpServer(pid_app)
+
+    prefork = gruvi.PreforkServer(make_server, workers=int(sys.argv[1]),
+                                  reuse_port=sys.argv[2] == 'reuse_port')
+    prefork.listen(('127.0.0.1', int(sys.argv[3])))
+    print(prefork.addresses[0][1] if prefork.addresses else sys.argv[3])
+    sys.stdout.flush()
+    prefork.run()
+    """)
+
+
+@unittest.skipIf(not hasattr(os, 'fork'), 'requires os.fork()')
+class TestPreforkServer(UnitTest):
+
+    def start_server(self, workers, reuse_port=False, port=0):
+        script = self.tempname('prefork.py')
+        with open(script, 'w') as fout:
+            fout.write(server_script)
+        env = os.environ.copy()
+        env['PYTHONPATH'] = self.topdir
+        proc = Process()
+        args = [sys.executable, script, str(workers), 'reuse_port' if reuse_port else '-',
+                str(port)]
+        proc.spawn(args, stdout=PIPE, env=env)
+        port = int(proc.stdout.readline())
+        return proc, ('127.0.0.1', port)
+
+    def get_pid(self, addr):
+        # Return the pid of the worker that served a request.
+        for i in range(20):
+            client = HttpClient()
+            try:
+                client.connect(addr)
+            except gruvi.TransportError:
+                # Workers in reuse_port mode may not be listening yet.
+                gruvi.sleep(0.1)
+                continue
+            client.request('GET', '/')
+            response = client.getresponse()
+            self.assertEqual(response.status, 200)
+            pid = int(response.read())
+            client.close()
+            return pid
+        self.fail('could not connect to {}'.format(addr))
+
+    def stop_server(self, proc):
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(5)
+        self.assertEqual(proc.returncode, 0)
+        proc.close()
+
+    def test_inherited_socket(self):
+        # Ensure that workers can serve requests on an inherited socket.
+        proc, addr = self.start_server(2)
+        pid = self.get_pid(addr)
+        self.assertNotEqual(pid, proc.pid)
+        self.stop_server(proc)
+
+    def test_reuse_port(self):
+        # Ensure that workers can serve requests with SO_REUSEPORT.
+        if not hasattr(socket, 'SO_REUSEPORT'):
+            raise unittest.SkipTest('SO_REUSEPORT not supported')
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        proc, addr = self.start_server(2, True, port)
+        pid = self.get_pid(addr)
+        self.assertNotEqual(pid, proc.pid)
+        self.stop_server(proc)
+
+    def test_restart_worker(self):
+        # Ensure that a worker that is killed is restarted.
+        proc, addr = self.start_server(1)
+        pid = self.get_pid(addr)
+        os.kill(pid, signal.SIGKILL)
+        gruvi.sleep(0.5)
+        self.assertNotEqual(self.get_pid(addr), pid)
+        self.stop_server(proc)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -16,7 +16,7 @@ import pyuv
 
 from unittest import SkipTest
 
-from gruvi.ssl import SslPipe, SslTransport
+from gruvi.ssl import SslPipe, SslTransport, SslSessionCache, get_ssl_context
 from gruvi.sslcompat import SSLContext
 from support import UnitTest
 from test_transports import EventLoopTest, TransportTest
@@ -56,6 +56,17 @@ def communicate(buf, client, server, clientssl, serverssl):
     return received
 
 
+def count_records(ssldata):
+    """Return the number of SSL records in the list of buffers *ssldata*."""
+    buf = bytearray(b''.join(ssldata))
+    count = offset = 0
+    while offset < len(buf):
+        # Record header: type (1 byte), version (2 bytes), length (2 bytes)
+        count += 1
+        offset += 5 + (buf[offset+3] << 8 | buf[offset+4])
+    return count
+
+
 class TestSslPipe(UnitTest):
     """Test suite for the SslPipe class."""
 
@@ -179,6 +190,97 @@ class TestSslPipe(UnitTest):
         self.assertFalse(server.wrapped)
         self.assertEqual(received, buf)  # this was sent in the clear
 
+    def test_session_resumption(self):
+        if not hasattr(ssl, 'SSLSession'):
+            raise SkipTest('sessions require Python 3.6+')
+        client, server = self.client, self.server
+        clientssl = client.do_handshake()
+        serverssl = server.do_handshake()
+        communicate(b'foo', client, server, clientssl, serverssl)
+        # With TLS 1.3 the session ticket is received after the handshake.
+        communicate(b'bar', server, client, [], [])
+        session = client.session
+        self.assertIsNotNone(session)
+        self.assertFalse(client.session_reused)
+        client = SslPipe(client.context, False, session=session)
+        server = SslPipe(server.context, True)
+        clientssl = client.do_handshake()
+        serverssl = server.do_handshake()
+        received = communicate(b'foo', client, server, clientssl, serverssl)
+        self.assertEqual(received, b'foo')
+        self.assertTrue(client.session_reused)
+        self.assertTrue(server.session_reused)
+
+    def test_record_size(self):
+        # Small records are used for the first bytes, and full size records
+        # after that, and again after reset_record_size().
+        client, server = self.client, self.server
+        client.small_record_limit = 10000
+        client.reset_record_size()
+        clientssl = client.do_handshake()
+        serverssl = server.do_handshake()
+        communicate(b'x', client, server, clientssl, serverssl)
+        buf = b'x' * 40000
+        ssldata, offset = client.feed_appdata(buf)
+        self.assertEqual(offset, len(buf))
+        # 8 small records of 1400 bytes, then 28800 bytes in 2 full size records.
+        self.assertEqual(count_records(ssldata), 8 + 2)
+        received = server.feed_ssldata(b''.join(ssldata))[1]
+        self.assertEqual(b''.join(received), buf)
+        ssldata, offset = client.feed_appdata(buf)
+        self.assertEqual(count_records(ssldata), 3)
+        client.reset_record_size()
+        ssldata, offset = client.feed_appdata(b'x' * 2000)
+        self.assertEqual(count_records(ssldata), 2)
+
+
+class TestSslSessionCache(UnitTest):
+
+    def test_get_put(self):
+        cache = SslSessionCache()
+        context, session = object(), object()
+        self.assertIsNone(cache.get('foo', context))
+        cache.put('foo', context, session)
+        self.assertIs(cache.get('foo', context), session)
+        # A session is only returned for the context it was created with.
+        self.assertIsNone(cache.get('foo', object()))
+        cache.put('bar', context, None)
+        self.assertIsNone(cache.get('bar', context))
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 3)
+        self.assertEqual(stats['size'], 1)
+
+    def test_maxsize(self):
+        cache = SslSessionCache(maxsize=2)
+        context = object()
+        cache.put('foo', context, 1)
+        cache.put('bar', context, 2)
+        cache.get('foo', context)
+        cache.put('baz', context, 3)
+        # "bar" was least recently used.
+        self.assertIsNone(cache.get('bar', context))
+        self.assertEqual(cache.get('foo', context), 1)
+        self.assertEqual(cache.get('baz', context), 3)
+
+    def test_remove_clear(self):
+        cache = SslSessionCache()
+        context = object()
+        cache.put('foo', context, 1)
+        cache.put('bar', context, 2)
+        cache.remove('foo')
+        self.assertIsNone(cache.get('foo', context))
+        cache.clear()
+        self.assertEqual(cache.stats(reset=True)['size'], 0)
+        self.assertEqual(cache.stats()['misses'], 0)
+
+    def test_get_ssl_context(self):
+        context = get_ssl_context()
+        self.assertIs(get_ssl_context(), context)
+        other = get_ssl_context(certfile=self.certname, keyfile=self.certname)
+        self.assertIsNot(other, context)
+        self.assertIs(get_ssl_context(keyfile=self.certname, certfile=self.certname), other)
+
 
 class SslTransportTest(TransportTest):
 
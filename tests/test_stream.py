@@ -9,6 +9,7 @@
 from __future__ import absolute_import, print_function
 
 import os
+import array
 import six
 import hashlib
 import unittest
@@ -16,8 +17,9 @@ from io import TextIOWrapper
 
 import gruvi
 from gruvi.stream import StreamReader, StreamProtocol, StreamClient, StreamServer
+from gruvi.stream import IncompleteReadError
+from gruvi.protocols import ProtocolError
 from gruvi.errors import Timeout
-from gruvi.transports import TransportError
 from support import UnitTest, MockTransport
 
 
@@ -246,6 +248,161 @@ class TestStreamReader(UnitTest):
         self.assertEqual(six.next(it), b'bar\n')
         self.assertRaises(RuntimeError, six.next, it)
 
+    def test_readline_delim_split(self):
+        # A multi-byte delimiter may be split over multiple chunks.
+        reader = StreamReader()
+        reader.feed(b'foo\r')
+        reader.feed(b'\nbar\r')
+        reader.feed(b'\n')
+        reader.feed_eof()
+        self.assertEqual(reader.readline(delim=b'\r\n'), b'foo\r\n')
+        self.assertEqual(reader.readline(delim=b'\r\n'), b'bar\r\n')
+        self.assertEqual(reader.readline(delim=b'\r\n'), b'')
+
+    def test_readinto(self):
+        reader = StreamReader()
+        reader.feed(b'foo')
+        reader.feed(b'bar')
+        reader.feed_eof()
+        buf = bytearray(4)
+        self.assertEqual(reader.readinto(buf), 4)
+        self.assertEqual(buf, b'foob')
+        self.assertEqual(reader.buffer_size, 2)
+        self.assertEqual(reader.readinto(buf), 2)
+        self.assertEqual(buf[:2], b'ar')
+        self.assertEqual(reader.readinto(buf), 0)
+
+    def test_readinto_typed(self):
+        # A buffer with an item size other than 1 is filled byte-wise.
+        if not six.PY3:
+            raise unittest.SkipTest('memoryview.cast() requires Python 3')
+        reader = StreamReader()
+        reader.feed(b'\x01\x00\x00\x00\x02\x00')
+        reader.feed_eof()
+        buf = array.array('i', [0, 0])
+        self.assertEqual(reader.readinto(buf), 6)
+        self.assertEqual(buf.tobytes()[:6], b'\x01\x00\x00\x00\x02\x00')
+
+    def test_readinto_wait(self):
+        reader = StreamReader()
+        reader.feed(b'foo')
+        def write_more():
+            gruvi.sleep(0.01)
+            reader.feed(b'bar')
+        gruvi.spawn(write_more)
+        buf = bytearray(6)
+        self.assertEqual(reader.readinto(buf), 6)
+        self.assertEqual(buf, b'foobar')
+
+    def test_readinto_error(self):
+        reader = StreamReader()
+        reader.feed(b'foo')
+        reader.feed_error(RuntimeError)
+        buf = bytearray(6)
+        self.assertEqual(reader.readinto(buf), 3)
+        self.assertRaises(RuntimeError, reader.readinto, buf)
+
+    def test_readexactly(self):
+        reader = StreamReader()
+        reader.feed(b'foo')
+        reader.feed(b'bar')
+        reader.feed_eof()
+        self.assertEqual(reader.readexactly(4), b'foob')
+        try:
+            reader.readexactly(4)
+        except IncompleteReadError as e:
+            exc = e
+        self.assertEqual(exc.partial, b'ar')
+        self.assertEqual(exc.expected, 4)
+
+    def test_readexactly_wait(self):
+        reader = StreamReader()
+        reader.feed(b'foo')
+        def write_more():
+            gruvi.sleep(0.01)
+            reader.feed(b'bar')
+        gruvi.spawn(write_more)
+        self.assertEqual(reader.readexactly(6), b'foobar')
+
+    def test_readuntil(self):
+        reader = StreamReader()
+        reader.feed(b'foo\r\nba')
+        reader.feed(b'r\r\nbaz')
+        reader.feed_eof()
+        self.assertEqual(reader.readuntil(b'\r\n'), b'foo\r\n')
+        self.assertEqual(reader.readuntil(b'\r\n'), b'bar\r\n')
+        try:
+            reader.readuntil(b'\r\n')
+        except IncompleteReadError as e:
+            self.assertEqual(e.partial, b'baz')
+        else:
+            self.fail('IncompleteReadError not raised')
+
+    def test_readuntil_limit(self):
+        reader = StreamReader()
+        reader.feed(b'foo\nbarbaz\n')
+        self.assertEqual(reader.readuntil(b'\n', 4), b'foo\n')
+        self.assertRaises(ProtocolError, reader.readuntil, b'\n', 4)
+
+    def test_readuntil_wait_error(self):
+        reader = StreamReader()
+        reader.feed(b'foo\nbar')
+        def write_more():
+            gruvi.sleep(0.01)
+            reader.feed_error(RuntimeError)
+        gruvi.spawn(write_more)
+        self.assertEqual(reader.readuntil(), b'foo\n')
+        self.assertRaises(IncompleteReadError, reader.readuntil)
+        self.assertRaises(RuntimeError, reader.readuntil)
+
+    def test_peek(self):
+        reader = StreamReader()
+        reader.feed(b'foo')
+        reader.feed(b'bar')
+        self.assertEqual(reader.peek(), b'foobar')
+        self.assertEqual(reader.peek(4), b'foob')
+        self.assertEqual(reader.read(2), b'fo')
+        self.assertEqual(reader.peek(2), b'ob')
+        self.assertEqual(reader.buffer_size, 4)
+
+    def test_peek_wait(self):
+        reader = StreamReader()
+        def write_more():
+            gruvi.sleep(0.01)
+            reader.feed(b'foo')
+        gruvi.spawn(write_more)
+        self.assertEqual(reader.peek(), b'foo')
+        self.assertEqual(reader.read(3), b'foo')
+
+    def test_read_timeout_keep_data(self):
+        # If a read for a delimiter times out, the data that was not consumed
+        # must still be readable.
+        reader = StreamReader(timeout=0.01)
+        reader.feed(b'foo\r')
+        self.assertRaises(Timeout, reader.readuntil, b'\r\n')
+        self.assertEqual(reader.read1(), b'\r')
+
+    @unittest.skipIf(six.PY2, 'memoryview chunks require Python 3')
+    def test_memoryview(self):
+        # Ensure that memoryview chunks can be fed, and that all methods
+        # except read1() return bytes.
+        buf = memoryview(b'foo\nbar\nbaz\nqux')
+        reader = StreamReader()
+        reader.feed(buf[:6])
+        reader.feed(buf[6:12])
+        reader.feed(buf[12:])
+        reader.feed_eof()
+        line = reader.readline()
+        self.assertIsInstance(line, bytes)
+        self.assertEqual(line, b'foo\n')
+        data = reader.read(4)
+        self.assertIsInstance(data, bytes)
+        self.assertEqual(data, b'bar\n')
+        chunk = reader.read1()
+        self.assertIsInstance(chunk, memoryview)
+        self.assertEqual(chunk, b'baz\n')
+        self.assertEqual(reader.read(), b'qux')
+
 
 class TestWrappedStreamReader(UnitTest):
 
@@ -498,24 +655,29 @@ class TestStream(UnitTest):
         client.close()
 
     def test_connection_limit(self):
+        # Connections over the limit are not accepted until an existing
+        # connection is closed.
         server = StreamServer(echo_handler)
         server.listen(('127.0.0.1', 0))
         addr = server.addresses[0]
         server.max_connections = 10
         clients = []
-        try:
-            for i in range(15):
-                client = StreamClient()
-                client.connect(addr)
-                client.write(b'foo\n')
-                buf = client.readline()
-                if buf == b'':  # conneciton closed: EOF
-                    client.close()
-                clients.append(client)
-        except TransportError:
-            pass
+        for i in range(15):
+            client = StreamClient(timeout=0.2)
+            client.connect(addr)
+            client.write(b'foo\n')
+            clients.append(client)
+        for client in clients[:10]:
+            self.assertEqual(client.readline(), b'foo\n')
+        for client in clients[10:]:
+            self.assertRaises(Timeout, client.readline)
+        self.assertEqual(len(server.connections), server.max_connections)
+        for client in clients[:5]:
+            client.close()
+        for client in clients[10:]:
+            self.assertEqual(client.readline(), b'foo\n')
         self.assertLessEqual(len(server.connections), server.max_connections)
-        for client in clients:
+        for client in clients[5:]:
             client.close()
         server.close()
 
@@ -50,6 +50,12 @@ class ProtocolLogger(object):
     def error_received(self, exc):
         self.events.append(('error_received', exc))
 
+    def pause_writing(self):
+        self.events.append(('pause_writing',))
+
+    def resume_writing(self):
+        self.events.append(('resume_writing',))
+
 
 class EchoServer(ProtocolLogger):
 
@@ -156,6 +162,90 @@ class TransportTest(object):
             self.assertEqual(cevents[2], ('eof_received',))
         self.assertEqual(cevents[-1][0], 'connection_lost')
 
+    def test_cork(self):
+        # Ensure that writes to a corked transport are queued, and that they
+        # are written out by uncork().
+        @self.catch_errors
+        def echo_server(handle, error):
+            if error:
+                raise TransportError.from_errno(error)
+            client = self.create_handle()
+            handle.accept(client)
+            protocols[0] = EchoServer()
+            transports[0] = self.create_transport(client, protocols[0], True)
+        @self.catch_errors
+        def echo_client(handle, error):
+            if error:
+                raise TransportError.from_errno(error)
+            protocols[1] = ProtocolLogger()
+            trans = transports[1] = self.create_transport(handle, protocols[1], False)
+            trans.cork()
+            trans.write(b'foo\n')
+            trans.writelines([b'bar\n', b'qux'])
+        transports = [None, None]
+        protocols = [None, None]
+        server = self.create_handle()
+        addr = self.bind_handle(server)
+        server.listen(echo_server)
+        client = self.create_handle()
+        client.connect(addr, echo_client)
+        self.run_loop(0.1)
+        strans, ctrans = transports
+        sproto, cproto = protocols
+        self.assertEqual(ctrans.get_write_buffer_size(), 11)
+        self.assertEqual(sproto.get_events('data_received'), [])
+        ctrans.uncork()
+        self.run_loop(0.1)
+        self.assertEqual(ctrans.get_write_buffer_size(), 0)
+        self.assertEqual(sproto.get_events('data_received'), [('data_received', b'foo\nbar\nqux')])
+        self.assertEqual(cproto.get_events('data_received'), [('data_received', b'foo\nbar\nqux')])
+        ctrans.close()
+        strans.close()
+        server.close()
+        self.run_loop(0.1)
+
+    def test_cork_flow_control(self):
+        # Ensure that a corked transport writes out its queue when writing is
+        # paused. Otherwise writing would never be resumed.
+        @self.catch_errors
+        def echo_server(handle, error):
+            if error:
+                raise TransportError.from_errno(error)
+            client = self.create_handle()
+            handle.accept(client)
+            protocols[0] = EchoServer()
+            transports[0] = self.create_transport(client, protocols[0], True)
+        @self.catch_errors
+        def echo_client(handle, error):
+            if error:
+                raise TransportError.from_errno(error)
+            protocols[1] = ProtocolLogger()
+            trans = transports[1] = self.create_transport(handle, protocols[1], False)
+            trans.cork()
+            # With the default 64K high-water mark, the first two buffers are
+            # written out together, and the third one pauses writing.
+            for size in (60000, 10000, 40000):
+                trans.write(b'x' * size)
+        transports = [None, None]
+        protocols = [None, None]
+        server = self.create_handle()
+        addr = self.bind_handle(server)
+        server.listen(echo_server)
+        client = self.create_handle()
+        client.connect(addr, echo_client)
+        self.run_loop(0.2)
+        strans, ctrans = transports
+        sproto, cproto = protocols
+        received = sproto.get_events('data_received')
+        self.assertEqual(sum(len(ev[1]) for ev in received), 110000)
+        self.assertEqual(cproto.get_events('pause_writing'), [('pause_writing',)])
+        self.assertEqual(cproto.get_events('resume_writing'), [('resume_writing',)])
+        self.assertEqual(ctrans.get_write_buffer_size(), 0)
+        ctrans.close()
+        strans.close()
+        server.close()
+        self.run_loop(0.1)
+
 
 class TestTcpTransport(TransportTest, EventLoopTest):
 